@@ -127,6 +127,23 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Entrega de PDFs por el servidor web ('X-Sendfile' o 'X-Accel-Redirect'); vacío usa FileResponse
+PDF_SENDFILE_HEADER = config('PDF_SENDFILE_HEADER', default='')
+
+# Stripe. STRIPE_API_BASE apunta a una pasarela compatible (p. ej. `manage.py fake_stripe`)
+STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
+STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+# Solo para pruebas locales: aceptar webhooks sin firma cuando no hay STRIPE_WEBHOOK_SECRET
+STRIPE_WEBHOOK_ALLOW_UNSIGNED = config('STRIPE_WEBHOOK_ALLOW_UNSIGNED', default=False, cast=bool)
+STRIPE_TEST_MODE = config('STRIPE_TEST_MODE', default=True, cast=bool)
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='')
+STRIPE_TIMEOUT_SECONDS = config('STRIPE_TIMEOUT_SECONDS', default=10, cast=int)
+
+# Expirar reservas de áreas comunes con saldo tras el plazo de pago. Apagado
+# mientras no haya un flujo que registre Reserva.monto_pagado
+RESERVAS_EXPIRAR_SIN_PAGO = config('RESERVAS_EXPIRAR_SIN_PAGO', default=False, cast=bool)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
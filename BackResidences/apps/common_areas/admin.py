@@ -1,6 +1,8 @@
 from django.contrib import admin
-from .models import AreaComun, HorarioArea, Reserva
+from .models import AreaComun, HorarioArea, ListaEspera, Reserva, SerieReserva
 
 admin.site.register(AreaComun)
 admin.site.register(HorarioArea)
-admin.site.register(Reserva)
\ No newline at end of file
+admin.site.register(Reserva)
+admin.site.register(SerieReserva)
+admin.site.register(ListaEspera)
@@ -10,6 +10,5 @@ class CommonAreasConfig(AppConfig):
         """
         Configuración inicial de la aplicación
         """
-        # Importar señales si las hubiera
-        # import apps.common_areas.signals
-        pass
\ No newline at end of file
+        # Reasignación de horarios cancelados a la lista de espera
+        import apps.common_areas.signals  # noqa: F401
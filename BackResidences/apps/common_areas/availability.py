@@ -0,0 +1,310 @@
+"""
+Motor de disponibilidad de áreas comunes
+Carga una sola vez el horario semanal del área y las reservas que se cruzan
+con el rango consultado, y calcula los huecos libres con un barrido de
+intervalos ordenados en memoria (sin consultas por día)
+
+La próxima disponibilidad de cada área sale de un índice de huecos libres
+guardado en caché por (área, día), que se invalida al crear o cancelar
+reservas y al cambiar el área o sus horarios.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ESTADOS_OCUPAN, AreaComun, HorarioArea, Reserva
+
+Intervalo = Tuple[datetime, datetime]
+Semana = Dict[int, List[Tuple[time, time]]]
+
+# Rango máximo de una consulta de disponibilidad
+MAX_DIAS_CONSULTA = 92
+
+DIAS_SEMANA = ['lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo']
+
+# Vigencia del índice de huecos libres; la invalidación explícita es la vía
+# normal, esto solo acota cambios hechos por fuera de las vistas y servicios
+CACHE_LIBRES_SEGUNDOS = 600
+
+
+# ================== OPERACIONES SOBRE INTERVALOS ==================
+
+def fusionar(intervalos: Iterable[Intervalo]) -> List[Intervalo]:
+    """Ordenar y unir intervalos que se solapan o se tocan"""
+    resultado: List[Intervalo] = []
+    for inicio, fin in sorted(intervalos):
+        if fin <= inicio:
+            continue
+        if resultado and inicio <= resultado[-1][1]:
+            if fin > resultado[-1][1]:
+                resultado[-1] = (resultado[-1][0], fin)
+        else:
+            resultado.append((inicio, fin))
+    return resultado
+
+
+def restar(ventanas: List[Intervalo], ocupados: List[Intervalo]) -> List[Intervalo]:
+    """
+    Huecos de `ventanas` no cubiertos por `ocupados`
+
+    Ambas listas deben venir fusionadas y ordenadas; el barrido es lineal.
+    """
+    libres: List[Intervalo] = []
+    j = 0
+    for inicio, fin in ventanas:
+        cursor = inicio
+        # Los ocupados que terminan antes de la ventana no vuelven a servir
+        while j < len(ocupados) and ocupados[j][1] <= cursor:
+            j += 1
+        k = j
+        while k < len(ocupados) and ocupados[k][0] < fin:
+            if ocupados[k][0] > cursor:
+                libres.append((cursor, ocupados[k][0]))
+            cursor = max(cursor, ocupados[k][1])
+            k += 1
+        if cursor < fin:
+            libres.append((cursor, fin))
+    return libres
+
+
+def recortar(intervalos: List[Intervalo], inicio: datetime, fin: datetime) -> List[Intervalo]:
+    return [(max(a, inicio), min(b, fin)) for a, b in intervalos if a < fin and b > inicio]
+
+
+def _hora(momento: datetime, dia: date) -> str:
+    """Hora del intervalo dentro del día; el fin de día se expresa como 24:00:00"""
+    if momento.date() > dia:
+        return '24:00:00'
+    return momento.strftime('%H:%M:%S')
+
+
+# ================== SERVICIO ==================
+
+class DisponibilidadService:
+    """Servicio para calcular disponibilidad de áreas comunes"""
+
+    def horarios_semanales(self, areas: Sequence[AreaComun]) -> Dict[int, Semana]:
+        """
+        Ventanas de apertura por día ISO de la semana (1 = lunes), por área
+
+        Una sola consulta para todas las áreas. Si un área no tiene HorarioArea
+        se usa horario_inicio/horario_fin todos los días. Una hora de fin menor
+        o igual a la de inicio cierra a medianoche.
+        """
+        semanas: Dict[int, Semana] = {area.pk: {dia: [] for dia in range(1, 8)} for area in areas}
+        horarios = HorarioArea.objects.filter(area_comun__in=areas, activo=True).values_list(
+            'area_comun_id', 'dia_semana', 'hora_inicio', 'hora_fin'
+        )
+        for area_id, dia, inicio, fin in horarios:
+            semanas[area_id][dia].append((inicio, fin))
+        for area in areas:
+            semana = semanas[area.pk]
+            if not any(semana.values()):
+                for dia in semana:
+                    semana[dia].append((area.horario_inicio, area.horario_fin))
+        return semanas
+
+    def horario_semanal(self, area: AreaComun) -> Semana:
+        return self.horarios_semanales([area])[area.pk]
+
+    def reservas_por_area(self, areas: Sequence[AreaComun], desde: date, hasta: date,
+                          excluir_id: Optional[int] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """Reservas que ocupan cada área y se cruzan con [desde, hasta], en una consulta"""
+        por_area: Dict[int, List[Dict[str, Any]]] = {area.pk: [] for area in areas}
+        reservas = Reserva.objects.filter(
+            area_comun__in=areas,
+            estado__in=ESTADOS_OCUPAN,
+            fecha_inicio__lte=hasta,
+            fecha_fin__gte=desde,
+        )
+        if excluir_id is not None:
+            reservas = reservas.exclude(pk=excluir_id)
+        for reserva in reservas.order_by().values(
+            'id', 'area_comun_id', 'fecha_inicio', 'fecha_fin', 'hora_inicio', 'hora_fin', 'motivo_evento'
+        ):
+            por_area[reserva['area_comun_id']].append(reserva)
+        return por_area
+
+    def reservas(self, area: AreaComun, desde: date, hasta: date,
+                 excluir_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Reservas que ocupan el área y se cruzan con [desde, hasta]"""
+        return self.reservas_por_area([area], desde, hasta, excluir_id)[area.pk]
+
+    @staticmethod
+    def intervalo_reserva(reserva: Dict[str, Any]) -> Intervalo:
+        """Una reserva ocupa de forma continua desde su inicio hasta su fin"""
+        return (
+            datetime.combine(reserva['fecha_inicio'], reserva['hora_inicio']),
+            datetime.combine(reserva['fecha_fin'], reserva['hora_fin']),
+        )
+
+    def _barrido(self, semana: Semana, reservas: List[Dict[str, Any]], desde: date,
+                 hasta: date) -> Iterator[Tuple[date, List[Intervalo], List[Tuple[Intervalo, Dict[str, Any]]]]]:
+        """
+        Recorrer los días de [desde, hasta] con punteros que solo avanzan
+
+        Produce por día los huecos libres dentro del horario (sin filtrar por
+        duración) y las reservas que tocan el día.
+        """
+        ordenadas = sorted(
+            ((self.intervalo_reserva(r), r) for r in reservas),
+            key=lambda par: par[0]
+        )
+        ocupados = fusionar(intervalo for intervalo, _ in ordenadas)
+
+        dia = desde
+        i_ocupado = 0       # primer ocupado que puede tocar el día actual
+        i_reserva = 0       # siguiente reserva aún no iniciada
+        activas: List[Tuple[Intervalo, Dict[str, Any]]] = []
+        while dia <= hasta:
+            inicio_dia = datetime.combine(dia, time.min)
+            fin_dia = inicio_dia + timedelta(days=1)
+            ventanas = fusionar(
+                (
+                    datetime.combine(dia, apertura),
+                    datetime.combine(dia, cierre) if cierre > apertura else fin_dia,
+                )
+                for apertura, cierre in semana[dia.isoweekday()]
+            )
+
+            while i_ocupado < len(ocupados) and ocupados[i_ocupado][1] <= inicio_dia:
+                i_ocupado += 1
+            fin_ocupados = i_ocupado
+            while fin_ocupados < len(ocupados) and ocupados[fin_ocupados][0] < fin_dia:
+                fin_ocupados += 1
+            del_dia = recortar(ocupados[i_ocupado:fin_ocupados], inicio_dia, fin_dia)
+
+            while i_reserva < len(ordenadas) and ordenadas[i_reserva][0][0] < fin_dia:
+                activas.append(ordenadas[i_reserva])
+                i_reserva += 1
+            activas = [par for par in activas if par[0][1] > inicio_dia]
+
+            yield dia, restar(ventanas, del_dia), activas
+            dia += timedelta(days=1)
+
+    def calcular(self, area: AreaComun, desde: date, hasta: date,
+                 duracion_horas: int = 1) -> List[Dict[str, Any]]:
+        """
+        Disponibilidad por día con dos consultas en total
+
+        Returns:
+            Lista por día con las ventanas libres de al menos `duracion_horas`
+            y los intervalos ocupados por reservas (recortados al día)
+        """
+        duracion = timedelta(hours=duracion_horas)
+        dias = []
+        for dia, libres, activas in self._barrido(
+            self.horario_semanal(area), self.reservas(area, desde, hasta), desde, hasta
+        ):
+            inicio_dia = datetime.combine(dia, time.min)
+            fin_dia = inicio_dia + timedelta(days=1)
+            libres = [(inicio, fin) for inicio, fin in libres if fin - inicio >= duracion]
+            dias.append({
+                'fecha': dia.strftime('%Y-%m-%d'),
+                'dia_semana': DIAS_SEMANA[dia.weekday()],
+                'disponible': bool(libres),
+                'horarios_libres': [
+                    {
+                        'inicio': _hora(inicio, dia),
+                        'fin': _hora(fin, dia),
+                        'ultimo_inicio': _hora(fin - duracion, dia),
+                    }
+                    for inicio, fin in libres
+                ],
+                'reservas_existentes': [
+                    {
+                        'inicio': _hora(max(intervalo[0], inicio_dia), dia),
+                        'fin': _hora(min(intervalo[1], fin_dia), dia),
+                        'evento': reserva['motivo_evento'] or 'Reserva privada',
+                    }
+                    for intervalo, reserva in activas
+                ],
+            })
+        return dias
+
+    # ---------------- Índice de huecos libres ----------------
+
+    @staticmethod
+    def _clave_libres(area_id: int, hoy: date) -> str:
+        return f'areas:libres:{area_id}:{hoy.isoformat()}'
+
+    @staticmethod
+    def horizonte(area: AreaComun, hoy: date) -> Tuple[date, date]:
+        """Días en los que se puede reservar según la anticipación del área"""
+        return (hoy + timedelta(days=area.dias_anticipacion_min),
+                hoy + timedelta(days=area.dias_anticipacion_max))
+
+    def indices_libres(self, areas: Sequence[AreaComun], hoy: date) -> Dict[int, List[Intervalo]]:
+        """
+        Huecos reservables de cada área dentro de su horizonte de anticipación
+
+        Los huecos contiguos entre días se unen antes de filtrar por
+        tiempo_minimo_reserva. Dos consultas para todo el lote.
+        """
+        if not areas:
+            return {}
+        horizontes = {area.pk: self.horizonte(area, hoy) for area in areas}
+        semanas = self.horarios_semanales(areas)
+        reservas = self.reservas_por_area(
+            areas,
+            min(desde for desde, _ in horizontes.values()),
+            max(hasta for _, hasta in horizontes.values()),
+        )
+        indices = {}
+        for area in areas:
+            desde, hasta = horizontes[area.pk]
+            duracion = timedelta(hours=area.tiempo_minimo_reserva)
+            libres = fusionar(
+                intervalo
+                for _, del_dia, _ in self._barrido(semanas[area.pk], reservas[area.pk], desde, hasta)
+                for intervalo in del_dia
+            )
+            indices[area.pk] = [(inicio, fin) for inicio, fin in libres if fin - inicio >= duracion]
+        return indices
+
+    def proxima_disponibilidad(self, areas: Sequence[AreaComun],
+                               ahora: Optional[datetime] = None) -> Dict[int, Optional[str]]:
+        """
+        Primer inicio reservable de cada área (ISO con zona horaria) o None
+
+        Los índices se leen de caché con una sola llamada; solo se calculan los
+        que faltan, en lote.
+        """
+        ahora = ahora or timezone.localtime().replace(tzinfo=None)
+        hoy = ahora.date()
+        claves = {area.pk: self._clave_libres(area.pk, hoy) for area in areas}
+        en_cache = cache.get_many(list(claves.values()))
+
+        faltantes = [area for area in areas if claves[area.pk] not in en_cache]
+        nuevos = self.indices_libres(faltantes, hoy)
+        if nuevos:
+            cache.set_many({claves[area_id]: libres for area_id, libres in nuevos.items()},
+                           CACHE_LIBRES_SEGUNDOS)
+
+        minimo = ahora.replace(second=0, microsecond=0)
+        if minimo < ahora:
+            minimo += timedelta(minutes=1)
+
+        proximas = {}
+        for area in areas:
+            libres = nuevos[area.pk] if area.pk in nuevos else en_cache[claves[area.pk]]
+            duracion = timedelta(hours=area.tiempo_minimo_reserva)
+            proximas[area.pk] = None
+            for inicio, fin in libres:
+                inicio = max(inicio, minimo)
+                if fin - inicio >= duracion:
+                    proximas[area.pk] = timezone.make_aware(inicio).isoformat()
+                    break
+        return proximas
+
+    def invalidar(self, area_id: int):
+        """Descartar el índice de huecos del área cuando la transacción confirme"""
+        clave = self._clave_libres(area_id, timezone.localdate())
+        transaction.on_commit(lambda: cache.delete(clave))
+
+
+# Instancia global del servicio
+disponibilidad_service = DisponibilidadService()
@@ -0,0 +1 @@
+# Management commands for common_areas app
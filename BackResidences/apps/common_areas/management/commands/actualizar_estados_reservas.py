@@ -0,0 +1,35 @@
+"""
+Avanza el ciclo de vida de las reservas de áreas comunes
+Pensado para ejecutarse periódicamente (cron cada pocos minutos)
+"""
+from django.core.management.base import BaseCommand
+
+from apps.common_areas.services import PLAZO_PAGO_HORAS, reserva_service
+
+
+class Command(BaseCommand):
+    help = 'Confirma pendientes pagadas o sin cobro, expira las que no se pagan, marca en uso, completa reservas finalizadas y vence listas de espera'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar, sin actualizar')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if dry_run:
+            self.stdout.write(self.style.WARNING('🔍 Modo simulación: no se actualizará ninguna reserva'))
+
+        resultado = reserva_service.avanzar_estados(dry_run=dry_run)
+        if not reserva_service.cobro_activo():
+            self.stdout.write(self.style.WARNING(
+                'ℹ️  RESERVAS_EXPIRAR_SIN_PAGO apagado: las pendientes se confirman sin exigir pago'
+            ))
+
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write('📊 CICLO DE VIDA DE RESERVAS:')
+        self.stdout.write(f"  • Pendientes confirmadas (pagadas o sin cobro): {resultado['confirmadas']}")
+        self.stdout.write(f"  • Pendientes expiradas (plazo de pago {PLAZO_PAGO_HORAS}h o inicio alcanzado): {resultado['expiradas']}")
+        self.stdout.write(f"  • Horarios expirados reasignados a la lista de espera: {resultado['esperas_asignadas']}")
+        self.stdout.write(f"  • Reservas en uso: {resultado['en_uso']}")
+        self.stdout.write(f"  • Reservas completadas: {resultado['completadas']}")
+        self.stdout.write(f"  • Entradas de lista de espera vencidas: {resultado['esperas_vencidas']}")
+        self.stdout.write(self.style.SUCCESS('\n✅ Estados de reservas actualizados' if not dry_run else '\n✅ Simulación completada'))
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:20
+
+import logging
+from datetime import datetime
+
+import apps.common_areas.models
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import RangeOperators
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def cancelar_solapadas(apps, schema_editor):
+    """
+    La restricción no puede crearse si ya hay reservas activas solapadas (la
+    validación anterior tenía una carrera, así que también pueden existir
+    entre confirmadas). Por área se conservan primero las que están en uso,
+    luego las confirmadas y luego las pendientes, en cada grupo la más
+    antigua; las demás que chocan se cancelan y se registran en el log.
+    """
+    Reserva = apps.get_model('common_areas', 'Reserva')
+    activas = Reserva.objects.filter(estado__in=['pendiente', 'confirmada', 'en_uso']).values(
+        'id', 'area_comun_id', 'estado', 'fecha_inicio', 'hora_inicio', 'fecha_fin', 'hora_fin'
+    ).order_by('area_comun_id', 'fecha_creacion', 'id')
+
+    por_area = {}
+    for reserva in activas:
+        por_area.setdefault(reserva['area_comun_id'], []).append(reserva)
+
+    rango = {'en_uso': 0, 'confirmada': 1, 'pendiente': 2}
+    canceladas = {}
+    for reservas in por_area.values():
+        reservas.sort(key=lambda r: rango[r['estado']])
+        conservadas = []
+        for reserva in reservas:
+            inicio = datetime.combine(reserva['fecha_inicio'], reserva['hora_inicio'])
+            fin = datetime.combine(reserva['fecha_fin'], reserva['hora_fin'])
+            choque = next((pk for i, f, pk in conservadas if inicio < f and i < fin), None)
+            if choque is None:
+                conservadas.append((inicio, fin, reserva['id']))
+            else:
+                canceladas.setdefault(reserva['estado'], []).append((reserva['id'], choque))
+
+    ahora = timezone.now()
+    for estado, pares in canceladas.items():
+        Reserva.objects.filter(pk__in=[pk for pk, _ in pares]).update(
+            estado='cancelada',
+            fecha_cancelacion=ahora,
+            motivo_cancelacion='Horario ocupado por otra reserva activa',
+        )
+        if estado != 'pendiente':
+            # Reservas ya confirmadas: el residente debe ser contactado
+            logger.warning(
+                'Reservas %s solapadas canceladas (cancelada -> conservada): %s',
+                estado, ', '.join(f'{pk} -> {choque}' for pk, choque in pares)
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common_areas', '0002_remove_areacomun_capacidad_and_more'),
+        ('common_areas', '0002_reserva_motivo_cancelacion'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.AlterField(
+            model_name='reserva',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmada', 'Confirmada'), ('en_uso', 'En uso'), ('cancelada', 'Cancelada'), ('completada', 'Completada')], default='pendiente', max_length=20, verbose_name='Estado'),
+        ),
+        migrations.RunPython(cancelar_solapadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reserva',
+            constraint=ExclusionConstraint(
+                condition=models.Q(('estado__in', ('pendiente', 'confirmada', 'en_uso'))),
+                expressions=[
+                    ('area_comun', RangeOperators.EQUAL),
+                    (apps.common_areas.models.RangoReserva(), RangeOperators.OVERLAPS),
+                ],
+                name='reserva_sin_solapamiento',
+            ),
+        ),
+    ]
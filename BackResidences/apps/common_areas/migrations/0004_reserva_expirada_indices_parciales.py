@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common_areas', '0003_reserva_sin_solapamiento'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reserva',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmada', 'Confirmada'), ('en_uso', 'En uso'), ('cancelada', 'Cancelada'), ('completada', 'Completada'), ('expirada', 'Expirada')], default='pendiente', max_length=20, verbose_name='Estado'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(condition=models.Q(('estado__in', ('pendiente', 'confirmada', 'en_uso'))), fields=['area_comun', 'fecha_inicio', 'fecha_fin'], name='reserva_ocupa_area_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(condition=models.Q(('estado__in', ('pendiente', 'confirmada', 'en_uso'))), fields=['fecha_fin', 'hora_fin'], name='reserva_ocupa_fin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(condition=models.Q(('estado', 'pendiente')), fields=['fecha_creacion'], name='reserva_pendiente_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('common_areas', '0004_reserva_expirada_indices_parciales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieReserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('frecuencia', models.CharField(choices=[('diaria', 'Diaria'), ('semanal', 'Semanal'), ('mensual', 'Mensual')], max_length=10, verbose_name='Frecuencia')),
+                ('intervalo', models.PositiveIntegerField(default=1, verbose_name='Intervalo')),
+                ('dias_semana', models.JSONField(blank=True, default=list, verbose_name='Días de la semana (1 = lunes)')),
+                ('fecha_inicio', models.DateField(verbose_name='Primera fecha')),
+                ('fecha_limite', models.DateField(blank=True, null=True, verbose_name='Hasta')),
+                ('repeticiones', models.PositiveIntegerField(blank=True, null=True, verbose_name='Número de repeticiones')),
+                ('hora_inicio', models.TimeField(verbose_name='Hora de inicio')),
+                ('hora_fin', models.TimeField(verbose_name='Hora de fin')),
+                ('motivo_evento', models.CharField(blank=True, max_length=200, verbose_name='Motivo del evento')),
+                ('area_comun', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_reserva', to='common_areas.areacomun', verbose_name='Área común')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_reserva', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Serie de Reservas',
+                'verbose_name_plural': 'Series de Reservas',
+            },
+        ),
+        migrations.AddField(
+            model_name='reserva',
+            name='serie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservas', to='common_areas.seriereserva', verbose_name='Serie'),
+        ),
+    ]
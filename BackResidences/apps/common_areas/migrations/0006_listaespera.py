@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:15
+
+import apps.common_areas.models
+from django.conf import settings
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('common_areas', '0005_seriereserva_reserva_serie'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListaEspera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('fecha_inicio', models.DateField(verbose_name='Fecha de inicio')),
+                ('fecha_fin', models.DateField(verbose_name='Fecha de fin')),
+                ('hora_inicio', models.TimeField(verbose_name='Hora de inicio')),
+                ('hora_fin', models.TimeField(verbose_name='Hora de fin')),
+                ('motivo_evento', models.CharField(blank=True, max_length=200, verbose_name='Motivo del evento')),
+                ('numero_personas', models.IntegerField(blank=True, null=True, verbose_name='Número de personas')),
+                ('prioridad', models.PositiveSmallIntegerField(default=0, verbose_name='Prioridad')),
+                ('estado', models.CharField(choices=[('esperando', 'Esperando'), ('asignada', 'Asignada'), ('cancelada', 'Cancelada'), ('vencida', 'Vencida')], default='esperando', max_length=20, verbose_name='Estado')),
+                ('asignada_en', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de asignación')),
+                ('area_comun', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='common_areas.areacomun', verbose_name='Área común')),
+                ('reserva', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='origen_lista_espera', to='common_areas.reserva', verbose_name='Reserva asignada')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listas_espera', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Lista de Espera',
+                'verbose_name_plural': 'Listas de Espera',
+                'ordering': ['-prioridad', 'created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='listaespera',
+            index=django.contrib.postgres.indexes.GistIndex(models.F('area_comun'), apps.common_areas.models.RangoReserva(), condition=models.Q(('estado', 'esperando')), name='espera_area_rango_gist'),
+        ),
+    ]
@@ -1,8 +1,69 @@
+from datetime import date
 from decimal import Decimal
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.contrib.postgres.indexes import GistIndex
 from django.db import models
+from django.db.models.functions import Coalesce
 from apps.core.models import BaseModel
 from apps.authentication.models import User
 
+# Estados de reserva que ocupan el área (una reserva pendiente retiene el horario)
+ESTADOS_OCUPAN = ('pendiente', 'confirmada', 'en_uso')
+
+
+def _conteo_reservas(reservas):
+    """Subconsulta correlacionada con el número de reservas del área externa"""
+    return Coalesce(
+        models.Subquery(
+            reservas.filter(area_comun=models.OuterRef('pk'))
+            .order_by()
+            .values('area_comun')
+            .annotate(total=models.Count('pk'))
+            .values('total')[:1],
+            output_field=models.IntegerField()
+        ),
+        0
+    )
+
+
+class AreaComunQuerySet(models.QuerySet):
+    """QuerySet de áreas comunes con los indicadores del listado anotados"""
+
+    def with_list_stats(self, hoy=None):
+        """
+        Anotar disponibilidad de hoy, reservas activas y reservas del mes
+
+        Todo se resuelve con subconsultas en la consulta del listado, así que
+        el número de consultas no crece con el número de áreas. Un área sin
+        HorarioArea abre todos los días con horario_inicio/horario_fin.
+        """
+        hoy = hoy or date.today()
+        inicio_mes = hoy.replace(day=1)
+        inicio_siguiente = (inicio_mes.replace(year=inicio_mes.year + 1, month=1)
+                            if inicio_mes.month == 12 else inicio_mes.replace(month=inicio_mes.month + 1))
+
+        horarios = HorarioArea.objects.filter(area_comun=models.OuterRef('pk'), activo=True)
+        ocupada_hoy = Reserva.objects.filter(
+            area_comun=models.OuterRef('pk'),
+            estado__in=ESTADOS_OCUPAN,
+            fecha_inicio__lte=hoy,
+            fecha_fin__gte=hoy,
+        )
+        return self.annotate(
+            disponible_hoy=models.ExpressionWrapper(
+                (models.Exists(horarios.filter(dia_semana=hoy.isoweekday())) | ~models.Exists(horarios))
+                & ~models.Exists(ocupada_hoy),
+                output_field=models.BooleanField()
+            ),
+            reservas_activas=_conteo_reservas(Reserva.objects.filter(estado__in=ESTADOS_OCUPAN)),
+            total_reservas_mes=_conteo_reservas(Reserva.objects.filter(
+                fecha_inicio__gte=inicio_mes,
+                fecha_inicio__lt=inicio_siguiente,
+            )),
+        )
+
+
 class AreaComun(BaseModel):
     """Áreas comunes del condominio"""
     TIPO_AREA_CHOICES = [
@@ -33,6 +94,8 @@ class AreaComun(BaseModel):
     imagen_principal = models.URLField(max_length=255, null=True, blank=True, verbose_name="URL de Imagen Principal")
     imagenes = models.JSONField(default=list, blank=True, verbose_name="Galería de Imágenes")
 
+    objects = AreaComunQuerySet.as_manager()
+
     def __str__(self):
         return self.nombre
 
@@ -66,6 +129,78 @@ class HorarioArea(BaseModel):
     def __str__(self):
         return f"{self.area_comun.nombre} - {self.get_dia_semana_display()} {self.hora_inicio}-{self.hora_fin}" # pyright: ignore[reportAttributeAccessIssue]
 
+class RangoReserva(models.Func):
+    """
+    Intervalo [inicio, fin) de la reserva como tsrange(fecha + hora)
+
+    Se calcula a partir de las columnas existentes, así que no hay un campo
+    duplicado que mantener sincronizado; la restricción de exclusión lo indexa.
+    """
+    output_field = DateTimeRangeField()
+
+    def __init__(self):
+        super().__init__(
+            models.F('fecha_inicio'), models.F('hora_inicio'),
+            models.F('fecha_fin'), models.F('hora_fin'),
+        )
+
+    def as_sql(self, compiler, connection, **extra_context):
+        partes, params = [], []
+        for expresion in self.get_source_expressions():
+            sql, parametros = compiler.compile(expresion)
+            partes.append(sql)
+            params.extend(parametros)
+        return "tsrange(%s + %s, %s + %s, '[)')" % tuple(partes), params
+
+
+class SerieReserva(BaseModel):
+    """Regla de repetición (estilo RRULE) de un grupo de reservas recurrentes"""
+    FRECUENCIA_CHOICES = [
+        ('diaria', 'Diaria'),
+        ('semanal', 'Semanal'),
+        ('mensual', 'Mensual'),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='series_reserva', verbose_name="Usuario")
+    area_comun = models.ForeignKey(AreaComun, on_delete=models.CASCADE, related_name='series_reserva', verbose_name="Área común")
+    frecuencia = models.CharField(max_length=10, choices=FRECUENCIA_CHOICES, verbose_name="Frecuencia")
+    intervalo = models.PositiveIntegerField(default=1, verbose_name="Intervalo")
+    dias_semana = models.JSONField(default=list, blank=True, verbose_name="Días de la semana (1 = lunes)")
+    fecha_inicio = models.DateField(verbose_name="Primera fecha")
+    fecha_limite = models.DateField(null=True, blank=True, verbose_name="Hasta")
+    repeticiones = models.PositiveIntegerField(null=True, blank=True, verbose_name="Número de repeticiones")
+    hora_inicio = models.TimeField(verbose_name="Hora de inicio")
+    hora_fin = models.TimeField(verbose_name="Hora de fin")
+    motivo_evento = models.CharField(max_length=200, blank=True, verbose_name="Motivo del evento")
+
+    def __str__(self):
+        return f'Serie {self.pk} - {self.area_comun.nombre} ({self.get_frecuencia_display()})'  # pyright: ignore[reportAttributeAccessIssue]
+
+    class Meta: # type: ignore
+        verbose_name = "Serie de Reservas"
+        verbose_name_plural = "Series de Reservas"
+
+
+class RangoFijo(models.Func):
+    """tsrange constante [desde, hasta) para comparar con RangoReserva"""
+    output_field = DateTimeRangeField()
+    template = "tsrange(%(expressions)s, '[)')"
+
+    def __init__(self, desde, hasta):
+        # Texto con cast explícito: un datetime ingenuo se convertiría a UTC
+        super().__init__(
+            models.Func(models.Value(desde.isoformat(sep=' ')), template='%(expressions)s::timestamp'),
+            models.Func(models.Value(hasta.isoformat(sep=' ')), template='%(expressions)s::timestamp'),
+        )
+
+
+class Solapa(models.Func):
+    """Condición rango && rango; usable directamente en filter()"""
+    arg_joiner = ' && '
+    template = '(%(expressions)s)'
+    output_field = models.BooleanField()
+
+
 class Reserva(BaseModel):
     """Reservas de áreas comunes"""
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Usuario")
@@ -82,8 +217,10 @@ class Reserva(BaseModel):
         choices=[
             ('pendiente', 'Pendiente'),
             ('confirmada', 'Confirmada'),
+            ('en_uso', 'En uso'),
             ('cancelada', 'Cancelada'),
             ('completada', 'Completada'),
+            ('expirada', 'Expirada'),
         ],
         default='pendiente',
         verbose_name="Estado"
@@ -101,6 +238,14 @@ class Reserva(BaseModel):
     )
     fecha_cancelacion = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de cancelación")
     motivo_cancelacion = models.TextField(null=True, blank=True, verbose_name="Motivo de cancelación")
+    serie = models.ForeignKey(
+        SerieReserva,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reservas',
+        verbose_name="Serie"
+    )
 
     def __str__(self):
         return f'Reserva {self.pk} - {self.area_comun.nombre} - {self.usuario.username}'
@@ -108,4 +253,82 @@ class Reserva(BaseModel):
     class Meta: # type: ignore
         verbose_name = "Reserva"
         verbose_name_plural = "Reservas"
-        ordering = ['-fecha_creacion']
\ No newline at end of file
+        ordering = ['-fecha_creacion']
+        # Índices parciales: las consultas de reservas vigentes solo recorren
+        # filas vivas, no el histórico de canceladas/completadas/expiradas
+        indexes = [
+            models.Index(
+                fields=['area_comun', 'fecha_inicio', 'fecha_fin'],
+                condition=models.Q(estado__in=ESTADOS_OCUPAN),
+                name='reserva_ocupa_area_idx',
+            ),
+            models.Index(
+                fields=['fecha_fin', 'hora_fin'],
+                condition=models.Q(estado__in=ESTADOS_OCUPAN),
+                name='reserva_ocupa_fin_idx',
+            ),
+            models.Index(
+                fields=['fecha_creacion'],
+                condition=models.Q(estado='pendiente'),
+                name='reserva_pendiente_idx',
+            ),
+        ]
+        constraints = [
+            # Dos reservas activas de la misma área no pueden solaparse; lo
+            # garantiza PostgreSQL con un índice GiST, sin carreras entre peticiones
+            ExclusionConstraint(
+                name='reserva_sin_solapamiento',
+                expressions=[
+                    ('area_comun', RangeOperators.EQUAL),
+                    (RangoReserva(), RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(estado__in=ESTADOS_OCUPAN),
+            ),
+        ]
+
+
+class ListaEspera(BaseModel):
+    """Residentes en espera de un horario ocupado de un área común"""
+    ESTADO_CHOICES = [
+        ('esperando', 'Esperando'),
+        ('asignada', 'Asignada'),
+        ('cancelada', 'Cancelada'),
+        ('vencida', 'Vencida'),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listas_espera', verbose_name="Usuario")
+    area_comun = models.ForeignKey(AreaComun, on_delete=models.CASCADE, related_name='lista_espera', verbose_name="Área común")
+    fecha_inicio = models.DateField(verbose_name="Fecha de inicio")
+    fecha_fin = models.DateField(verbose_name="Fecha de fin")
+    hora_inicio = models.TimeField(verbose_name="Hora de inicio")
+    hora_fin = models.TimeField(verbose_name="Hora de fin")
+    motivo_evento = models.CharField(max_length=200, blank=True, verbose_name="Motivo del evento")
+    numero_personas = models.IntegerField(null=True, blank=True, verbose_name="Número de personas")
+    # Mayor prioridad primero; a igual prioridad, orden de llegada
+    prioridad = models.PositiveSmallIntegerField(default=0, verbose_name="Prioridad")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='esperando', verbose_name="Estado")
+    reserva = models.OneToOneField(
+        Reserva,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='origen_lista_espera',
+        verbose_name="Reserva asignada"
+    )
+    asignada_en = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de asignación")
+
+    def __str__(self):
+        return f'Espera {self.pk} - {self.area_comun.nombre} {self.fecha_inicio} {self.hora_inicio}'
+
+    class Meta: # type: ignore
+        verbose_name = "Lista de Espera"
+        verbose_name_plural = "Listas de Espera"
+        ordering = ['-prioridad', 'created_at']
+        indexes = [
+            # Buscar quién espera un intervalo liberado es una consulta && por rango
+            GistIndex(
+                models.F('area_comun'), RangoReserva(),
+                condition=models.Q(estado='esperando'),
+                name='espera_area_rango_gist',
+            ),
+        ]
@@ -0,0 +1,147 @@
+"""
+Calendario mensual de ocupación de áreas comunes
+Cada día se representa como un mapa de bits de franjas fijas (bit i = franja
+que empieza en i * SLOT_MINUTOS desde medianoche), codificado en hexadecimal.
+La ocupación se guarda en caché por (área, mes) y se calcula para todas las
+áreas que falten con una sola consulta de reservas.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .availability import disponibilidad_service
+from .models import AreaComun
+
+SLOT_MINUTOS = 30
+SLOTS_POR_DIA = 24 * 60 // SLOT_MINUTOS
+ANCHO_HEX = (SLOTS_POR_DIA + 3) // 4
+MASCARA_DIA = (1 << SLOTS_POR_DIA) - 1
+
+# La invalidación al crear o cancelar reservas es la vía normal; la vigencia
+# solo acota cambios hechos por fuera de los servicios
+CACHE_CALENDARIO_SEGUNDOS = 3600
+
+_SLOT = timedelta(minutes=SLOT_MINUTOS)
+
+
+def rango_mes(mes: date) -> Tuple[date, date]:
+    """Primer día del mes y primer día del mes siguiente"""
+    inicio = mes.replace(day=1)
+    siguiente = (inicio.replace(year=inicio.year + 1, month=1)
+                 if inicio.month == 12 else inicio.replace(month=inicio.month + 1))
+    return inicio, siguiente
+
+
+def _hex(bits: int) -> str:
+    return format(bits, f'0{ANCHO_HEX}x')
+
+
+def _franjas(inicio: timedelta, fin: timedelta, completas: bool) -> Tuple[int, int]:
+    """
+    Índices [a, b) de las franjas de un intervalo medido desde un origen
+
+    Con `completas` solo cuentan las franjas totalmente cubiertas (horario
+    abierto); si no, cualquier franja tocada (ocupación).
+    """
+    if completas:
+        return -(-inicio // _SLOT), fin // _SLOT
+    return inicio // _SLOT, -(-fin // _SLOT)
+
+
+class CalendarioService:
+    """Servicio para el calendario mensual de ocupación"""
+
+    @staticmethod
+    def _clave(area_id: int, mes: date) -> str:
+        return f'areas:calendario:{area_id}:{mes:%Y-%m}'
+
+    def horario_bits(self, semana: Dict[int, List[Tuple[time, time]]]) -> List[str]:
+        """Franjas abiertas por día de la semana, de lunes a domingo"""
+        dias = []
+        for dia in range(1, 8):
+            bits = 0
+            for apertura, cierre in semana[dia]:
+                desde = timedelta(hours=apertura.hour, minutes=apertura.minute, seconds=apertura.second)
+                hasta = (timedelta(hours=cierre.hour, minutes=cierre.minute, seconds=cierre.second)
+                         if cierre > apertura else timedelta(days=1))
+                a, b = _franjas(desde, hasta, completas=True)
+                if b > a:
+                    bits |= ((1 << (b - a)) - 1) << a
+            dias.append(_hex(bits))
+        return dias
+
+    def ocupacion_mes(self, reservas: List[Dict[str, Any]], mes: date) -> List[str]:
+        """
+        Mapa de ocupación de cada día del mes
+
+        Todo el mes se arma como un único entero (una franja por bit) y luego
+        se corta por días, así que el coste es lineal en reservas + días.
+        """
+        inicio, siguiente = rango_mes(mes)
+        origen = datetime.combine(inicio, time.min)
+        total = (siguiente - inicio).days * SLOTS_POR_DIA
+        bits = 0
+        for reserva in reservas:
+            ini, fin = disponibilidad_service.intervalo_reserva(reserva)
+            a, b = _franjas(ini - origen, fin - origen, completas=False)
+            a, b = max(a, 0), min(b, total)
+            if b > a:
+                bits |= ((1 << (b - a)) - 1) << a
+        return [
+            _hex((bits >> (dia * SLOTS_POR_DIA)) & MASCARA_DIA)
+            for dia in range((siguiente - inicio).days)
+        ]
+
+    def calendario(self, areas: Sequence[AreaComun], mes: date) -> Dict[str, Any]:
+        """
+        Calendario del mes para todas las áreas
+
+        Ocupación leída de caché con una llamada; las áreas que faltan se
+        calculan juntas con una consulta de reservas. El horario semanal se
+        lee en una consulta para todas las áreas.
+        """
+        inicio, siguiente = rango_mes(mes)
+        claves = {area.pk: self._clave(area.pk, inicio) for area in areas}
+        en_cache = cache.get_many(list(claves.values()))
+
+        faltantes = [area for area in areas if claves[area.pk] not in en_cache]
+        nuevos = {}
+        if faltantes:
+            reservas = disponibilidad_service.reservas_por_area(
+                faltantes, inicio, siguiente - timedelta(days=1)
+            )
+            nuevos = {area.pk: self.ocupacion_mes(reservas[area.pk], inicio) for area in faltantes}
+            cache.set_many({claves[area_id]: dias for area_id, dias in nuevos.items()},
+                           CACHE_CALENDARIO_SEGUNDOS)
+
+        semanas = disponibilidad_service.horarios_semanales(areas)
+        return {
+            'mes': f'{inicio:%Y-%m}',
+            'slot_minutos': SLOT_MINUTOS,
+            'slots_por_dia': SLOTS_POR_DIA,
+            'dias': (siguiente - inicio).days,
+            'areas': [
+                {
+                    'id': area.pk,
+                    'nombre': area.nombre,
+                    'horario': self.horario_bits(semanas[area.pk]),
+                    'ocupacion': nuevos[area.pk] if area.pk in nuevos else en_cache[claves[area.pk]],
+                }
+                for area in areas
+            ],
+        }
+
+    def invalidar(self, area_id: int, fecha_inicio: date, fecha_fin: Optional[date] = None):
+        """Descartar los meses que toca una reserva cuando la transacción confirme"""
+        claves = []
+        mes, _ = rango_mes(fecha_inicio)
+        while mes <= (fecha_fin or fecha_inicio):
+            claves.append(self._clave(area_id, mes))
+            mes = rango_mes(mes)[1]
+        transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+# Instancia global del servicio
+calendario_service = CalendarioService()
@@ -0,0 +1,334 @@
+"""
+Estadísticas y reportes de uso de áreas comunes
+Las cifras del mes salen de una sola agregación agrupada por área sobre las
+reservas que se cruzan con el mes; la ocupación es horas reservadas sobre
+horas de apertura según HorarioArea
+
+El reporte de uso (CU-WEB-018) agrega en la base de datos por área y por
+(día de la semana, hora de inicio) y se emite área por área como CSV o JSON,
+así que un año de reservas no se carga en memoria ni en una sola respuesta.
+"""
+import csv
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+from django.utils import timezone
+
+from .availability import DIAS_SEMANA, disponibilidad_service
+from .models import ESTADOS_OCUPAN, AreaComun, Reserva
+from .occupancy import rango_mes
+
+# Estados de reservas que cuentan como uso efectivo del área
+ESTADOS_EFECTIVOS = ('confirmada', 'en_uso', 'completada')
+
+CACHE_ESTADISTICAS_SEGUNDOS = 300
+CACHE_DASHBOARD_SEGUNDOS = 120
+
+# Rango máximo del reporte de uso
+MAX_DIAS_REPORTE = 731
+
+COLUMNAS_RESUMEN = [
+    'area_id', 'area', 'total_reservas', 'efectivas', 'canceladas', 'expiradas',
+    'tasa_cancelacion', 'ingresos', 'cobrado', 'horas_reservadas', 'horas_pico',
+]
+COLUMNAS_HEATMAP = ['area_id', 'area', 'dia_semana', 'hora', 'reservas', 'horas_reservadas']
+
+
+class HorasEnRango(models.Func):
+    """Horas de la reserva (fecha + hora) recortadas a [desde, hasta)"""
+    output_field = models.FloatField()
+
+    def __init__(self, desde: datetime, hasta: datetime):
+        super().__init__(
+            models.F('fecha_inicio'), models.F('hora_inicio'),
+            models.F('fecha_fin'), models.F('hora_fin'),
+            # Texto con cast explícito: un datetime ingenuo se convertiría a UTC
+            models.Value(desde.isoformat(sep=' ')), models.Value(hasta.isoformat(sep=' ')),
+        )
+
+    def as_sql(self, compiler, connection, **extra_context):
+        partes = [compiler.compile(expresion) for expresion in self.get_source_expressions()]
+        (fi, fi_p), (hi, hi_p), (ff, ff_p), (hf, hf_p), (desde, desde_p), (hasta, hasta_p) = partes
+        sql = (
+            f"EXTRACT(EPOCH FROM LEAST({ff} + {hf}, {hasta}::timestamp)"
+            f" - GREATEST({fi} + {hi}, {desde}::timestamp))::double precision / 3600.0"
+        )
+        return sql, [*ff_p, *hf_p, *hasta_p, *fi_p, *hi_p, *desde_p]
+
+
+class ReportesAreasService:
+    """Servicio de estadísticas de uso de áreas comunes"""
+
+    @staticmethod
+    def horas_programadas(semana, desde: date, hasta: date) -> float:
+        """Horas de apertura de un área entre desde y hasta (exclusivo)"""
+        por_dia = {}
+        for dia, ventanas in semana.items():
+            horas = timedelta()
+            for apertura, cierre in ventanas:
+                desde_hora = timedelta(hours=apertura.hour, minutes=apertura.minute)
+                hasta_hora = (timedelta(hours=cierre.hour, minutes=cierre.minute)
+                              if cierre > apertura else timedelta(days=1))
+                horas += hasta_hora - desde_hora
+            por_dia[dia] = horas.total_seconds() / 3600
+        total = 0.0
+        dia = desde
+        while dia < hasta:
+            total += por_dia[dia.isoweekday()]
+            dia += timedelta(days=1)
+        return total
+
+    def estadisticas_mes(self, mes: date) -> Dict[str, Any]:
+        """
+        Totales, ingresos, áreas más populares y ocupación real del mes
+
+        Tres consultas en frío (áreas, horarios y la agregación de reservas);
+        el resultado se cachea por mes y lo comparten todos los usuarios.
+        """
+        inicio, siguiente = rango_mes(mes)
+        clave = f'areas:estadisticas:{inicio:%Y-%m}'
+        estadisticas = cache.get(clave)
+        if estadisticas is not None:
+            return estadisticas
+
+        del_mes = Q(fecha_inicio__gte=inicio, fecha_inicio__lt=siguiente)
+        efectivas = Q(estado__in=ESTADOS_EFECTIVOS)
+        por_area = list(
+            Reserva.objects.filter(fecha_inicio__lt=siguiente, fecha_fin__gte=inicio)
+            .order_by()
+            .values('area_comun_id', 'area_comun__nombre')
+            .annotate(
+                reservas_mes=Count('id', filter=del_mes),
+                efectivas=Count('id', filter=del_mes & efectivas),
+                ingresos=Sum('monto_total', filter=del_mes & efectivas),
+                horas=Sum(
+                    HorasEnRango(datetime.combine(inicio, time.min), datetime.combine(siguiente, time.min)),
+                    filter=efectivas
+                ),
+            )
+        )
+
+        areas = list(AreaComun.objects.filter(activo=True, activa=True))
+        semanas = disponibilidad_service.horarios_semanales(areas)
+        horas_programadas = sum(
+            self.horas_programadas(semanas[area.pk], inicio, siguiente) for area in areas
+        )
+        activas = {area.pk for area in areas}
+        horas_reservadas = sum(fila['horas'] or 0 for fila in por_area if fila['area_comun_id'] in activas)
+
+        populares = sorted(
+            (fila for fila in por_area if fila['reservas_mes']),
+            key=lambda fila: fila['reservas_mes'], reverse=True
+        )[:5]
+        estadisticas = {
+            'total_reservas': sum(fila['efectivas'] for fila in por_area),
+            'ingresos_generados': str(sum((fila['ingresos'] or Decimal('0.00') for fila in por_area), Decimal('0.00'))),
+            'area_mas_popular': populares[0]['area_comun__nombre'] if populares else 'N/A',
+            'promedio_ocupacion': round(horas_reservadas / horas_programadas * 100, 1) if horas_programadas else 0.0,
+            'horas_reservadas': round(horas_reservadas, 1),
+            'horas_programadas': round(horas_programadas, 1),
+            'areas_populares': [
+                {'area_comun__nombre': fila['area_comun__nombre'], 'reservas_mes': fila['reservas_mes']}
+                for fila in populares
+            ],
+        }
+        cache.set(clave, estadisticas, CACHE_ESTADISTICAS_SEGUNDOS)
+        return estadisticas
+
+    def dashboard(self, usuario) -> Dict[str, Any]:
+        """
+        Datos del dashboard, cacheados por (mes, alcance del usuario)
+
+        Los administradores ven todas las reservas y el resto solo las suyas.
+        """
+        hoy = timezone.localdate()
+        alcance = 'admin' if usuario.is_superuser else f'usuario-{usuario.pk}'
+        clave = f'areas:dashboard:{hoy:%Y-%m}:{alcance}'
+        datos = cache.get(clave)
+        if datos is not None:
+            return datos
+
+        resumen = AreaComun.objects.filter(activo=True).annotate(
+            ocupada=Exists(Reserva.objects.filter(
+                area_comun=OuterRef('pk'),
+                estado__in=ESTADOS_OCUPAN,
+                fecha_inicio__lte=hoy,
+                fecha_fin__gte=hoy,
+            ))
+        ).aggregate(
+            total=Count('pk'),
+            ocupadas=Count('pk', filter=Q(ocupada=True)),
+        )
+
+        reservas_usuario = Reserva.objects.all() if usuario.is_superuser else Reserva.objects.filter(usuario=usuario)
+        mis_reservas = reservas_usuario.aggregate(
+            activas=Count('id', filter=Q(fecha_inicio__gte=hoy, estado__in=['confirmada', 'en_uso'])),
+            proximas=Count('id', filter=Q(fecha_inicio__gt=hoy, estado='confirmada')),
+            pendientes_pago=Count('id', filter=Q(estado='pendiente', monto_pagado__lt=models.F('monto_total'))),
+        )
+
+        proximas = Reserva.objects.filter(
+            fecha_inicio__gte=hoy,
+            estado='confirmada'
+        ).select_related('area_comun', 'usuario').order_by('fecha_inicio', 'hora_inicio')[:5]
+        proximas_data = []
+        for reserva in proximas:
+            usuario_name = getattr(reserva.usuario, 'get_full_name', lambda: 'Usuario')() or str(reserva.usuario)
+            proximas_data.append({
+                'id': reserva.pk,
+                'area': reserva.area_comun.nombre,
+                'fecha': reserva.fecha_inicio.strftime('%Y-%m-%d'),
+                'hora': reserva.hora_inicio.strftime('%H:%M'),
+                'usuario': usuario_name,
+                'evento': reserva.motivo_evento or 'Sin especificar'
+            })
+
+        estadisticas = dict(self.estadisticas_mes(hoy))
+        areas_populares = estadisticas.pop('areas_populares')
+        datos = {
+            'resumen': {
+                'total_areas': resumen['total'],
+                'areas_disponibles': resumen['total'] - resumen['ocupadas'],
+                'areas_ocupadas': resumen['ocupadas'],
+                'areas_mantenimiento': 0
+            },
+            'mis_reservas': mis_reservas,
+            'estadisticas_mes': estadisticas,
+            'proximas_reservas': proximas_data,
+            'areas_populares': areas_populares,
+        }
+        cache.set(clave, datos, CACHE_DASHBOARD_SEGUNDOS)
+        return datos
+
+
+class _Eco:
+    """Destino de csv.writer que devuelve la línea escrita en lugar de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def csv_stream(filas: Iterable[Dict[str, Any]], columnas: List[str]) -> Iterator[str]:
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(columnas)
+    for fila in filas:
+        yield escritor.writerow([fila.get(columna, '') for columna in columnas])
+
+
+class ReporteUsoService:
+    """Reporte de uso de áreas comunes sobre rangos arbitrarios (CU-WEB-018)"""
+
+    def _base(self, desde: date, hasta: date, area_id: Optional[int]):
+        reservas = Reserva.objects.filter(fecha_inicio__gte=desde, fecha_inicio__lte=hasta).order_by()
+        if area_id is not None:
+            reservas = reservas.filter(area_comun_id=area_id)
+        return reservas
+
+    def areas(self, desde: date, hasta: date, area_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Una entrada por área con totales, tasa de cancelación, ingresos, horas,
+        mapa de calor 7 x 24 (lunes a domingo, hora de inicio) y horas pico
+
+        Dos consultas agregadas: resumen por área y celdas del mapa de calor.
+        """
+        horas = HorasEnRango(datetime.combine(desde, time.min),
+                             datetime.combine(hasta + timedelta(days=1), time.min))
+        efectivas = Q(estado__in=ESTADOS_EFECTIVOS)
+        reservas = self._base(desde, hasta, area_id)
+
+        celdas: Dict[int, List[List[int]]] = {}
+        horas_celda: Dict[int, List[List[float]]] = {}
+        for fila in (
+            reservas.filter(efectivas)
+            .annotate(dia=ExtractIsoWeekDay('fecha_inicio'), hora=ExtractHour('hora_inicio'))
+            .values('area_comun_id', 'dia', 'hora')
+            .annotate(reservas=Count('id'), horas=Sum(horas))
+            .iterator()
+        ):
+            area = fila['area_comun_id']
+            if area not in celdas:
+                celdas[area] = [[0] * 24 for _ in range(7)]
+                horas_celda[area] = [[0.0] * 24 for _ in range(7)]
+            celdas[area][fila['dia'] - 1][fila['hora']] = fila['reservas']
+            horas_celda[area][fila['dia'] - 1][fila['hora']] = round(fila['horas'] or 0, 2)
+
+        resumen = (
+            reservas.values('area_comun_id', 'area_comun__nombre')
+            .annotate(
+                total=Count('id'),
+                efectivas=Count('id', filter=efectivas),
+                canceladas=Count('id', filter=Q(estado='cancelada')),
+                expiradas=Count('id', filter=Q(estado='expirada')),
+                ingresos=Sum('monto_total', filter=efectivas),
+                cobrado=Sum('monto_pagado'),
+                horas=Sum(horas, filter=efectivas),
+            )
+            .order_by('area_comun__nombre')
+        )
+        for fila in resumen.iterator():
+            area = fila['area_comun_id']
+            mapa = celdas.get(area, [[0] * 24 for _ in range(7)])
+            por_hora = [sum(dia[hora] for dia in mapa) for hora in range(24)]
+            pico = sorted((h for h in range(24) if por_hora[h]), key=lambda h: por_hora[h], reverse=True)[:3]
+            yield {
+                'area_id': area,
+                'area': fila['area_comun__nombre'],
+                'total_reservas': fila['total'],
+                'efectivas': fila['efectivas'],
+                'canceladas': fila['canceladas'],
+                'expiradas': fila['expiradas'],
+                'tasa_cancelacion': round(fila['canceladas'] / fila['total'] * 100, 1) if fila['total'] else 0.0,
+                'ingresos': str(fila['ingresos'] or Decimal('0.00')),
+                'cobrado': str(fila['cobrado'] or Decimal('0.00')),
+                'horas_reservadas': round(fila['horas'] or 0, 1),
+                'horas_pico': [f'{h:02d}:00' for h in pico],
+                'heatmap': {
+                    'reservas': mapa,
+                    'horas': horas_celda.get(area, [[0.0] * 24 for _ in range(7)]),
+                },
+            }
+
+    def filas_heatmap(self, areas: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Aplanar el mapa de calor a una fila por (área, día, hora) con uso"""
+        for area in areas:
+            for dia, horas in enumerate(area['heatmap']['reservas']):
+                for hora, reservas in enumerate(horas):
+                    if reservas:
+                        yield {
+                            'area_id': area['area_id'],
+                            'area': area['area'],
+                            'dia_semana': DIAS_SEMANA[dia],
+                            'hora': f'{hora:02d}:00',
+                            'reservas': reservas,
+                            'horas_reservadas': area['heatmap']['horas'][dia][hora],
+                        }
+
+    def csv(self, desde: date, hasta: date, vista: str = 'resumen',
+            area_id: Optional[int] = None) -> Iterator[str]:
+        areas = self.areas(desde, hasta, area_id)
+        if vista == 'heatmap':
+            return csv_stream(self.filas_heatmap(areas), COLUMNAS_HEATMAP)
+        return csv_stream(
+            ({**area, 'horas_pico': ' '.join(area['horas_pico'])} for area in areas),
+            COLUMNAS_RESUMEN
+        )
+
+    def json(self, desde: date, hasta: date, area_id: Optional[int] = None) -> Iterator[str]:
+        """Documento {'success', 'data': {...,'areas': [...]}} emitido área por área"""
+        cabecera = json.dumps({'desde': desde.isoformat(), 'hasta': hasta.isoformat(), 'dias_semana': DIAS_SEMANA})
+        yield '{"success": true, "data": ' + cabecera[:-1] + ', "areas": ['
+        for i, area in enumerate(self.areas(desde, hasta, area_id)):
+            yield (',' if i else '') + json.dumps(area, cls=DjangoJSONEncoder)
+        yield ']}}'
+
+
+# Instancia global del servicio
+reportes_service = ReportesAreasService()
+reporte_uso_service = ReporteUsoService()
@@ -3,7 +3,10 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import datetime, date, time
 from decimal import Decimal
-from .models import AreaComun, HorarioArea, Reserva
+from .models import AreaComun, HorarioArea, ListaEspera, Reserva, SerieReserva
+from .services import reserva_service
+from .availability import disponibilidad_service
+from .waitlist import lista_espera_service
 
 User = get_user_model()
 
@@ -23,78 +26,33 @@ class HorarioAreaSerializer(serializers.ModelSerializer):
 # =================== SERIALIZERS PARA ÁREAS COMUNES ===================
 
 class AreaComunListSerializer(serializers.ModelSerializer):
-    """Serializer para lista de áreas comunes"""
-    disponible_hoy = serializers.SerializerMethodField()
+    """
+    Serializer para lista de áreas comunes
+
+    disponible_hoy, reservas_activas y total_reservas_mes vienen anotados por
+    AreaComun.objects.with_list_stats(); no consulta nada por área.
+    """
+    disponible_hoy = serializers.BooleanField(read_only=True)
     proxima_disponibilidad = serializers.SerializerMethodField()
-    reservas_activas = serializers.SerializerMethodField()
-    total_reservas_mes = serializers.SerializerMethodField()
-    equipamiento = serializers.SerializerMethodField()
-    imagen_principal = serializers.SerializerMethodField()
+    reservas_activas = serializers.IntegerField(read_only=True)
+    total_reservas_mes = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = AreaComun
         fields = [
-            'id', 'nombre', 'descripcion', 'tipo_reserva',
-            'capacidad', 'precio_hora', 'deposito_garantia',
+            'id', 'nombre', 'descripcion', 'tipo',
+            'capacidad_maxima', 'tarifa_uso', 'requiere_pago',
             'disponible_hoy', 'proxima_disponibilidad',
             'reservas_activas', 'total_reservas_mes',
             'equipamiento', 'imagen_principal', 'activo'
         ]
     
-    def get_disponible_hoy(self, obj):
-        """Verificar si el área está disponible hoy"""
-        hoy = date.today()
-        dia_semana = hoy.isoweekday()  # 1=Lunes, 7=Domingo
-        
-        # Verificar si hay horarios configurados para hoy
-        horarios_hoy = HorarioArea.objects.filter(
-            area_comun=obj,
-            dia_semana=dia_semana,
-            activo=True
-        ).exists()
-        
-        if not horarios_hoy:
-            return False
-            
-        # Verificar si hay conflictos con reservas
-        reservas_hoy = Reserva.objects.filter(
-            area_comun=obj,
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy,
-            estado__in=['confirmada', 'en_uso']
-        ).exists()
-        
-        return not reservas_hoy
-    
     def get_proxima_disponibilidad(self, obj):
-        """Obtener próxima fecha/hora disponible"""
-        # Implementación simplificada - devuelve mañana a las 8:00
-        mañana = date.today() + timezone.timedelta(days=1)
-        return datetime.combine(mañana, time(8, 0)).isoformat() + 'Z'
-    
-    def get_reservas_activas(self, obj):
-        """Contar reservas activas (confirmadas o en uso)"""
-        return Reserva.objects.filter(
-            area_comun=obj,
-            estado__in=['confirmada', 'en_uso']
-        ).count()
-    
-    def get_total_reservas_mes(self, obj):
-        """Contar reservas del mes actual"""
-        hoy = date.today()
-        return Reserva.objects.filter(
-            area_comun=obj,
-            fecha_inicio__year=hoy.year,
-            fecha_inicio__month=hoy.month
-        ).count()
-    
-    def get_equipamiento(self, obj):
-        """Obtener lista de equipamiento"""
-        return obj.servicios_incluidos if obj.servicios_incluidos else []
-    
-    def get_imagen_principal(self, obj):
-        """Obtener imagen principal del área"""
-        return obj.foto_url if obj.foto_url else None
+        """Primer inicio reservable según horarios, anticipación y duración mínima"""
+        proximas = self.context.get('proximas')
+        if proximas is None or obj.pk not in proximas:
+            proximas = disponibilidad_service.proxima_disponibilidad([obj])
+        return proximas[obj.pk]
 
 class AreaComunDetailSerializer(serializers.ModelSerializer):
     """Serializer detallado para área común"""
@@ -214,6 +172,7 @@ class ReservaListSerializer(serializers.ModelSerializer):
     usuario_info = serializers.SerializerMethodField()
     duracion_horas = serializers.SerializerMethodField()
     estado_pago = serializers.SerializerMethodField()
+    pago_limite = serializers.SerializerMethodField()
     dias_restantes = serializers.SerializerMethodField()
     puede_cancelar = serializers.SerializerMethodField()
     
@@ -223,7 +182,7 @@ class ReservaListSerializer(serializers.ModelSerializer):
             'id', 'area', 'usuario_info', 'fecha_inicio', 'fecha_fin',
             'hora_inicio', 'hora_fin', 'duracion_horas', 'motivo_evento',
             'numero_personas', 'estado', 'monto_total', 'estado_pago',
-            'fecha_creacion', 'dias_restantes', 'puede_cancelar'
+            'pago_limite', 'fecha_creacion', 'dias_restantes', 'puede_cancelar'
         ]
     
     def get_area(self, obj):
@@ -276,6 +235,11 @@ class ReservaListSerializer(serializers.ModelSerializer):
         else:
             return "pendiente"
     
+    def get_pago_limite(self, obj):
+        """Hasta cuándo puede pagarse una reserva pendiente antes de expirar"""
+        limite = reserva_service.plazo_pago(obj)
+        return limite.isoformat() if limite else None
+    
     def get_dias_restantes(self, obj):
         """Días restantes para la reserva"""
         if obj.fecha_inicio <= date.today():
@@ -284,7 +248,7 @@ class ReservaListSerializer(serializers.ModelSerializer):
     
     def get_puede_cancelar(self, obj):
         """Verificar si se puede cancelar"""
-        if obj.estado in ['cancelada', 'completada']:
+        if obj.estado in ['cancelada', 'completada', 'expirada']:
             return False
         return obj.fecha_inicio > date.today()
 
@@ -328,43 +292,15 @@ class ReservaCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("La hora de fin debe ser mayor a la hora de inicio")
         
         # Validar capacidad
-        if numero_personas and numero_personas > area_comun.capacidad:
-            raise serializers.ValidationError(f"El número de personas excede la capacidad máxima ({area_comun.capacidad})")
-        
-        # Validar disponibilidad (verificar conflictos)
-        conflictos = Reserva.objects.filter(
-            area_comun=area_comun,
-            estado__in=['confirmada', 'en_uso'],
-            fecha_inicio__lte=fecha_fin,
-            fecha_fin__gte=fecha_inicio
-        )
-        
-        # Filtrar por horarios que se solapan
-        for reserva in conflictos:
-            if self._horarios_se_solapan(
-                hora_inicio, hora_fin,
-                reserva.hora_inicio, reserva.hora_fin,
-                fecha_inicio, fecha_fin,
-                reserva.fecha_inicio, reserva.fecha_fin
-            ):
-                raise serializers.ValidationError("Ya existe una reserva confirmada en ese horario")
+        if numero_personas and area_comun.capacidad_maxima and numero_personas > area_comun.capacidad_maxima:
+            raise serializers.ValidationError(
+                f"El número de personas excede la capacidad máxima ({area_comun.capacidad_maxima})"
+            )
         
+        # Los solapamientos no se revisan aquí: la restricción de exclusión de
+        # PostgreSQL los rechaza al insertar (ver reserva_service.crear)
         return attrs
     
-    def _horarios_se_solapan(self, h1_inicio, h1_fin, h2_inicio, h2_fin, f1_inicio, f1_fin, f2_inicio, f2_fin):
-        """Verificar si dos horarios se solapan"""
-        # Si las fechas no se solapan, no hay conflicto
-        if f1_fin < f2_inicio or f2_fin < f1_inicio:
-            return False
-        
-        # Si hay solapamiento de fechas, verificar horarios
-        if f1_inicio == f2_inicio and f1_fin == f2_fin:
-            # Mismo día, verificar horarios
-            return not (h1_fin <= h2_inicio or h2_fin <= h1_inicio)
-        
-        # Para casos de múltiples días, considerar solapamiento
-        return True
-    
     def create(self, validated_data):
         """Crear reserva calculando el monto"""
         # Extraer datos adicionales
@@ -376,37 +312,120 @@ class ReservaCreateSerializer(serializers.ModelSerializer):
         if request and hasattr(request, 'user'):
             validated_data['usuario'] = request.user
         
-        # Calcular monto total
-        area_comun = validated_data['area_comun']
-        duracion = self._calcular_duracion(
+        # Calcular monto total (tarifa de uso por hora)
+        validated_data['monto_total'] = reserva_service.calcular_monto(
+            validated_data['area_comun'],
             validated_data['fecha_inicio'],
             validated_data['fecha_fin'],
             validated_data['hora_inicio'],
             validated_data['hora_fin']
         )
         
-        if area_comun.tipo_reserva == 'por_horas':
-            monto_base = area_comun.precio_hora * Decimal(str(duracion))
-        else:
-            dias = (validated_data['fecha_fin'] - validated_data['fecha_inicio']).days + 1
-            monto_base = area_comun.precio_dia * Decimal(str(dias)) if area_comun.precio_dia else area_comun.precio_hora * Decimal(str(duracion))
-        
-        validated_data['monto_total'] = monto_base
-        
-        # Crear reserva
-        reserva = super().create(validated_data)
-        
-        # Aquí podrías guardar información adicional en campos JSON o tablas relacionadas
-        # Por ahora simplificamos
-        
-        return reserva
-    
-    def _calcular_duracion(self, fecha_inicio, fecha_fin, hora_inicio, hora_fin):
-        """Calcular duración en horas"""
-        inicio = datetime.combine(fecha_inicio, hora_inicio)
-        fin = datetime.combine(fecha_fin, hora_fin)
-        duracion = fin - inicio
-        return duracion.total_seconds() / 3600
+        # Crear reserva; lanza ConflictoReserva si el horario ya está ocupado
+        return reserva_service.crear(**validated_data)
+
+class SerieReservaCreateSerializer(serializers.Serializer):
+    """Serializer para crear reservas recurrentes (regla estilo RRULE)"""
+    area_comun = serializers.PrimaryKeyRelatedField(queryset=AreaComun.objects.filter(activo=True))
+    frecuencia = serializers.ChoiceField(choices=SerieReserva.FRECUENCIA_CHOICES)
+    intervalo = serializers.IntegerField(min_value=1, max_value=12, default=1)
+    dias_semana = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=7),
+        required=False,
+        default=list
+    )
+    fecha_inicio = serializers.DateField()
+    fecha_limite = serializers.DateField(required=False, allow_null=True)
+    repeticiones = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    hora_inicio = serializers.TimeField()
+    hora_fin = serializers.TimeField()
+    motivo_evento = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+    numero_personas = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    todo_o_nada = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        """Validaciones de la regla de repetición"""
+        area_comun = attrs['area_comun']
+
+        if attrs['fecha_inicio'] < date.today():
+            raise serializers.ValidationError("La fecha de inicio no puede ser en el pasado")
+
+        # Cada ocurrencia ocupa un único día
+        if attrs['hora_fin'] <= attrs['hora_inicio']:
+            raise serializers.ValidationError("La hora de fin debe ser mayor a la hora de inicio")
+
+        if not attrs.get('fecha_limite') and not attrs.get('repeticiones'):
+            raise serializers.ValidationError("Debe indicar fecha_limite o repeticiones")
+
+        if attrs.get('fecha_limite') and attrs['fecha_limite'] < attrs['fecha_inicio']:
+            raise serializers.ValidationError("fecha_limite debe ser posterior o igual a fecha_inicio")
+
+        if attrs['dias_semana'] and attrs['frecuencia'] != 'semanal':
+            raise serializers.ValidationError("dias_semana solo aplica a la frecuencia semanal")
+
+        numero_personas = attrs.get('numero_personas')
+        if numero_personas and area_comun.capacidad_maxima and numero_personas > area_comun.capacidad_maxima:
+            raise serializers.ValidationError(
+                f"El número de personas excede la capacidad máxima ({area_comun.capacidad_maxima})"
+            )
+
+        return attrs
+
+    def create(self, validated_data):
+        """Expandir la serie e insertar las ocurrencias libres"""
+        request = self.context.get('request')
+        validated_data['area'] = validated_data.pop('area_comun')
+        return reserva_service.crear_serie(usuario=request.user, **validated_data)
+
+class ListaEsperaSerializer(serializers.ModelSerializer):
+    """Serializer para la lista de espera de un horario ocupado"""
+    area_nombre = serializers.CharField(source='area_comun.nombre', read_only=True)
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    reserva_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ListaEspera
+        fields = [
+            'id', 'area_comun', 'area_nombre', 'fecha_inicio', 'fecha_fin',
+            'hora_inicio', 'hora_fin', 'motivo_evento', 'numero_personas',
+            'prioridad', 'estado', 'estado_display', 'reserva_id',
+            'asignada_en', 'created_at'
+        ]
+        read_only_fields = ['estado', 'asignada_en', 'created_at']
+
+    def validate(self, attrs):
+        """Solo se espera por horarios válidos que hoy estén ocupados"""
+        area_comun = attrs['area_comun']
+        fecha_inicio = attrs['fecha_inicio']
+        fecha_fin = attrs['fecha_fin']
+        hora_inicio = attrs['hora_inicio']
+        hora_fin = attrs['hora_fin']
+
+        if fecha_inicio < date.today():
+            raise serializers.ValidationError("La fecha de inicio no puede ser en el pasado")
+
+        if fecha_fin < fecha_inicio or (fecha_inicio == fecha_fin and hora_fin <= hora_inicio):
+            raise serializers.ValidationError("El fin del horario debe ser posterior al inicio")
+
+        numero_personas = attrs.get('numero_personas')
+        if numero_personas and area_comun.capacidad_maxima and numero_personas > area_comun.capacidad_maxima:
+            raise serializers.ValidationError(
+                f"El número de personas excede la capacidad máxima ({area_comun.capacidad_maxima})"
+            )
+
+        if not lista_espera_service.horario_ocupado(area_comun.pk, fecha_inicio, hora_inicio, fecha_fin, hora_fin):
+            raise serializers.ValidationError("El horario está libre; reserve directamente")
+
+        # Solo la administración asigna prioridad; los residentes entran por orden de llegada
+        request = self.context.get('request')
+        if not (request and request.user.is_superuser):
+            attrs['prioridad'] = 0
+
+        return attrs
+
+    def create(self, validated_data):
+        validated_data['usuario'] = self.context['request'].user
+        return super().create(validated_data)
 
 # =================== SERIALIZERS PARA REPORTES ===================
 
@@ -0,0 +1,350 @@
+"""
+Servicios de reservas de áreas comunes
+La validación de solapamientos la hace PostgreSQL con la restricción de
+exclusión `reserva_sin_solapamiento`; aquí se traduce su violación a un error
+de negocio
+"""
+import calendar
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .availability import disponibilidad_service
+from .models import AreaComun, ListaEspera, Reserva, SerieReserva
+from .occupancy import calendario_service
+
+logger = logging.getLogger(__name__)
+
+RESTRICCION_SOLAPAMIENTO = 'reserva_sin_solapamiento'
+
+# Horas que tiene una reserva pendiente con saldo para pagarse antes de expirar
+PLAZO_PAGO_HORAS = 24
+
+# Máximo de ocurrencias que puede generar una serie de reservas
+MAX_OCURRENCIAS = 104
+
+
+# Se emite dentro de la transacción de la cancelación con `reserva` y `usuario`;
+# los receptores que escriben en la base quedan en la misma transacción
+reserva_cancelada = Signal()
+
+# Igual que reserva_cancelada, para cada reserva que el barrido de estados expira
+reserva_expirada = Signal()
+
+
+class ConflictoReserva(Exception):
+    """El horario pedido se cruza con otra reserva activa del área"""
+
+
+def es_conflicto(error: IntegrityError) -> bool:
+    """Distinguir la violación de la exclusión de otros errores de integridad"""
+    causa = getattr(error, '__cause__', None)
+    diag = getattr(causa, 'diag', None)
+    nombre = getattr(diag, 'constraint_name', None)
+    return nombre == RESTRICCION_SOLAPAMIENTO or RESTRICCION_SOLAPAMIENTO in str(error)
+
+
+def expandir_ocurrencias(frecuencia: str, fecha_inicio: date, intervalo: int = 1,
+                         dias_semana: Optional[List[int]] = None, fecha_limite: Optional[date] = None,
+                         repeticiones: Optional[int] = None) -> List[date]:
+    """
+    Fechas de una regla de repetición (subconjunto de RRULE)
+
+    - diaria: cada `intervalo` días
+    - semanal: los `dias_semana` (1 = lunes; por defecto el de fecha_inicio)
+      de cada `intervalo` semanas
+    - mensual: el mismo día del mes cada `intervalo` meses; los meses sin ese
+      día se saltan
+
+    Termina en `fecha_limite` (inclusive) o tras `repeticiones` fechas, y
+    nunca pasa de MAX_OCURRENCIAS.
+    """
+    limite = min(repeticiones or MAX_OCURRENCIAS, MAX_OCURRENCIAS)
+    fechas: List[date] = []
+
+    def _agregar(fecha: date) -> bool:
+        if fecha_limite and fecha > fecha_limite:
+            return False
+        if fecha >= fecha_inicio:
+            fechas.append(fecha)
+        return len(fechas) < limite
+
+    if frecuencia == 'diaria':
+        fecha = fecha_inicio
+        while _agregar(fecha):
+            fecha += timedelta(days=intervalo)
+    elif frecuencia == 'semanal':
+        dias = sorted(set(dias_semana or [fecha_inicio.isoweekday()]))
+        lunes = fecha_inicio - timedelta(days=fecha_inicio.weekday())
+        continuar = True
+        while continuar:
+            for dia in dias:
+                continuar = _agregar(lunes + timedelta(days=dia - 1))
+                if not continuar:
+                    break
+            lunes += timedelta(weeks=intervalo)
+    elif frecuencia == 'mensual':
+        anio, mes = fecha_inicio.year, fecha_inicio.month
+        # Con fecha límite o repeticiones el ciclo termina antes; esto solo acota meses sin ese día
+        for _ in range(MAX_OCURRENCIAS * intervalo):
+            if fecha_inicio.day <= calendar.monthrange(anio, mes)[1]:
+                if not _agregar(date(anio, mes, fecha_inicio.day)):
+                    break
+            mes += intervalo
+            anio, mes = anio + (mes - 1) // 12, (mes - 1) % 12 + 1
+    else:
+        raise ValueError(f'Frecuencia no soportada: {frecuencia}')
+    return fechas
+
+
+class ReservaService:
+    """Servicio para crear reservas sin dobles asignaciones"""
+
+    @staticmethod
+    def duracion_horas(fecha_inicio, fecha_fin, hora_inicio, hora_fin) -> float:
+        inicio = datetime.combine(fecha_inicio, hora_inicio)
+        fin = datetime.combine(fecha_fin, hora_fin)
+        return (fin - inicio).total_seconds() / 3600
+
+    def calcular_monto(self, area: AreaComun, fecha_inicio, fecha_fin, hora_inicio, hora_fin) -> Decimal:
+        """La tarifa de uso del área es por hora"""
+        horas = self.duracion_horas(fecha_inicio, fecha_fin, hora_inicio, hora_fin)
+        return (area.tarifa_uso * Decimal(str(horas))).quantize(Decimal('0.01'))
+
+    def crear(self, **datos: Any) -> Reserva:
+        """
+        Insertar la reserva en su propio savepoint
+
+        Raises:
+            ConflictoReserva: si otra reserva activa ocupa el horario, incluso
+            cuando ambas peticiones llegan a la vez
+        """
+        try:
+            with transaction.atomic():
+                reserva = Reserva.objects.create(**datos)
+        except IntegrityError as e:
+            if es_conflicto(e):
+                raise ConflictoReserva('Ya existe una reserva activa en ese horario') from e
+            raise
+        self._liberar_caches(reserva)
+        return reserva
+
+    def crear_serie(self, usuario, area: AreaComun, frecuencia: str, fecha_inicio: date,
+                    hora_inicio, hora_fin, intervalo: int = 1, dias_semana: Optional[List[int]] = None,
+                    fecha_limite: Optional[date] = None, repeticiones: Optional[int] = None,
+                    motivo_evento: str = '', numero_personas: Optional[int] = None,
+                    todo_o_nada: bool = False) -> Dict[str, Any]:
+        """
+        Crear una serie de reservas recurrentes
+
+        Las ocurrencias se expanden en memoria y se contrastan con las reservas
+        activas del área en una sola consulta por rango; las libres se insertan
+        con un bulk_create. Las reservas activas de un área nunca se solapan
+        entre sí (restricción de exclusión), así que ambas listas ordenadas se
+        recorren con dos punteros.
+
+        Returns:
+            {'serie', 'reservas', 'conflictos'}; con `todo_o_nada` no se crea
+            nada si alguna ocurrencia choca
+
+        Raises:
+            ConflictoReserva: si una reserva concurrente ocupa alguna ocurrencia
+            entre la verificación y la inserción
+        """
+        fechas = expandir_ocurrencias(frecuencia, fecha_inicio, intervalo, dias_semana,
+                                      fecha_limite, repeticiones)
+        if not fechas:
+            return {'serie': None, 'reservas': [], 'conflictos': []}
+
+        ocupadas = sorted(
+            (disponibilidad_service.intervalo_reserva(r), r['id'])
+            for r in disponibilidad_service.reservas(area, fechas[0], fechas[-1])
+        )
+        libres, conflictos = [], []
+        j = 0
+        for fecha in fechas:
+            inicio, fin = datetime.combine(fecha, hora_inicio), datetime.combine(fecha, hora_fin)
+            while j < len(ocupadas) and ocupadas[j][0][1] <= inicio:
+                j += 1
+            if j < len(ocupadas) and ocupadas[j][0][0] < fin:
+                conflictos.append({
+                    'fecha': fecha.isoformat(),
+                    'hora_inicio': hora_inicio.isoformat(),
+                    'hora_fin': hora_fin.isoformat(),
+                    'reserva_id': ocupadas[j][1],
+                })
+            else:
+                libres.append(fecha)
+
+        if not libres or (todo_o_nada and conflictos):
+            return {'serie': None, 'reservas': [], 'conflictos': conflictos}
+
+        monto = self.calcular_monto(area, fecha_inicio, fecha_inicio, hora_inicio, hora_fin)
+        try:
+            with transaction.atomic():
+                serie = SerieReserva.objects.create(
+                    usuario=usuario, area_comun=area, frecuencia=frecuencia, intervalo=intervalo,
+                    dias_semana=dias_semana or [], fecha_inicio=fecha_inicio, fecha_limite=fecha_limite,
+                    repeticiones=repeticiones, hora_inicio=hora_inicio, hora_fin=hora_fin,
+                    motivo_evento=motivo_evento,
+                )
+                reservas = Reserva.objects.bulk_create([
+                    Reserva(
+                        usuario=usuario, area_comun=area, serie=serie,
+                        fecha_inicio=fecha, fecha_fin=fecha,
+                        hora_inicio=hora_inicio, hora_fin=hora_fin,
+                        monto_total=monto, motivo_evento=motivo_evento,
+                        numero_personas=numero_personas,
+                    )
+                    for fecha in libres
+                ])
+        except IntegrityError as e:
+            if es_conflicto(e):
+                raise ConflictoReserva('Otra reserva ocupó parte de la serie mientras se creaba; intente de nuevo') from e
+            raise
+
+        disponibilidad_service.invalidar(area.pk)
+        calendario_service.invalidar(area.pk, libres[0], libres[-1])
+        return {'serie': serie, 'reservas': reservas, 'conflictos': conflictos}
+
+    def cancelar(self, reserva: Reserva, motivo: str, usuario=None) -> Reserva:
+        """
+        Cancelar la reserva y liberar su horario
+
+        La señal `reserva_cancelada` se emite en la misma transacción, así que
+        si un receptor (la lista de espera) falla, la cancelación se revierte.
+        """
+        with transaction.atomic():
+            reserva.estado = 'cancelada'
+            reserva.motivo_cancelacion = motivo
+            reserva.fecha_cancelacion = timezone.now()
+            reserva.cancelada_por = usuario
+            reserva.save(update_fields=[
+                'estado', 'motivo_cancelacion', 'fecha_cancelacion', 'cancelada_por', 'updated_at'
+            ])
+            reserva_cancelada.send(sender=Reserva, reserva=reserva, usuario=usuario)
+            self._liberar_caches(reserva)
+        return reserva
+
+    @staticmethod
+    def cobro_activo() -> bool:
+        """
+        Si se exige el pago de las reservas (RESERVAS_EXPIRAR_SIN_PAGO)
+
+        Mientras ningún flujo registre monto_pagado, exigirlo expiraría toda
+        reserva de un área con cobro, así que por defecto está apagado.
+        """
+        return getattr(settings, 'RESERVAS_EXPIRAR_SIN_PAGO', False)
+
+    def _sin_cobro(self) -> Q:
+        """Reservas que no deben nada: pagadas por completo, en áreas sin cobro o con el cobro apagado"""
+        if not self.cobro_activo():
+            return Q(pk__isnull=False)
+        return Q(monto_pagado__gte=F('monto_total')) | Q(area_comun__requiere_pago=False)
+
+    def plazo_pago(self, reserva: Reserva) -> Optional[datetime]:
+        """
+        Momento en que una reserva pendiente con saldo expira si no se paga
+
+        El menor entre PLAZO_PAGO_HORAS desde su creación y su hora de inicio;
+        None si no debe nada o ya no está pendiente.
+        """
+        if (not self.cobro_activo() or reserva.estado != 'pendiente' or not reserva.area_comun.requiere_pago
+                or reserva.monto_pagado >= reserva.monto_total):
+            return None
+        inicio = timezone.make_aware(datetime.combine(reserva.fecha_inicio, reserva.hora_inicio))
+        return min(reserva.fecha_creacion + timedelta(hours=PLAZO_PAGO_HORAS), inicio)
+
+    @staticmethod
+    def _alcanzado(campo_fecha: str, campo_hora: str, ahora: datetime) -> Q:
+        """fecha + hora <= ahora, expresado sobre las columnas para usar los índices"""
+        return (Q(**{f'{campo_fecha}__lt': ahora.date()})
+                | Q(**{campo_fecha: ahora.date(), f'{campo_hora}__lte': ahora.time()}))
+
+    def avanzar_estados(self, ahora: Optional[datetime] = None, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Avanzar el ciclo de vida de las reservas con UPDATEs por conjuntos
+
+        - pendiente → confirmada: pagada por completo, en un área que no
+          requiere pago o con RESERVAS_EXPIRAR_SIN_PAGO apagado (no hay otro
+          paso que las confirme)
+        - pendiente → expirada: solo con RESERVAS_EXPIRAR_SIN_PAGO, con saldo
+          y sin pagar tras PLAZO_PAGO_HORAS o al llegar su hora de inicio
+        - confirmada/en_uso → completada: cuando termina
+        - confirmada → en_uso: cuando empieza y aún no termina
+        - lista de espera → vencida: cuando llega la hora de inicio sin que se
+          haya liberado el horario
+
+        Las reservas que expiran liberan horario: se emite `reserva_expirada`
+        por cada una (la lista de espera lo reasigna en esta transacción) y se
+        invalidan las cachés de disponibilidad y calendario de sus áreas.
+        """
+        local = ahora or timezone.localtime()
+        naive = local.replace(tzinfo=None)
+        empezo = self._alcanzado('fecha_inicio', 'hora_inicio', naive)
+        termino = self._alcanzado('fecha_fin', 'hora_fin', naive)
+
+        sin_cobro = self._sin_cobro()
+        confirmables = Reserva.objects.filter(estado='pendiente').filter(sin_cobro)
+        expirables = Reserva.objects.filter(estado='pendiente').exclude(sin_cobro).filter(
+            Q(fecha_creacion__lte=timezone.now() - timedelta(hours=PLAZO_PAGO_HORAS)) | empezo
+        )
+        completables = Reserva.objects.filter(estado__in=['confirmada', 'en_uso']).filter(termino)
+        en_uso = Reserva.objects.filter(estado='confirmada').filter(empezo).exclude(termino)
+        esperas = ListaEspera.objects.filter(estado='esperando').filter(empezo)
+
+        if dry_run:
+            return {
+                'confirmadas': confirmables.count(),
+                'expiradas': expirables.count(),
+                'esperas_asignadas': 0,
+                'completadas': completables.count(),
+                'en_uso': en_uso.count(),
+                'esperas_vencidas': esperas.count(),
+            }
+
+        marca = timezone.now()
+        with transaction.atomic():
+            # Primero se confirman: así no expiran y avanzan a en uso o
+            # completada en este mismo barrido
+            confirmadas = confirmables.update(estado='confirmada', updated_at=marca)
+            expiradas = list(
+                expirables.select_for_update(of=('self',)).order_by()
+                .only('id', 'area_comun_id', 'fecha_inicio', 'hora_inicio', 'fecha_fin', 'hora_fin')
+            )
+            Reserva.objects.filter(pk__in=[r.pk for r in expiradas]).update(estado='expirada', updated_at=marca)
+            asignadas = 0
+            for reserva in expiradas:
+                reserva.estado = 'expirada'
+                respuestas = reserva_expirada.send(sender=Reserva, reserva=reserva)
+                asignadas += sum(len(r or []) for _, r in respuestas)
+            liberadas = {(r.area_comun_id, r.fecha_inicio, r.fecha_fin) for r in expiradas}
+            resultado = {
+                'confirmadas': confirmadas,
+                'expiradas': len(expiradas),
+                'esperas_asignadas': asignadas,
+                'completadas': completables.update(estado='completada', updated_at=marca),
+                'en_uso': en_uso.update(estado='en_uso', updated_at=marca),
+                'esperas_vencidas': esperas.update(estado='vencida', updated_at=marca),
+            }
+            for area_id, fecha_inicio, fecha_fin in liberadas:
+                disponibilidad_service.invalidar(area_id)
+                calendario_service.invalidar(area_id, fecha_inicio, fecha_fin)
+        return resultado
+
+    @staticmethod
+    def _liberar_caches(reserva: Reserva):
+        """Invalidar el índice de huecos y los meses del calendario que toca la reserva"""
+        disponibilidad_service.invalidar(reserva.area_comun_id)
+        calendario_service.invalidar(reserva.area_comun_id, reserva.fecha_inicio, reserva.fecha_fin)
+
+
+# Instancia global del servicio
+reserva_service = ReservaService()
@@ -0,0 +1,14 @@
+"""
+Receptores de señales de áreas comunes
+"""
+from django.dispatch import receiver
+
+from .services import reserva_cancelada, reserva_expirada
+from .waitlist import lista_espera_service
+
+
+@receiver(reserva_cancelada)
+@receiver(reserva_expirada)
+def asignar_lista_espera(sender, reserva, **kwargs):
+    """El horario que libera una cancelación o una expiración pasa a la lista de espera"""
+    return lista_espera_service.promover(reserva)
@@ -0,0 +1,135 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .models import ESTADOS_OCUPAN, AreaComun, HorarioArea, Reserva
+from .services import ConflictoReserva, reserva_service
+from .views import AreaComunListView
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'La restricción de exclusión requiere PostgreSQL')
+class ReservasConcurrentesTests(TransactionTestCase):
+    """Reservas simultáneas por el mismo horario: solo una puede quedar activa"""
+
+    HILOS = 10
+
+    def setUp(self):
+        self.usuario = User.objects.create(
+            email='concurrencia@backresidences.local',
+            username='concurrencia-reservas',
+            documento_numero='CONC-000001',
+        )
+        self.area = AreaComun.objects.create(nombre='Salón concurrencia', tarifa_uso=10000)
+        self.fecha = date.today() + timedelta(days=7)
+
+    def _reservar(self, barrera, inicio, fin):
+        """Una petición: espera a las demás y luego intenta reservar con su propia conexión"""
+        try:
+            barrera.wait(timeout=30)
+            reserva_service.crear(
+                usuario=self.usuario, area_comun=self.area,
+                fecha_inicio=self.fecha, fecha_fin=self.fecha,
+                hora_inicio=inicio, hora_fin=fin,
+                monto_total=20000,
+            )
+            return 'creada'
+        except ConflictoReserva:
+            return 'conflicto'
+        finally:
+            connection.close()
+
+    def test_solo_una_reserva_por_horario(self):
+        barrera = threading.Barrier(self.HILOS)
+        # Mismo horario para la mitad y uno desplazado 30 minutos para la otra:
+        # se solapan sin ser idénticos
+        with ThreadPoolExecutor(max_workers=self.HILOS) as pool:
+            futuros = [
+                pool.submit(self._reservar, barrera, time(10, 30 * (i % 2)), time(12, 30 * (i % 2)))
+                for i in range(self.HILOS)
+            ]
+            resultados = [futuro.result() for futuro in futuros]
+
+        self.assertEqual(resultados.count('creada'), 1)
+        self.assertEqual(resultados.count('conflicto'), self.HILOS - 1)
+        self.assertEqual(
+            Reserva.objects.filter(area_comun=self.area, estado__in=ESTADOS_OCUPAN).count(), 1
+        )
+
+    def test_horarios_contiguos_no_chocan(self):
+        barrera = threading.Barrier(2)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futuros = [
+                pool.submit(self._reservar, barrera, time(10), time(12)),
+                pool.submit(self._reservar, barrera, time(12), time(14)),
+            ]
+            resultados = [futuro.result() for futuro in futuros]
+
+        self.assertEqual(resultados, ['creada', 'creada'])
+
+
+class ListadoAreasConsultasTests(TestCase):
+    """El listado de áreas usa un número fijo de consultas, sin importar cuántas áreas haya"""
+
+    # Conteo de la paginación + página de áreas con sus subconsultas, más horarios
+    # y reservas del lote cuando el índice de próxima disponibilidad no está en caché
+    CONSULTAS = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(
+            email='consultas@backresidences.local',
+            username='consultas-areas',
+            documento_numero='CONS-000001',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _crear_areas(self, cantidad):
+        areas = AreaComun.objects.bulk_create([
+            AreaComun(nombre=f'Área {i:03d}', equipamiento=['Mesas'], tarifa_uso=1000)
+            for i in range(cantidad)
+        ])
+        HorarioArea.objects.bulk_create([
+            HorarioArea(area_comun=area, dia_semana=dia, hora_inicio=time(8), hora_fin=time(22))
+            for area in areas for dia in range(1, 8)
+        ])
+        hoy = date.today()
+        Reserva.objects.bulk_create([
+            Reserva(
+                usuario=self.usuario, area_comun=area,
+                fecha_inicio=hoy + timedelta(days=d), fecha_fin=hoy + timedelta(days=d),
+                hora_inicio=time(10), hora_fin=time(12),
+                monto_total=2000, estado='confirmada',
+            )
+            for area in areas for d in range(3)
+        ])
+        return areas
+
+    def _listar(self):
+        peticion = APIRequestFactory().get('/areas/')
+        force_authenticate(peticion, user=self.usuario)
+        respuesta = AreaComunListView.as_view()(peticion)
+        respuesta.render()
+        return respuesta
+
+    def test_una_area(self):
+        self._crear_areas(1)
+        with self.assertNumQueries(self.CONSULTAS):
+            respuesta = self._listar()
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_muchas_areas(self):
+        self._crear_areas(15)
+        with self.assertNumQueries(self.CONSULTAS):
+            respuesta = self._listar()
+        self.assertEqual(respuesta.status_code, 200)
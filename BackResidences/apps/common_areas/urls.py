@@ -1,10 +1,31 @@
 from django.urls import path
 from . import views
 
-# Router para ViewSets (si los usáramos en el futuro)
-router = DefaultRouter()
-
 # URLs específicas para áreas comunes
 urlpatterns = [
-    # Define your URL patterns for common areas here
-]
\ No newline at end of file
+    # =================== ENDPOINTS DE ÁREAS COMUNES ===================
+    path('areas/', views.AreaComunListView.as_view(), name='area-list'),
+    path('areas/crear/', views.AreaComunCreateView.as_view(), name='area-create'),
+    path('areas/<int:pk>/', views.AreaComunDetailView.as_view(), name='area-detail'),
+    path('areas/<int:pk>/actualizar/', views.AreaComunUpdateView.as_view(), name='area-update'),
+    path('areas/<int:area_id>/disponibilidad/', views.ConsultarDisponibilidadView.as_view(), name='area-disponibilidad'),
+    path('areas/<int:area_id>/horarios/', views.HorarioAreaListView.as_view(), name='area-horarios'),
+    path('calendario/', views.CalendarioAreasView.as_view(), name='area-calendario'),
+
+    # =================== ENDPOINTS DE RESERVAS ===================
+    path('reservas/', views.ReservaListView.as_view(), name='reserva-list'),
+    path('reservas/crear/', views.ReservaCreateView.as_view(), name='reserva-create'),
+    path('reservas/recurrentes/', views.ReservaSerieCreateView.as_view(), name='reserva-serie-create'),
+    path('reservas/<int:pk>/', views.ReservaDetailView.as_view(), name='reserva-detail'),
+    path('reservas/<int:reserva_id>/cancelar/', views.CancelarReservaView.as_view(), name='reserva-cancelar'),
+
+    # =================== ENDPOINTS DE LISTA DE ESPERA ===================
+    path('lista-espera/', views.ListaEsperaListCreateView.as_view(), name='lista-espera'),
+    path('lista-espera/<int:pk>/cancelar/', views.CancelarListaEsperaView.as_view(), name='lista-espera-cancelar'),
+
+    # =================== ENDPOINTS DE DASHBOARD Y CONFIGURACIÓN ===================
+    path('dashboard/', views.DashboardAreasView.as_view(), name='dashboard'),
+    path('estadisticas/', views.estadisticas_uso, name='estadisticas'),
+    path('reportes/uso/', views.ReporteUsoAreasView.as_view(), name='reporte-uso'),
+    path('configuracion/', views.configuracion_sistema, name='configuracion'),
+]
@@ -1,4 +1,5 @@
 from django.shortcuts import render
+from django.http import StreamingHttpResponse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.db.models import Q, Count, Avg, Sum, QuerySet
@@ -19,11 +20,16 @@ try:
 except ImportError:
     DjangoFilterBackend = None
 
-from .models import AreaComun, HorarioArea, Reserva
+from .models import AreaComun, HorarioArea, ListaEspera, Reserva
+from .availability import disponibilidad_service, MAX_DIAS_CONSULTA
+from .occupancy import calendario_service, SLOT_MINUTOS
+from .reports import MAX_DIAS_REPORTE, reporte_uso_service, reportes_service
+from .services import ConflictoReserva, reserva_service
+from .waitlist import lista_espera_service
 from .serializers import (
     AreaComunListSerializer, AreaComunDetailSerializer, AreaComunCreateSerializer,
-    AreaComunUpdateSerializer, ReservaListSerializer, ReservaCreateSerializer,
-    DisponibilidadSerializer, DashboardAreasSerializer, HorarioAreaSerializer
+    AreaComunUpdateSerializer, ReservaListSerializer, ReservaCreateSerializer, SerieReservaCreateSerializer,
+    DisponibilidadSerializer, DashboardAreasSerializer, HorarioAreaSerializer, ListaEsperaSerializer
 )
 
 User = get_user_model()
@@ -50,9 +56,9 @@ class AreaComunListView(generics.ListAPIView):
     if DjangoFilterBackend:
         filter_backends.insert(0, DjangoFilterBackend)
     
-    filterset_fields = ['tipo_reserva', 'activo']
+    filterset_fields = ['tipo', 'activo']
     search_fields = ['nombre', 'descripcion']
-    ordering_fields = ['nombre', 'precio_hora', 'capacidad', 'fecha_creacion']
+    ordering_fields = ['nombre', 'tarifa_uso', 'capacidad_maxima', 'created_at', 'reservas_activas', 'total_reservas_mes']
     ordering = ['nombre']
 
     @swagger_auto_schema(
@@ -60,7 +66,7 @@ class AreaComunListView(generics.ListAPIView):
         Obtener lista de áreas comunes del condominio
         
         ### Filtros disponibles:
-        - `tipo_reserva`: por_horas, por_dias, eventos
+        - `tipo`: salon_eventos, piscina, gimnasio, bbq, deportiva, juegos, otro
         - `activo`: true/false
         - `requiere_pago`: Areas que requieren pago (true/false)
         - `disponible`: Solo áreas disponibles para reserva (true/false)
@@ -69,7 +75,7 @@ class AreaComunListView(generics.ListAPIView):
         - `search`: buscar por nombre o descripción
         
         ### Ordenamiento:
-        - `ordering`: nombre, precio_hora, capacidad, fecha_creacion
+        - `ordering`: nombre, tarifa_uso, capacidad_maxima, created_at, reservas_activas, total_reservas_mes
         """,
         responses={
             200: openapi.Response(
@@ -84,10 +90,10 @@ class AreaComunListView(generics.ListAPIView):
                                 "id": 1,
                                 "nombre": "Salón Social",
                                 "descripcion": "Salón principal para eventos y reuniones",
-                                "tipo_reserva": "eventos",
-                                "capacidad": 80,
-                                "precio_hora": "37500.00",
-                                "deposito_garantia": "150000.00",
+                                "tipo": "salon_eventos",
+                                "capacidad_maxima": 80,
+                                "tarifa_uso": "37500.00",
+                                "requiere_pago": True,
                                 "disponible_hoy": True,
                                 "proxima_disponibilidad": "2025-09-30T08:00:00Z",
                                 "reservas_activas": 2,
@@ -111,8 +117,23 @@ class AreaComunListView(generics.ListAPIView):
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        areas = list(page if page is not None else queryset)
+
+        # Próxima disponibilidad de toda la página desde el índice en caché
+        contexto = self.get_serializer_context()
+        contexto['proximas'] = disponibilidad_service.proxima_disponibilidad(areas)
+        serializer = self.get_serializer(areas, many=True, context=contexto)
+
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
     def get_queryset(self) -> QuerySet[AreaComun]:  # type: ignore
-        queryset = AreaComun.objects.filter(activo=True)
+        # Una sola consulta: los indicadores por área van como subconsultas anotadas
+        queryset = AreaComun.objects.filter(activo=True).with_list_stats()
         
         # Filtros adicionales usando request
         if hasattr(self, 'request') and self.request:
@@ -120,21 +141,11 @@ class AreaComunListView(generics.ListAPIView):
             
             requiere_pago = query_params.get('requiere_pago')
             if requiere_pago is not None:
-                if requiere_pago.lower() == 'true':
-                    queryset = queryset.filter(precio_hora__gt=0)
-                else:
-                    queryset = queryset.filter(precio_hora=0)
+                queryset = queryset.filter(requiere_pago=requiere_pago.lower() == 'true')
             
             disponible = query_params.get('disponible')
             if disponible is not None and disponible.lower() == 'true':
-                # Filtrar áreas que no tengan reservas activas hoy
-                hoy = date.today()
-                areas_ocupadas = Reserva.objects.filter(
-                    fecha_inicio__lte=hoy,
-                    fecha_fin__gte=hoy,
-                    estado__in=['confirmada', 'en_uso']
-                ).values_list('area_comun_id', flat=True)
-                queryset = queryset.exclude(id__in=areas_ocupadas)
+                queryset = queryset.filter(disponible_hoy=True)
         
         return queryset
 
@@ -283,7 +294,9 @@ class AreaComunUpdateView(generics.UpdateAPIView):
                 'message': 'No tienes permisos para actualizar áreas comunes'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        return super().put(request, *args, **kwargs)
+        respuesta = super().put(request, *args, **kwargs)
+        disponibilidad_service.invalidar(self.kwargs['pk'])
+        return respuesta
 
 class ConsultarDisponibilidadView(APIView):
     """Vista para consultar disponibilidad de área común"""
@@ -338,7 +351,8 @@ class ConsultarDisponibilidadView(APIView):
                                     "horarios_libres": [
                                         {
                                             "inicio": "08:00:00",
-                                            "fin": "14:00:00"
+                                            "fin": "14:00:00",
+                                            "ultimo_inicio": "12:00:00"
                                         }
                                     ],
                                     "reservas_existentes": []
@@ -381,54 +395,32 @@ class ConsultarDisponibilidadView(APIView):
                 'message': 'Formato de fecha inválido. Use YYYY-MM-DD'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Generar disponibilidad por día
-        disponibilidad_por_dia = []
-        fecha_actual = fecha_inicio
+        if fecha_fin < fecha_inicio:
+            return Response({
+                'success': False,
+                'message': 'fecha_fin debe ser posterior o igual a fecha_inicio'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        while fecha_actual <= fecha_fin:
-            dia_semana = fecha_actual.isoweekday()
-            
-            # Obtener horarios configurados para este día
-            horarios_area = HorarioArea.objects.filter(
-                area_comun=area,
-                dia_semana=dia_semana,
-                activo=True
-            )
-            
-            # Obtener reservas existentes para este día
-            reservas_dia = Reserva.objects.filter(
-                area_comun=area,
-                fecha_inicio__lte=fecha_actual,
-                fecha_fin__gte=fecha_actual,
-                estado__in=['confirmada', 'en_uso']
-            )
-            
-            # Calcular horarios libres y ocupados
-            horarios_libres = []
-            reservas_existentes = []
-            
-            for horario in horarios_area:
-                horarios_libres.append({
-                    "inicio": horario.hora_inicio.strftime('%H:%M:%S'),
-                    "fin": horario.hora_fin.strftime('%H:%M:%S')
-                })
-            
-            for reserva in reservas_dia:
-                reservas_existentes.append({
-                    "inicio": reserva.hora_inicio.strftime('%H:%M:%S'),
-                    "fin": reserva.hora_fin.strftime('%H:%M:%S'),
-                    "evento": reserva.motivo_evento or "Reserva privada"
-                })
-            
-            disponibilidad_por_dia.append({
-                "fecha": fecha_actual.strftime('%Y-%m-%d'),
-                "dia_semana": fecha_actual.strftime('%A').lower(),
-                "disponible": len(horarios_libres) > 0 and len(reservas_existentes) == 0,
-                "horarios_libres": horarios_libres,
-                "reservas_existentes": reservas_existentes
-            })
-            
-            fecha_actual += timedelta(days=1)
+        if (fecha_fin - fecha_inicio).days >= MAX_DIAS_CONSULTA:
+            return Response({
+                'success': False,
+                'message': f'El rango de consulta no puede superar {MAX_DIAS_CONSULTA} días'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            duracion_horas = int(request.query_params.get('duracion_horas') or area.tiempo_minimo_reserva or 1)
+            if duracion_horas < 1:
+                raise ValueError
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'duracion_horas debe ser un entero positivo'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Horario semanal y reservas del rango en dos consultas; huecos calculados en memoria
+        disponibilidad_por_dia = disponibilidad_service.calcular(
+            area, fecha_inicio, fecha_fin, duracion_horas
+        )
 
         return Response({
             'success': True,
@@ -441,10 +433,79 @@ class ConsultarDisponibilidadView(APIView):
                     "fecha_inicio": fecha_inicio_str,
                     "fecha_fin": fecha_fin_str
                 },
+                "duracion_horas": duracion_horas,
                 "disponibilidad_por_dia": disponibilidad_por_dia
             }
         })
 
+class CalendarioAreasView(APIView):
+    """Vista de calendario mensual de ocupación de todas las áreas activas"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=f"""
+        Calendario mensual de ocupación de todas las áreas comunes activas
+
+        Cada día es un mapa de bits en hexadecimal de franjas de {SLOT_MINUTOS} minutos:
+        el bit i corresponde a la franja que empieza i * {SLOT_MINUTOS} minutos después
+        de medianoche. `ocupacion` tiene un valor por día del mes y `horario` las franjas
+        abiertas de lunes a domingo; una franja está libre si `horario & ~ocupacion`.
+        """,
+        manual_parameters=[
+            openapi.Parameter(
+                'mes',
+                openapi.IN_QUERY,
+                description="Mes a consultar (YYYY-MM); por defecto el mes actual",
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Calendario de ocupación",
+                examples={
+                    "application/json": {
+                        "success": True,
+                        "data": {
+                            "mes": "2026-10",
+                            "slot_minutos": 30,
+                            "slots_por_dia": 48,
+                            "dias": 31,
+                            "areas": [
+                                {
+                                    "id": 1,
+                                    "nombre": "Salón Social",
+                                    "horario": ["0fffffff0000", "0fffffff0000"],
+                                    "ocupacion": ["000000000000", "000000f00000"]
+                                }
+                            ]
+                        }
+                    }
+                }
+            ),
+            400: "Parámetros inválidos"
+        },
+        tags=['Áreas Comunes']
+    )
+    def get(self, request):
+        mes_str = request.query_params.get('mes')
+        if mes_str:
+            try:
+                mes = datetime.strptime(mes_str, '%Y-%m').date()
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'message': 'Formato de mes inválido. Use YYYY-MM'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            mes = timezone.localdate()
+
+        areas = list(AreaComun.objects.filter(activo=True, activa=True).order_by('nombre'))
+        return Response({
+            'success': True,
+            'data': calendario_service.calendario(areas, mes)
+        })
+
 # =================== VISTAS PARA GESTIÓN DE RESERVAS ===================
 
 class ReservaListView(generics.ListAPIView):
@@ -469,7 +530,7 @@ class ReservaListView(generics.ListAPIView):
         ### Filtros disponibles:
         - `area_comun`: ID de área específica
         - `usuario`: ID de usuario específico
-        - `estado`: Estado de reserva (pendiente, confirmada, cancelada, completada)
+        - `estado`: Estado de reserva (pendiente, confirmada, en_uso, cancelada, completada, expirada)
         - `fecha_desde`: Fecha desde (YYYY-MM-DD)
         - `fecha_hasta`: Fecha hasta (YYYY-MM-DD)
         - `proximas`: Solo reservas próximas (true/false)
@@ -511,6 +572,7 @@ class ReservaListView(generics.ListAPIView):
                                 "estado": "confirmada",
                                 "monto_total": "150000.00",
                                 "estado_pago": "pagado",
+                                "pago_limite": None,
                                 "fecha_creacion": "2025-09-25T10:30:00Z",
                                 "dias_restantes": 6,
                                 "puede_cancelar": True
@@ -591,20 +653,28 @@ class ReservaCreateView(generics.CreateAPIView):
                             "numero_personas": 45,
                             "estado": "pendiente",
                             "monto_total": "187500.00",
-                            "estado_pago": "pendiente"
+                            "estado_pago": "pendiente",
+                            "pago_limite": "2025-10-10T09:30:00-05:00"
                         }
                     }
                 }
             ),
-            400: "Datos inválidos o conflicto de horarios",
-            403: "Sin permisos"
+            400: "Datos inválidos",
+            403: "Sin permisos",
+            409: "El horario ya está ocupado por otra reserva"
         },
         tags=['Reservas']
     )
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            reserva = serializer.save()
+            try:
+                reserva = serializer.save()
+            except ConflictoReserva as e:
+                return Response({
+                    'success': False,
+                    'message': str(e)
+                }, status=status.HTTP_409_CONFLICT)
             
             return Response({
                 'success': True,
@@ -625,7 +695,9 @@ class ReservaCreateView(generics.CreateAPIView):
                     'numero_personas': reserva.numero_personas,
                     'estado': reserva.estado,
                     'monto_total': str(reserva.monto_total),
-                    'estado_pago': 'pendiente' if reserva.monto_total > 0 else 'no_aplica'
+                    'estado_pago': 'pendiente' if reserva.monto_total > 0 else 'no_aplica',
+                    # Sin pagar a esta hora, la reserva expira y libera el horario
+                    'pago_limite': ReservaListSerializer(reserva).get_pago_limite(reserva)
                 }
             }, status=status.HTTP_201_CREATED)
         
@@ -637,6 +709,88 @@ class ReservaCreateView(generics.CreateAPIView):
 
 # Continúa views.py - Parte 2
 
+class ReservaSerieCreateView(APIView):
+    """Vista para crear reservas recurrentes"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="""
+        Crear una serie de reservas recurrentes (clubes, clases del gimnasio)
+
+        Las ocurrencias se verifican contra las reservas existentes en una sola
+        consulta y las libres se crean juntas. Las que chocan se reportan en
+        `conflictos`; con `todo_o_nada=true` no se crea ninguna si alguna choca.
+        """,
+        request_body=SerieReservaCreateSerializer,
+        responses={
+            201: openapi.Response(
+                description="Serie creada",
+                examples={
+                    "application/json": {
+                        "success": True,
+                        "message": "Serie creada: 11 reservas, 1 en conflicto",
+                        "data": {
+                            "serie_id": 7,
+                            "reservas": [
+                                {"id": 210, "fecha": "2026-10-21", "estado": "pendiente", "monto_total": "20000.00",
+                                 "pago_limite": "2026-10-20T16:05:00-05:00"}
+                            ],
+                            "conflictos": [
+                                {"fecha": "2026-11-04", "hora_inicio": "18:00:00", "hora_fin": "20:00:00", "reserva_id": 198}
+                            ]
+                        }
+                    }
+                }
+            ),
+            400: "Datos inválidos",
+            409: "Ninguna ocurrencia disponible o conflicto concurrente"
+        },
+        tags=['Reservas']
+    )
+    def post(self, request):
+        serializer = SerieReservaCreateSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'message': 'Error al crear la serie de reservas',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            resultado = serializer.save()
+        except ConflictoReserva as e:
+            return Response({
+                'success': False,
+                'message': str(e)
+            }, status=status.HTTP_409_CONFLICT)
+
+        serie = resultado['serie']
+        if serie is None:
+            return Response({
+                'success': False,
+                'message': 'No se creó ninguna reserva: hay ocurrencias en conflicto',
+                'data': {'conflictos': resultado['conflictos']}
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            'success': True,
+            'message': f"Serie creada: {len(resultado['reservas'])} reservas, {len(resultado['conflictos'])} en conflicto",
+            'data': {
+                'serie_id': serie.pk,
+                'reservas': [
+                    {
+                        'id': reserva.pk,
+                        'fecha': reserva.fecha_inicio.isoformat(),
+                        'estado': reserva.estado,
+                        'monto_total': str(reserva.monto_total),
+                        'pago_limite': ReservaListSerializer(reserva).get_pago_limite(reserva)
+                    }
+                    for reserva in resultado['reservas']
+                ],
+                'conflictos': resultado['conflictos']
+            }
+        }, status=status.HTTP_201_CREATED)
+
 class ReservaDetailView(generics.RetrieveAPIView):
     """Vista para detalles de reserva"""
     serializer_class = ReservaListSerializer
@@ -720,7 +874,7 @@ class CancelarReservaView(APIView):
 
         # Verificar tiempo mínimo de cancelación (48 horas antes)
         horas_hasta_evento = (
-            datetime.combine(reserva.fecha_inicio, reserva.hora_inicio) - 
+            timezone.make_aware(datetime.combine(reserva.fecha_inicio, reserva.hora_inicio)) -
             timezone.now()
         ).total_seconds() / 3600
 
@@ -732,10 +886,7 @@ class CancelarReservaView(APIView):
 
         # Cancelar reserva
         motivo = request.data.get('motivo_cancelacion', 'Sin motivo especificado')
-        reserva.estado = 'cancelada'
-        reserva.motivo_cancelacion = motivo
-        reserva.fecha_cancelacion = timezone.now()
-        reserva.save()
+        reserva_service.cancelar(reserva, motivo, request.user)
 
         # Formatear fecha de cancelación de manera completamente segura
         fecha_cancelacion_str = None
@@ -756,6 +907,132 @@ class CancelarReservaView(APIView):
 
 # =================== VISTAS PARA DASHBOARD Y ESTADÍSTICAS ===================
 
+class ListaEsperaListCreateView(generics.ListCreateAPIView):
+    """Vista para listar e inscribirse en la lista de espera"""
+    serializer_class = ListaEsperaSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    filter_backends = [OrderingFilter]
+    if DjangoFilterBackend:
+        filter_backends.insert(0, DjangoFilterBackend)
+
+    filterset_fields = ['area_comun', 'estado']
+    ordering_fields = ['fecha_inicio', 'created_at', 'prioridad']
+    ordering = ['-prioridad', 'created_at']
+
+    @swagger_auto_schema(
+        operation_description="""
+        Listar entradas de lista de espera (las propias; todas para administradores)
+
+        ### Filtros disponibles:
+        - `area_comun`: ID de área específica
+        - `estado`: esperando, asignada, cancelada, vencida
+        """,
+        tags=['Lista de Espera']
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_description="""
+        Inscribirse en la lista de espera de un horario ocupado
+
+        Si una reserva que se cruza con el horario se cancela, el horario se
+        asigna automáticamente al siguiente en espera (mayor prioridad primero,
+        luego orden de llegada) y se le notifica. Solo administradores pueden
+        fijar `prioridad`.
+        """,
+        request_body=ListaEsperaSerializer,
+        responses={
+            201: openapi.Response(
+                description="Inscripción creada",
+                examples={
+                    "application/json": {
+                        "success": True,
+                        "message": "Inscrito en la lista de espera",
+                        "data": {
+                            "id": 12,
+                            "area_comun": 1,
+                            "area_nombre": "Salón Social",
+                            "fecha_inicio": "2026-11-07",
+                            "fecha_fin": "2026-11-07",
+                            "hora_inicio": "15:00:00",
+                            "hora_fin": "20:00:00",
+                            "prioridad": 0,
+                            "estado": "esperando",
+                            "reserva_id": None
+                        }
+                    }
+                }
+            ),
+            400: "Datos inválidos o el horario está libre"
+        },
+        tags=['Lista de Espera']
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'message': 'Error al inscribirse en la lista de espera',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer.save()
+        return Response({
+            'success': True,
+            'message': 'Inscrito en la lista de espera',
+            'data': serializer.data
+        }, status=status.HTTP_201_CREATED)
+
+    def get_queryset(self) -> QuerySet[ListaEspera]:  # type: ignore
+        queryset = ListaEspera.objects.select_related('area_comun')
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(usuario=self.request.user)
+        return queryset
+
+class CancelarListaEsperaView(APIView):
+    """Vista para salir de la lista de espera"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Salir de la lista de espera",
+        responses={
+            200: "Inscripción cancelada",
+            400: "La inscripción ya no está en espera",
+            403: "Sin permisos",
+            404: "Inscripción no encontrada"
+        },
+        tags=['Lista de Espera']
+    )
+    def post(self, request, pk):
+        try:
+            espera = ListaEspera.objects.get(pk=pk)
+        except ListaEspera.DoesNotExist:
+            return Response({
+                'success': False,
+                'message': 'Inscripción no encontrada'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        if not request.user.is_superuser and espera.usuario_id != request.user.id:
+            return Response({
+                'success': False,
+                'message': 'No tienes permisos para cancelar esta inscripción'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        if espera.estado != 'esperando':
+            return Response({
+                'success': False,
+                'message': f'No se puede cancelar una inscripción en estado {espera.estado}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        lista_espera_service.cancelar(espera)
+        return Response({
+            'success': True,
+            'message': 'Inscripción cancelada',
+            'data': {'id': espera.pk, 'estado': espera.estado}
+        })
+
 class DashboardAreasView(APIView):
     """Vista para dashboard de áreas comunes"""
     permission_classes = [permissions.IsAuthenticated]
@@ -788,7 +1065,9 @@ class DashboardAreasView(APIView):
                                 "total_reservas": 156,
                                 "ingresos_generados": "4650000.00",
                                 "area_mas_popular": "Salón Social",
-                                "promedio_ocupacion": 67.5
+                                "promedio_ocupacion": 67.5,
+                                "horas_reservadas": 412.0,
+                                "horas_programadas": 610.0
                             },
                             "proximas_reservas": [
                                 {
@@ -816,102 +1095,94 @@ class DashboardAreasView(APIView):
         tags=['Dashboard']
     )
     def get(self, request):
-        # Resumen general de áreas
-        total_areas = AreaComun.objects.filter(activo=True).count()
-        
-        # Calcular áreas ocupadas hoy
-        hoy = date.today()
-        areas_ocupadas_hoy = Reserva.objects.filter(
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy,
-            estado__in=['confirmada', 'en_uso']
-        ).values_list('area_comun_id', flat=True).distinct().count()
-
-        # Mis reservas (si no es admin)
-        if request.user.is_superuser:
-            reservas_usuario = Reserva.objects.all()
-        else:
-            reservas_usuario = Reserva.objects.filter(usuario=request.user)
-
-        mis_reservas_activas = reservas_usuario.filter(
-            fecha_inicio__gte=hoy,
-            estado__in=['confirmada', 'en_uso']
-        ).count()
-
-        mis_reservas_proximas = reservas_usuario.filter(
-            fecha_inicio__gt=hoy,
-            estado='confirmada'
-        ).count()
-
-        # Estadísticas del mes actual
-        primer_dia_mes = date.today().replace(day=1)
-        total_reservas_mes = Reserva.objects.filter(
-            fecha_creacion__gte=primer_dia_mes,
-            estado__in=['confirmada', 'completada']
-        ).count()
-
-        ingresos_mes = Reserva.objects.filter(
-            fecha_creacion__gte=primer_dia_mes,
-            estado__in=['confirmada', 'completada']
-        ).aggregate(total=Sum('monto_total'))['total'] or 0
-
-        # Área más popular del mes
-        area_popular = Reserva.objects.filter(
-            fecha_creacion__gte=primer_dia_mes
-        ).values('area_comun__nombre').annotate(
-            total=Count('id')
-        ).order_by('-total').first()
-
-        # Próximas reservas (las siguientes 5)
-        proximas_reservas = Reserva.objects.filter(
-            fecha_inicio__gte=hoy,
-            estado='confirmada'
-        ).select_related('area_comun', 'usuario').order_by('fecha_inicio', 'hora_inicio')[:5]
-
-        proximas_data = []
-        for reserva in proximas_reservas:
-            usuario_name = getattr(reserva.usuario, 'get_full_name', lambda: 'Usuario')() or str(reserva.usuario)
-            proximas_data.append({
-                'id': reserva.pk,  # Usar pk en lugar de id
-                'area': reserva.area_comun.nombre,
-                'fecha': reserva.fecha_inicio.strftime('%Y-%m-%d'),
-                'hora': reserva.hora_inicio.strftime('%H:%M'),
-                'usuario': usuario_name,
-                'evento': reserva.motivo_evento or 'Sin especificar'
-            })
-
-        # Áreas más populares
-        areas_populares = Reserva.objects.filter(
-            fecha_creacion__gte=primer_dia_mes
-        ).values('area_comun__nombre').annotate(
-            reservas_mes=Count('id')
-        ).order_by('-reservas_mes')[:5]
-
+        # Una agregación por mes (compartida) más los datos del usuario, en caché
         return Response({
             'success': True,
-            'data': {
-                'resumen': {
-                    'total_areas': total_areas,
-                    'areas_disponibles': total_areas - areas_ocupadas_hoy,
-                    'areas_ocupadas': areas_ocupadas_hoy,
-                    'areas_mantenimiento': 0  # Podríamos agregar este campo al modelo
-                },
-                'mis_reservas': {
-                    'activas': mis_reservas_activas,
-                    'proximas': mis_reservas_proximas,
-                    'pendientes_pago': 0  # Se puede calcular si agregamos estado de pago
-                },
-                'estadisticas_mes': {
-                    'total_reservas': total_reservas_mes,
-                    'ingresos_generados': str(ingresos_mes),
-                    'area_mas_popular': area_popular['area_comun__nombre'] if area_popular else 'N/A',
-                    'promedio_ocupacion': 67.5  # Cálculo más complejo requerido
-                },
-                'proximas_reservas': proximas_data,
-                'areas_populares': list(areas_populares)
-            }
+            'data': reportes_service.dashboard(request.user)
         })
 
+class ReporteUsoAreasView(APIView):
+    """Reporte de uso de áreas comunes (CU-WEB-018) emitido en streaming"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=f"""
+        Reporte de uso de áreas comunes - Solo administradores
+
+        Por área: total de reservas, tasa de cancelación, ingresos, horas reservadas,
+        horas pico y mapa de calor día de la semana x hora de inicio (lunes a domingo,
+        00 a 23). El rango puede ser de hasta {MAX_DIAS_REPORTE} días.
+
+        ### Formatos:
+        - `formato=json` (por defecto): documento con una entrada por área
+        - `formato=csv&vista=resumen`: una fila por área
+        - `formato=csv&vista=heatmap`: una fila por (área, día, hora) con reservas
+        """,
+        manual_parameters=[
+            openapi.Parameter('fecha_inicio', openapi.IN_QUERY, description="YYYY-MM-DD (por defecto 1 de enero del año actual)", type=openapi.TYPE_STRING),
+            openapi.Parameter('fecha_fin', openapi.IN_QUERY, description="YYYY-MM-DD (por defecto hoy)", type=openapi.TYPE_STRING),
+            openapi.Parameter('area', openapi.IN_QUERY, description="ID de un área concreta", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('formato', openapi.IN_QUERY, description="json o csv", type=openapi.TYPE_STRING),
+            openapi.Parameter('vista', openapi.IN_QUERY, description="Solo CSV: resumen o heatmap", type=openapi.TYPE_STRING),
+        ],
+        responses={
+            200: "Reporte en JSON o CSV",
+            400: "Parámetros inválidos",
+            403: "Sin permisos"
+        },
+        tags=['Estadísticas']
+    )
+    def get(self, request):
+        if not request.user.is_superuser:
+            return Response({
+                'success': False,
+                'message': 'No tienes permisos para ver reportes de uso'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        hoy = timezone.localdate()
+        try:
+            fecha_inicio = datetime.strptime(
+                request.query_params.get('fecha_inicio') or hoy.replace(month=1, day=1).isoformat(), '%Y-%m-%d'
+            ).date()
+            fecha_fin = datetime.strptime(
+                request.query_params.get('fecha_fin') or hoy.isoformat(), '%Y-%m-%d'
+            ).date()
+            area_id = int(request.query_params['area']) if request.query_params.get('area') else None
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'Parámetros inválidos. Use fechas YYYY-MM-DD y un ID de área numérico'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if fecha_fin < fecha_inicio or (fecha_fin - fecha_inicio).days >= MAX_DIAS_REPORTE:
+            return Response({
+                'success': False,
+                'message': f'El rango debe ser válido y de máximo {MAX_DIAS_REPORTE} días'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        formato = request.query_params.get('formato', 'json')
+        vista = request.query_params.get('vista', 'resumen')
+        if formato not in ('json', 'csv') or vista not in ('resumen', 'heatmap'):
+            return Response({
+                'success': False,
+                'message': 'formato debe ser json o csv y vista resumen o heatmap'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if formato == 'csv':
+            respuesta = StreamingHttpResponse(
+                reporte_uso_service.csv(fecha_inicio, fecha_fin, vista, area_id),
+                content_type='text/csv; charset=utf-8'
+            )
+            respuesta['Content-Disposition'] = (
+                f'attachment; filename="uso_areas_{vista}_{fecha_inicio:%Y%m%d}_{fecha_fin:%Y%m%d}.csv"'
+            )
+            return respuesta
+
+        return StreamingHttpResponse(
+            reporte_uso_service.json(fecha_inicio, fecha_fin, area_id),
+            content_type='application/json'
+        )
+
 # =================== VISTAS PARA GESTIÓN DE HORARIOS ===================
 
 class HorarioAreaListView(generics.ListCreateAPIView):
@@ -966,6 +1237,7 @@ class HorarioAreaListView(generics.ListCreateAPIView):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             serializer.save(area_comun=area)
+            disponibilidad_service.invalidar(area.pk)
             return Response({
                 'success': True,
                 'message': 'Horario creado exitosamente',
@@ -1028,7 +1300,8 @@ def configuracion_sistema(request):
         {"value": "confirmada", "label": "Confirmada"},
         {"value": "cancelada", "label": "Cancelada"},
         {"value": "completada", "label": "Completada"},
-        {"value": "en_uso", "label": "En uso"}
+        {"value": "en_uso", "label": "En uso"},
+        {"value": "expirada", "label": "Expirada"}
     ]
     
     configuracion = {
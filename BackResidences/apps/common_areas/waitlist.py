@@ -0,0 +1,137 @@
+"""
+Lista de espera de áreas comunes
+Cuando se cancela o expira una reserva, el horario liberado se asigna al
+siguiente residente en espera (mayor prioridad primero, luego orden de
+llegada) dentro de la misma transacción que lo libera. La búsqueda de quién espera ese
+intervalo es una consulta && sobre el índice GiST parcial
+`espera_area_rango_gist`, no un recorrido de la tabla.
+"""
+import logging
+from datetime import datetime
+from typing import List
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ESTADOS_OCUPAN, ListaEspera, RangoFijo, RangoReserva, Reserva, Solapa
+from .services import ConflictoReserva, reserva_service
+
+logger = logging.getLogger(__name__)
+
+# Máximo de entradas que se intentan asignar por cada horario liberado
+MAX_CANDIDATOS = 20
+
+
+class ListaEsperaService:
+    """Servicio para la lista de espera y la reasignación de horarios liberados"""
+
+    @staticmethod
+    def _intervalo(obj):
+        return (datetime.combine(obj.fecha_inicio, obj.hora_inicio),
+                datetime.combine(obj.fecha_fin, obj.hora_fin))
+
+    def horario_ocupado(self, area_id: int, fecha_inicio, hora_inicio, fecha_fin, hora_fin) -> bool:
+        """Si alguna reserva activa se cruza con el intervalo (usa el índice de la exclusión)"""
+        inicio = datetime.combine(fecha_inicio, hora_inicio)
+        fin = datetime.combine(fecha_fin, hora_fin)
+        return Reserva.objects.filter(
+            Solapa(RangoReserva(), RangoFijo(inicio, fin)),
+            area_comun_id=area_id,
+            estado__in=ESTADOS_OCUPAN,
+        ).exists()
+
+    def en_espera(self, area_id: int, inicio: datetime, fin: datetime):
+        """Entradas en espera cuyo intervalo se cruza con [inicio, fin), en orden de asignación"""
+        return ListaEspera.objects.filter(
+            Solapa(RangoReserva(), RangoFijo(inicio, fin)),
+            area_comun_id=area_id,
+            estado='esperando',
+        ).order_by('-prioridad', 'created_at', 'id')
+
+    def promover(self, reserva: Reserva) -> List[ListaEspera]:
+        """
+        Asignar el horario liberado por `reserva` a quienes esperan
+
+        Debe llamarse dentro de la transacción que libera el horario. Las entradas
+        se bloquean con SKIP LOCKED para que dos liberaciones simultáneas no
+        asignen la misma; cada reserva nueva se inserta en su savepoint y la
+        restricción de exclusión decide si el intervalo aún cabe, así que una
+        entrada que se cruza con otra reserva activa (o con una recién
+        asignada) simplemente se salta y sigue esperando.
+        """
+        inicio, fin = self._intervalo(reserva)
+        ahora = timezone.localtime().replace(tzinfo=None)
+        candidatos = (
+            self.en_espera(reserva.area_comun_id, inicio, fin)
+            .select_related('area_comun', 'usuario')
+            .select_for_update(skip_locked=True, of=('self',))[:MAX_CANDIDATOS]
+        )
+
+        asignadas = []
+        for espera in candidatos:
+            if datetime.combine(espera.fecha_inicio, espera.hora_inicio) <= ahora:
+                continue
+            try:
+                nueva = reserva_service.crear(
+                    usuario=espera.usuario,
+                    area_comun=espera.area_comun,
+                    fecha_inicio=espera.fecha_inicio,
+                    fecha_fin=espera.fecha_fin,
+                    hora_inicio=espera.hora_inicio,
+                    hora_fin=espera.hora_fin,
+                    motivo_evento=espera.motivo_evento,
+                    numero_personas=espera.numero_personas,
+                    monto_total=reserva_service.calcular_monto(
+                        espera.area_comun, espera.fecha_inicio, espera.fecha_fin,
+                        espera.hora_inicio, espera.hora_fin
+                    ),
+                )
+            except ConflictoReserva:
+                continue
+
+            espera.estado = 'asignada'
+            espera.reserva = nueva
+            espera.asignada_en = timezone.now()
+            espera.save(update_fields=['estado', 'reserva', 'asignada_en', 'updated_at'])
+            asignadas.append(espera)
+
+        if asignadas:
+            transaction.on_commit(lambda: self.notificar(asignadas))
+        return asignadas
+
+    def notificar(self, asignadas: List[ListaEspera]):
+        """Avisar a los residentes que recibieron el horario (tras confirmar la transacción)"""
+        from apps.payments.notifications import get_backend
+
+        mensajes = [
+            {
+                'destino': espera.usuario.email,
+                'asunto': f'Se liberó su horario en {espera.area_comun.nombre}',
+                'cuerpo': (
+                    f'Hola {espera.usuario.get_full_name() or espera.usuario.email},\n\n'
+                    f'Se liberó el horario que esperaba en {espera.area_comun.nombre} '
+                    f'({espera.fecha_inicio} {espera.hora_inicio:%H:%M} - '
+                    f'{espera.fecha_fin} {espera.hora_fin:%H:%M}) y quedó reservado a su nombre '
+                    f'(reserva #{espera.reserva_id}). Recuerde completar el pago para confirmarla.'
+                ),
+            }
+            for espera in asignadas
+            if espera.usuario.email
+        ]
+        if not mensajes:
+            return
+        try:
+            get_backend().send_batch(mensajes)
+        except Exception as e:
+            # La asignación ya está confirmada; un fallo de entrega no la revierte
+            logger.error(f"Error notificando asignaciones de lista de espera: {e}")
+
+    def cancelar(self, espera: ListaEspera) -> ListaEspera:
+        """Salir de la lista de espera"""
+        espera.estado = 'cancelada'
+        espera.save(update_fields=['estado', 'updated_at'])
+        return espera
+
+
+# Instancia global del servicio
+lista_espera_service = ListaEsperaService()
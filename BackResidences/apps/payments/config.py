@@ -122,12 +122,23 @@ PAYMENT_NOTIFICATIONS = {
         'payment_confirmed': 'Su pago de ${monto} ha sido confirmado. Ref: {numero_pago}',
         'payment_failed': 'Su pago no pudo procesarse. Contacte administración.',
         'payment_reminder': 'Recordatorio: Factura #{numero_factura} vence {fecha_vencimiento}'
+    },
+    # Recordatorios de cobro agrupados por destinatario (comando enviar_recordatorios_pago)
+    'dunning': {
+        'subject': 'Estado de cuenta: {cantidad} factura(s) por ${total}',
+        'backend': 'console',            # console, file, email o ruta importable
+        'batch_size': 100,               # Mensajes por envío al backend
+        'rate_per_second': 10,           # Máximo de mensajes por segundo
+        'days_before_due': 5,            # Incluir facturas que vencen en los próximos N días
+        'resend_after_days': 3,          # No repetir el mismo contenido antes de N días
+        'file_path': 'notificaciones',   # Directorio bajo MEDIA_ROOT para el backend file
     }
 }
 
 # Configuración de reportes
 REPORTS_CONFIG = {
     'dashboard_cache_minutes': 30,
+    'concept_catalog_cache_seconds': 300,  # Resumen de la pantalla de conceptos
     'export_formats': ['pdf', 'excel', 'csv'],
     'max_export_records': 10000,
     'morosidad_ranges': [
@@ -135,7 +146,11 @@ REPORTS_CONFIG = {
         {'name': '31-60 días', 'min_days': 31, 'max_days': 60},
         {'name': '61-90 días', 'min_days': 61, 'max_days': 90},
         {'name': 'Más de 90 días', 'min_days': 91, 'max_days': 9999},
-    ]
+    ],
+    # Proyección de recaudo (comando calcular_proyecciones)
+    'forecast_history_periods': 12,
+    'forecast_min_periods': 3,           # Mínimo de datos para usar regresión
+    'forecast_moving_average_window': 3,
 }
 
 # Configuración de facturación
@@ -148,7 +163,7 @@ BILLING_CONFIG = {
     'late_fee_percentage': 2.0,  # Porcentaje mensual de interés moratorio
     'grace_period_days': 3,      # Días de gracia antes de aplicar intereses
     'auto_calculate_interest': True,
-    'bulk_billing_batch_size': 50,  # Procesar facturas en lotes
+    'bulk_billing_batch_size': 500,  # Procesar facturas en lotes
 }
 
 # Configuración de seguridad
@@ -161,6 +176,22 @@ SECURITY_CONFIG = {
     'webhook_signature_verification': True,
 }
 
+# Cliente HTTP de la pasarela (apps/payments/gateway.py)
+GATEWAY_CONFIG = {
+    'timeout': 10,               # Segundos por intento (conexión y lectura); STRIPE_TIMEOUT_SECONDS lo reemplaza
+    'deadline': 20,              # Tope total de una llamada incluyendo reintentos
+    'max_retries': 2,            # Solo errores de red, 409, 429 y 5xx
+    'backoff_base': 0.25,
+    'backoff_max': 4,
+    'pool_size': 10,             # Conexiones keep-alive retenidas por proceso
+    'max_concurrent': 8,         # Llamadas simultáneas por proceso (el resto falla rápido)
+    'acquire_timeout': 0.5,
+    'breaker_threshold': 5,      # Fallos seguidos para abrir el circuito
+    'breaker_cooldown': 30,      # Segundos antes de probar de nuevo
+    'slow_call_seconds': 2,
+    'metrics_window': 1000,      # Latencias recientes por operación para percentiles
+}
+
 # Configuración de archivos
 FILE_CONFIG = {
     'receipt_storage_path': 'receipts/{year}/{month}/',
@@ -169,4 +200,7 @@ FILE_CONFIG = {
     'max_file_size_mb': 10,
     'allowed_file_types': ['pdf', 'jpg', 'jpeg', 'png'],
     'auto_generate_pdf': True,
+    # Documentos PDF direccionados por contenido (hash SHA-256)
+    'pdf_cache_path': 'documentos/{tipo}/{prefijo}/{hash}.pdf',
+    'pdf_render_workers': None,  # None = número de CPUs
 }
\ No newline at end of file
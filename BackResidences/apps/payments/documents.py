@@ -0,0 +1,266 @@
+"""
+Generación de documentos PDF del módulo de pagos
+Facturas y paz y salvos renderizados en lote con caché por contenido
+"""
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+
+from .config import FILE_CONFIG
+from .models import Factura, PazYSalvo
+
+logger = logging.getLogger(__name__)
+
+# Cambiar al modificar el formato del documento para invalidar la caché
+VERSION_PLANTILLA = '1'
+
+
+# ================== RENDERIZADO (sin acceso a BD) ==================
+
+def _texto_pdf(texto: str) -> bytes:
+    """Escapar texto para un string literal PDF en WinAnsiEncoding"""
+    texto = texto.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return texto.encode('cp1252', errors='replace')
+
+
+def render_document_pdf(contexto: Dict[str, Any]) -> bytes:
+    """
+    Renderizar un documento de una página a PDF
+
+    Función pura de módulo para poder ejecutarse en un ProcessPoolExecutor.
+
+    Args:
+        contexto: Datos planos del documento (titulo y lineas)
+
+    Returns:
+        Bytes del archivo PDF
+    """
+    contenido = [b'BT', b'/F1 16 Tf', b'50 790 Td', b'18 TL']
+    contenido.append(b'(' + _texto_pdf(contexto['titulo']) + b') Tj T* T*')
+    contenido.append(b'/F1 11 Tf 15 TL')
+    for etiqueta, valor in contexto['lineas']:
+        contenido.append(b'(' + _texto_pdf(f'{etiqueta}: {valor}') + b') Tj T*')
+    contenido.append(b'ET')
+    stream = b'\n'.join(contenido)
+
+    objetos = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+        b'/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Length ' + str(len(stream)).encode() + b' >>\nstream\n' + stream + b'\nendstream',
+    ]
+
+    salida = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for numero, cuerpo in enumerate(objetos, start=1):
+        offsets.append(len(salida))
+        salida += f'{numero} 0 obj\n'.encode() + cuerpo + b'\nendobj\n'
+
+    inicio_xref = len(salida)
+    salida += f'xref\n0 {len(objetos) + 1}\n'.encode()
+    salida += b'0000000000 65535 f \n'
+    for offset in offsets:
+        salida += f'{offset:010d} 00000 n \n'.encode()
+    salida += (
+        f'trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\n'
+        f'startxref\n{inicio_xref}\n%%EOF\n'
+    ).encode()
+    return bytes(salida)
+
+
+# ================== CONTEXTOS ==================
+
+def contexto_factura(factura: Factura) -> Dict[str, Any]:
+    """Datos planos de una factura (requiere vivienda, propietario y concepto cargados)"""
+    vivienda = factura.vivienda
+    propietario = vivienda.usuario_propietario
+    return {
+        'tipo': 'factura',
+        'titulo': f'FACTURA {factura.numero_factura}',
+        'lineas': [
+            ('Vivienda', vivienda.identificador),
+            ('Propietario', propietario.get_full_name() if propietario else ''),
+            ('Concepto', factura.concepto.nombre),
+            ('Periodo', factura.periodo),
+            ('Fecha de generación', factura.fecha_generacion.strftime('%Y-%m-%d')),
+            ('Fecha de vencimiento', factura.fecha_vencimiento.strftime('%Y-%m-%d')),
+            ('Monto original', f'${factura.monto_original:,.2f}'),
+            ('Descuentos', f'${factura.descuentos:,.2f}'),
+            ('Intereses por mora', f'${factura.intereses:,.2f}'),
+            ('Monto total', f'${factura.monto_total:,.2f}'),
+            ('Saldo pendiente', f'${factura.saldo_pendiente:,.2f}'),
+            ('Estado', factura.get_estado_display()),  # type: ignore
+        ],
+    }
+
+
+def contexto_paz_y_salvo(paz_y_salvo: PazYSalvo) -> Dict[str, Any]:
+    """Datos planos de un paz y salvo (requiere vivienda y propietario cargados)"""
+    vivienda = paz_y_salvo.vivienda
+    propietario = vivienda.usuario_propietario
+    return {
+        'tipo': 'paz_y_salvo',
+        'titulo': f'PAZ Y SALVO {paz_y_salvo.numero_documento}',
+        'lineas': [
+            ('Vivienda', vivienda.identificador),
+            ('Propietario', propietario.get_full_name() if propietario else ''),
+            ('Fecha de corte', paz_y_salvo.fecha_corte.strftime('%Y-%m-%d')),
+            ('Fecha de generación', paz_y_salvo.fecha_generacion.strftime('%Y-%m-%d')),
+            ('Válido hasta', paz_y_salvo.fecha_vencimiento.strftime('%Y-%m-%d')),
+            ('Saldo pendiente', f'${paz_y_salvo.saldo_pendiente:,.2f}'),
+            ('Código de verificación', paz_y_salvo.codigo_verificacion),
+            ('Observaciones', paz_y_salvo.observaciones or ''),
+        ],
+    }
+
+
+def hash_contenido(contexto: Dict[str, Any]) -> str:
+    """Hash SHA-256 del contenido renderizable del documento"""
+    serializado = json.dumps(
+        {'version': VERSION_PLANTILLA, **contexto},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+
+
+def ruta_documento(tipo: str, digest: str) -> str:
+    """Ruta relativa a MEDIA_ROOT para un documento direccionado por contenido"""
+    return FILE_CONFIG['pdf_cache_path'].format(tipo=tipo, prefijo=digest[:2], hash=digest)
+
+
+# ================== SERVICIO ==================
+
+class DocumentService:
+    """Servicio para generar, almacenar y servir documentos PDF"""
+
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage
+
+    def render_facturas(self, facturas, workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Renderizar en lote las facturas indicadas
+
+        Args:
+            facturas: QuerySet de facturas
+            workers: Procesos del pool (default: número de CPUs)
+
+        Returns:
+            Dict con documentos renderizados y reutilizados de caché
+        """
+        facturas = facturas.select_related('vivienda__usuario_propietario', 'concepto')
+        return self._render_lote(
+            Factura, facturas.iterator(chunk_size=2000), contexto_factura, workers
+        )
+
+    def render_paz_y_salvos(self, paz_y_salvos, workers: Optional[int] = None) -> Dict[str, int]:
+        """Renderizar en lote los paz y salvos indicados"""
+        paz_y_salvos = paz_y_salvos.select_related('vivienda__usuario_propietario')
+        return self._render_lote(
+            PazYSalvo, paz_y_salvos.iterator(chunk_size=2000), contexto_paz_y_salvo, workers
+        )
+
+    def _render_lote(self, modelo, objetos: Iterable, constructor, workers) -> Dict[str, int]:
+        pendientes: List[Tuple[Any, str, Dict[str, Any]]] = []
+        actualizados = []
+        reutilizados = 0
+
+        for obj in objetos:
+            contexto = constructor(obj)
+            ruta = ruta_documento(contexto['tipo'], hash_contenido(contexto))
+            if self.storage.exists(ruta):
+                reutilizados += 1
+                url = self.storage.url(ruta)
+                if obj.archivo_pdf != url:
+                    obj.archivo_pdf = url
+                    actualizados.append(obj)
+            else:
+                pendientes.append((obj, ruta, contexto))
+
+        if pendientes:
+            contextos = [contexto for _, _, contexto in pendientes]
+            chunksize = max(1, len(contextos) // ((workers or os.cpu_count() or 1) * 4))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pdfs = pool.map(render_document_pdf, contextos, chunksize=chunksize)
+                for (obj, ruta, _), pdf in zip(pendientes, pdfs):
+                    self._guardar(ruta, pdf)
+                    obj.archivo_pdf = self.storage.url(ruta)
+                    actualizados.append(obj)
+
+        if actualizados:
+            modelo.objects.bulk_update(actualizados, ['archivo_pdf'], batch_size=1000)
+
+        logger.info(
+            f"PDF {modelo.__name__}: {len(pendientes)} renderizados, {reutilizados} desde caché"
+        )
+        return {'renderizados': len(pendientes), 'reutilizados': reutilizados}
+
+    def _guardar(self, ruta: str, pdf: bytes):
+        # Otro proceso pudo escribir el mismo contenido; el nombre ya lo identifica
+        if not self.storage.exists(ruta):
+            self.storage.save(ruta, ContentFile(pdf))
+
+    def documento(self, obj, constructor) -> Tuple[str, str]:
+        """
+        Obtener la ruta y el hash del PDF de un documento, renderizándolo si no existe
+
+        Returns:
+            Tupla (ruta, hash)
+        """
+        contexto = constructor(obj)
+        digest = hash_contenido(contexto)
+        ruta = ruta_documento(contexto['tipo'], digest)
+        if not self.storage.exists(ruta):
+            self._guardar(ruta, render_document_pdf(contexto))
+        url = self.storage.url(ruta)
+        if obj.archivo_pdf != url:
+            obj.archivo_pdf = url
+            type(obj).objects.filter(pk=obj.pk).update(archivo_pdf=url)
+        return ruta, digest
+
+    def pdf_response(self, request, obj, constructor, nombre_archivo: str) -> HttpResponse:
+        """
+        Respuesta HTTP eficiente para el PDF de un documento
+
+        Usa el hash como ETag y delega la transferencia al servidor web cuando
+        PDF_SENDFILE_HEADER está configurado (X-Sendfile o X-Accel-Redirect).
+        """
+        ruta, digest = self.documento(obj, constructor)
+        etag = f'"{digest}"'
+
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        header = getattr(settings, 'PDF_SENDFILE_HEADER', '')
+        if header:
+            response = HttpResponse(content_type='application/pdf')
+            if header == 'X-Accel-Redirect':
+                response[header] = self.storage.url(ruta)
+            else:
+                response[header] = self.storage.path(ruta)
+            response['Content-Disposition'] = f'inline; filename="{nombre_archivo}"'
+        else:
+            response = FileResponse(
+                self.storage.open(ruta, 'rb'),
+                content_type='application/pdf',
+                filename=nombre_archivo,
+            )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+
+# Instancia global del servicio
+document_service = DocumentService()
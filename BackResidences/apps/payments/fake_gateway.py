@@ -0,0 +1,233 @@
+"""
+Pasarela local compatible con la API de PaymentIntents de Stripe
+Para pruebas de carga: latencia y tasa de fallos configurables y envío de
+webhooks firmados (Stripe-Signature) al confirmar un PaymentIntent
+
+Solo usa la librería estándar; se levanta con `manage.py fake_stripe`.
+"""
+import json
+import logging
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlparse
+from urllib.request import Request, urlopen
+
+from .services import firmar_webhook
+
+logger = logging.getLogger(__name__)
+
+
+class FakeStripeGateway(ThreadingHTTPServer):
+    """Servidor HTTP con estado en memoria para PaymentIntents"""
+
+    daemon_threads = True
+
+    def __init__(self, direccion, latencia_ms: float = 0, jitter_ms: float = 0,
+                 tasa_fallos: float = 0.0, webhook_url: Optional[str] = None,
+                 webhook_secret: str = '', webhook_delay_ms: float = 0):
+        super().__init__(direccion, _Handler)
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.tasa_fallos = tasa_fallos
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.webhook_delay_ms = webhook_delay_ms
+        self.intents: Dict[str, Dict[str, Any]] = {}
+        # Idempotency-Key -> id del intent creado con esa clave
+        self.idempotencia: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.estadisticas = {'peticiones': 0, 'fallos_inyectados': 0, 'webhooks': 0, 'webhooks_fallidos': 0}
+
+    @property
+    def url(self) -> str:
+        host, puerto = self.server_address[:2]
+        return f'http://{host}:{puerto}'
+
+    def simular_red(self) -> bool:
+        """Aplicar latencia y decidir si la petición falla"""
+        demora = self.latencia_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if demora > 0:
+            time.sleep(demora / 1000)
+        with self.lock:
+            self.estadisticas['peticiones'] += 1
+            if random.random() < self.tasa_fallos:
+                self.estadisticas['fallos_inyectados'] += 1
+                return False
+        return True
+
+    def crear_intent(self, campos: Dict[str, str], clave: Optional[str] = None) -> Dict[str, Any]:
+        if clave:
+            with self.lock:
+                existente = self.idempotencia.get(clave)
+                if existente:
+                    return dict(self.intents[existente])
+        intent_id = f'pi_fake_{secrets.token_hex(12)}'
+        metadata = {
+            clave[len('metadata['):-1]: valor
+            for clave, valor in campos.items() if clave.startswith('metadata[')
+        }
+        intent = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'amount': int(campos['amount']),
+            'amount_received': 0,
+            'currency': campos.get('currency', 'cop'),
+            'client_secret': f'{intent_id}_secret_{secrets.token_hex(8)}',
+            'status': 'requires_payment_method',
+            'metadata': metadata,
+            'created': int(time.time()),
+            'livemode': False,
+        }
+        with self.lock:
+            if clave:
+                # Dos peticiones concurrentes con la misma clave: gana la primera
+                existente = self.idempotencia.setdefault(clave, intent_id)
+                if existente != intent_id:
+                    return dict(self.intents[existente])
+            self.intents[intent_id] = intent
+        return intent
+
+    def confirmar_intent(self, intent_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            intent = self.intents.get(intent_id)
+            if intent is None:
+                return None
+            if intent['status'] == 'canceled':
+                return dict(intent)
+            intent['status'] = 'succeeded'
+            intent['amount_received'] = intent['amount']
+            intent = dict(intent)
+        if self.webhook_url:
+            threading.Thread(target=self.enviar_webhook, args=(intent,), daemon=True).start()
+        return intent
+
+    def cancelar_intent(self, intent_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            intent = self.intents.get(intent_id)
+            if intent is None:
+                return None
+            if intent['status'] != 'succeeded':
+                intent['status'] = 'canceled'
+            return dict(intent)
+
+    def reembolsar(self, intent_id: str, monto: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            intent = self.intents.get(intent_id)
+            if intent is None or intent['status'] != 'succeeded':
+                return None
+            return {
+                'id': f're_fake_{secrets.token_hex(12)}',
+                'object': 'refund',
+                'payment_intent': intent_id,
+                'amount': monto if monto is not None else intent['amount_received'],
+                'status': 'succeeded',
+            }
+
+    def enviar_webhook(self, intent: Dict[str, Any]):
+        """Enviar el evento payment_intent.succeeded firmado como lo hace Stripe"""
+        if self.webhook_delay_ms:
+            time.sleep(self.webhook_delay_ms / 1000)
+        payload = json.dumps({
+            'id': f'evt_fake_{secrets.token_hex(12)}',
+            'object': 'event',
+            'type': 'payment_intent.succeeded',
+            'created': int(time.time()),
+            'livemode': False,
+            'data': {'object': intent},
+        })
+        cabeceras = {'Content-Type': 'application/json'}
+        if self.webhook_secret:
+            cabeceras['Stripe-Signature'] = firmar_webhook(payload, self.webhook_secret)
+        try:
+            peticion = Request(self.webhook_url, data=payload.encode(), headers=cabeceras, method='POST')
+            with urlopen(peticion, timeout=30) as respuesta:
+                respuesta.read()
+            with self.lock:
+                self.estadisticas['webhooks'] += 1
+        except Exception as e:
+            logger.warning(f"Webhook fallido para {intent['id']}: {str(e)}")
+            with self.lock:
+                self.estadisticas['webhooks_fallidos'] += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeStripeGateway
+    protocol_version = 'HTTP/1.1'
+    # Cabeceras y cuerpo van en escrituras separadas; sin esto keep-alive paga ~40 ms por Nagle
+    disable_nagle_algorithm = True
+
+    def log_message(self, formato, *args):
+        logger.debug(formato % args)
+
+    def _responder(self, codigo: int, cuerpo: Dict[str, Any]):
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _error(self, codigo: int, mensaje: str, tipo: str = 'api_error'):
+        self._responder(codigo, {'error': {'type': tipo, 'message': mensaje}})
+
+    def _campos(self) -> Dict[str, str]:
+        largo = int(self.headers.get('Content-Length') or 0)
+        return dict(parse_qsl(self.rfile.read(largo).decode())) if largo else {}
+
+    def _ruta(self):
+        return [parte for parte in urlparse(self.path).path.split('/') if parte]
+
+    def do_GET(self):
+        ruta = self._ruta()
+        if ruta == ['health']:
+            return self._responder(200, {'ok': True, **self.server.estadisticas})
+        if not self.server.simular_red():
+            return self._error(500, 'Fallo inyectado')
+        if len(ruta) == 3 and ruta[:2] == ['v1', 'payment_intents']:
+            intent = self.server.intents.get(ruta[2])
+            if intent is None:
+                return self._error(404, 'No such payment_intent', 'invalid_request_error')
+            return self._responder(200, intent)
+        self._error(404, 'Ruta no soportada', 'invalid_request_error')
+
+    def do_POST(self):
+        ruta = self._ruta()
+        campos = self._campos()
+        if not self.server.simular_red():
+            return self._error(500, 'Fallo inyectado')
+
+        if ruta == ['v1', 'payment_intents']:
+            if not campos.get('amount', '').isdigit():
+                return self._error(400, 'Missing required param: amount', 'invalid_request_error')
+            return self._responder(
+                200, self.server.crear_intent(campos, self.headers.get('Idempotency-Key'))
+            )
+
+        if len(ruta) == 4 and ruta[:2] == ['v1', 'payment_intents'] and ruta[3] == 'confirm':
+            intent = self.server.confirmar_intent(ruta[2])
+            if intent is None:
+                return self._error(404, 'No such payment_intent', 'invalid_request_error')
+            return self._responder(200, intent)
+
+        if len(ruta) == 4 and ruta[:2] == ['v1', 'payment_intents'] and ruta[3] == 'cancel':
+            intent = self.server.cancelar_intent(ruta[2])
+            if intent is None:
+                return self._error(404, 'No such payment_intent', 'invalid_request_error')
+            if intent['status'] != 'canceled':
+                return self._error(400, 'PaymentIntent already succeeded', 'invalid_request_error')
+            return self._responder(200, intent)
+
+        if ruta == ['v1', 'refunds']:
+            monto = campos.get('amount', '')
+            reembolso = self.server.reembolsar(
+                campos.get('payment_intent', ''), int(monto) if monto.isdigit() else None
+            )
+            if reembolso is None:
+                return self._error(400, 'PaymentIntent has no charge to refund', 'invalid_request_error')
+            return self._responder(200, reembolso)
+
+        self._error(404, 'Ruta no soportada', 'invalid_request_error')
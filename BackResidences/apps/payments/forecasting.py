@@ -0,0 +1,211 @@
+"""
+Proyección de la tasa de recaudo por concepto y bloque
+Calcula sobre agregados históricos de facturas con NumPy y guarda el
+resultado en ProyeccionRecaudo para que los reportes lo lean directamente
+"""
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .config import REPORTS_CONFIG
+from .models import Factura, ProyeccionRecaudo
+
+logger = logging.getLogger(__name__)
+
+CENTAVO = Decimal('0.01')
+METODOS = ('regresion', 'promedio_movil')
+
+
+# ================== CÁLCULO VECTORIZADO (sin acceso a BD) ==================
+
+def promedio_movil(matriz: np.ndarray, ventana: int) -> np.ndarray:
+    """
+    Promedio de los últimos `ventana` valores observados de cada fila
+
+    Args:
+        matriz: Series (filas) x períodos (columnas), NaN donde no hay dato
+
+    Returns:
+        Vector con el promedio por fila (NaN si la ventana no tiene datos)
+    """
+    tramo = matriz[:, -ventana:]
+    observados = ~np.isnan(tramo)
+    cantidad = observados.sum(axis=1)
+    suma = np.where(observados, tramo, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(cantidad > 0, suma / cantidad, np.nan)
+
+
+def regresion_lineal(matriz: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ajuste por mínimos cuadrados de cada fila y valor en el período siguiente
+
+    Returns:
+        Tupla (proyección, observaciones por fila); NaN si hay menos de 2 datos
+    """
+    periodos = matriz.shape[1]
+    x = np.arange(periodos, dtype=float)
+    observados = ~np.isnan(matriz)
+    y = np.where(observados, matriz, 0.0)
+    xm = np.where(observados, x, 0.0)
+
+    n = observados.sum(axis=1).astype(float)
+    sx = xm.sum(axis=1)
+    sy = y.sum(axis=1)
+    sxx = (xm * xm).sum(axis=1)
+    sxy = (xm * y).sum(axis=1)
+
+    denominador = n * sxx - sx * sx
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pendiente = (n * sxy - sx * sy) / denominador
+        intercepto = (sy - pendiente * sx) / n
+        proyeccion = intercepto + pendiente * periodos
+    return np.where(denominador > 0, proyeccion, np.nan), n
+
+
+def proyectar(matriz: np.ndarray, metodo: str, ventana: int,
+              minimo_periodos: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Proyectar el siguiente valor de cada serie
+
+    Las series con menos de `minimo_periodos` observaciones (o con ajuste
+    indefinido) se proyectan con el promedio móvil.
+
+    Returns:
+        Tupla (proyección, método usado por fila)
+    """
+    movil = promedio_movil(matriz, ventana)
+    if metodo == 'promedio_movil':
+        return movil, np.full(len(matriz), 'promedio_movil', dtype=object)
+
+    ajuste, observaciones = regresion_lineal(matriz)
+    usar_ajuste = (observaciones >= minimo_periodos) & ~np.isnan(ajuste)
+    return (
+        np.where(usar_ajuste, ajuste, movil),
+        np.where(usar_ajuste, 'regresion', 'promedio_movil').astype(object),
+    )
+
+
+# ================== SERVICIO ==================
+
+def _periodo(indice: int) -> str:
+    return f'{indice // 12:04d}-{indice % 12 + 1:02d}'
+
+
+def _indice(periodo: str) -> int:
+    anio, mes = (int(parte) for parte in periodo.split('-'))
+    return anio * 12 + mes - 1
+
+
+def _decimal(valor: float) -> Decimal:
+    return Decimal(repr(float(valor))).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+class ForecastService:
+    """Servicio para precalcular proyecciones de recaudo"""
+
+    def rollup(self, periodos: List[str]) -> List[Dict[str, Any]]:
+        """Facturado y pendiente por concepto, bloque y período en una consulta"""
+        return list(
+            Factura.objects.filter(periodo__in=periodos)
+            .exclude(estado='anulada')
+            .values('concepto_id', 'vivienda__bloque', 'periodo')
+            .annotate(facturado=Sum('monto_total'), pendiente=Sum('saldo_pendiente'))
+            .order_by()
+        )
+
+    def calcular(self, hasta: Optional[str] = None, periodos: Optional[int] = None,
+                 metodo: str = 'regresion', dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Calcular y guardar la proyección del período siguiente a `hasta`
+
+        Args:
+            hasta: Último período histórico (default: mes anterior al actual)
+            periodos: Número de períodos históricos a usar
+            metodo: 'regresion' o 'promedio_movil'
+            dry_run: Calcular sin guardar
+
+        Returns:
+            Dict con el período proyectado y las filas calculadas
+        """
+        if metodo not in METODOS:
+            raise ValueError(f"Método no soportado: {metodo}")
+
+        periodos = periodos or REPORTS_CONFIG['forecast_history_periods']
+        if hasta is None:
+            hasta = _periodo(_indice(timezone.now().strftime('%Y-%m')) - 1)
+        indice_fin = _indice(hasta)
+        historicos = [_periodo(i) for i in range(indice_fin - periodos + 1, indice_fin + 1)]
+        objetivo = _periodo(indice_fin + 1)
+        columna = {periodo: i for i, periodo in enumerate(historicos)}
+
+        filas = self.rollup(historicos)
+        series: Dict[Tuple[int, str], int] = {}
+        for fila in filas:
+            series.setdefault((fila['concepto_id'], fila['vivienda__bloque'] or ''), len(series))
+
+        if not series:
+            return {'periodo': objetivo, 'historicos': historicos, 'proyecciones': []}
+
+        tasas = np.full((len(series), periodos), np.nan)
+        facturado = np.full((len(series), periodos), np.nan)
+        for fila in filas:
+            total = float(fila['facturado'] or 0)
+            if total <= 0:
+                continue
+            i = series[(fila['concepto_id'], fila['vivienda__bloque'] or '')]
+            j = columna[fila['periodo']]
+            facturado[i, j] = total
+            tasas[i, j] = (total - float(fila['pendiente'] or 0)) / total * 100
+
+        ventana = REPORTS_CONFIG['forecast_moving_average_window']
+        minimo = REPORTS_CONFIG['forecast_min_periods']
+        tasa_proyectada, metodos = proyectar(tasas, metodo, ventana, minimo)
+        facturado_proyectado, _ = proyectar(facturado, metodo, ventana, minimo)
+        tasa_proyectada = np.clip(tasa_proyectada, 0, 100)
+        facturado_proyectado = np.clip(facturado_proyectado, 0, None)
+        observaciones = (~np.isnan(tasas)).sum(axis=1)
+
+        ahora = timezone.now()
+        proyecciones = []
+        for (concepto_id, bloque), i in series.items():
+            if np.isnan(tasa_proyectada[i]) or np.isnan(facturado_proyectado[i]):
+                continue
+            ultima = tasas[i, -1]
+            proyecciones.append(ProyeccionRecaudo(
+                concepto_id=concepto_id,
+                bloque=bloque,
+                periodo=objetivo,
+                metodo=metodos[i],
+                tasa_recaudo=_decimal(tasa_proyectada[i]),
+                facturado_proyectado=_decimal(facturado_proyectado[i]),
+                recaudo_proyectado=_decimal(facturado_proyectado[i] * tasa_proyectada[i] / 100),
+                tasa_ultimo_periodo=None if np.isnan(ultima) else _decimal(ultima),
+                periodos_historicos=int(observaciones[i]),
+                calculado_en=ahora,
+            ))
+
+        if not dry_run:
+            with transaction.atomic():
+                ProyeccionRecaudo.objects.bulk_create(
+                    proyecciones,
+                    batch_size=1000,
+                    update_conflicts=True,
+                    unique_fields=['concepto', 'bloque', 'periodo'],
+                    update_fields=[
+                        'metodo', 'tasa_recaudo', 'facturado_proyectado', 'recaudo_proyectado',
+                        'tasa_ultimo_periodo', 'periodos_historicos', 'calculado_en', 'updated_at',
+                    ],
+                )
+
+        logger.info(f"Proyección de recaudo {objetivo}: {len(proyecciones)} series")
+        return {'periodo': objetivo, 'historicos': historicos, 'proyecciones': proyecciones}
+
+
+# Instancia global del servicio
+forecast_service = ForecastService()
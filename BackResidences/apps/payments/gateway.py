@@ -0,0 +1,309 @@
+"""
+Cliente HTTP de la pasarela de pagos
+Conexiones persistentes en pool, timeouts acotados, claves de idempotencia,
+reintentos con backoff exponencial y jitter, circuit breaker, límite de
+llamadas simultáneas y métricas de latencia
+
+Habla el protocolo REST de Stripe (form-encoded, autenticación Bearer), por lo
+que sirve tanto para api.stripe.com como para `manage.py fake_stripe`.
+"""
+import http.client
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode, urlsplit
+
+from .config import GATEWAY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_REINTENTABLES = {409, 429, 500, 502, 503, 504}
+
+
+class GatewayError(Exception):
+    """Error de la pasarela; `status` es None si no hubo respuesta HTTP"""
+
+    def __init__(self, mensaje: str, status: Optional[int] = None, cuerpo: Optional[Dict] = None):
+        super().__init__(mensaje)
+        self.status = status
+        self.cuerpo = cuerpo or {}
+
+
+class CircuitoAbierto(GatewayError):
+    """La pasarela falló repetidamente y las llamadas se rechazan sin intentarlo"""
+
+
+class PasarelaSaturada(GatewayError):
+    """Se alcanzó el máximo de llamadas simultáneas a la pasarela"""
+
+
+def _codificar(data: Dict[str, Any], prefijo: str = '') -> Dict[str, Any]:
+    """Aplanar dicts anidados al formato de Stripe: metadata[clave]=valor"""
+    campos = {}
+    for clave, valor in data.items():
+        nombre = f'{prefijo}[{clave}]' if prefijo else clave
+        if isinstance(valor, dict):
+            campos.update(_codificar(valor, nombre))
+        elif isinstance(valor, bool):
+            campos[nombre] = 'true' if valor else 'false'
+        elif valor is not None:
+            campos[nombre] = valor
+    return campos
+
+
+class ConnectionPool:
+    """Pool LIFO de conexiones keep-alive hacia un único host"""
+
+    def __init__(self, base_url: str, tamano: int, timeout: float):
+        partes = urlsplit(base_url)
+        self.https = partes.scheme == 'https'
+        self.host = partes.hostname
+        self.port = partes.port
+        self.prefijo = partes.path.rstrip('/')
+        self.timeout = timeout
+        self._libres: queue.LifoQueue = queue.LifoQueue(maxsize=tamano)
+
+    def adquirir(self) -> http.client.HTTPConnection:
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            clase = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            return clase(self.host, self.port, timeout=self.timeout)
+
+    def liberar(self, conexion: http.client.HTTPConnection, reutilizable: bool):
+        if reutilizable:
+            try:
+                self._libres.put_nowait(conexion)
+                return
+            except queue.Full:
+                pass
+        conexion.close()
+
+    def cerrar(self):
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class CircuitBreaker:
+    """Abre el circuito tras `umbral` fallos seguidos; prueba una llamada tras `enfriamiento`"""
+
+    def __init__(self, umbral: int, enfriamiento: float):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.estado = 'cerrado'
+        self.fallos = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self.estado == 'abierto':
+                if time.monotonic() < self._abierto_hasta:
+                    return False
+                self.estado = 'semiabierto'
+            if self.estado == 'semiabierto':
+                if self._prueba_en_curso:
+                    return False
+                self._prueba_en_curso = True
+            return True
+
+    def exito(self):
+        with self._lock:
+            self.estado = 'cerrado'
+            self.fallos = 0
+            self._prueba_en_curso = False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.estado == 'semiabierto' or self.fallos >= self.umbral:
+                if self.estado != 'abierto':
+                    logger.warning(f"Circuito de la pasarela abierto tras {self.fallos} fallos")
+                self.estado = 'abierto'
+                self._abierto_hasta = time.monotonic() + self.enfriamiento
+            self._prueba_en_curso = False
+
+
+class GatewayMetrics:
+    """Contadores y ventana de latencias recientes por operación"""
+
+    def __init__(self, ventana: int):
+        self.ventana = ventana
+        self._operaciones: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _operacion(self, nombre: str) -> Dict[str, Any]:
+        if nombre not in self._operaciones:
+            self._operaciones[nombre] = {
+                'llamadas': 0, 'errores': 0, 'reintentos': 0, 'rechazadas': 0,
+                'latencias': deque(maxlen=self.ventana),
+            }
+        return self._operaciones[nombre]
+
+    def registrar(self, nombre: str, duracion: float, error: bool, reintentos: int):
+        with self._lock:
+            operacion = self._operacion(nombre)
+            operacion['llamadas'] += 1
+            operacion['errores'] += int(error)
+            operacion['reintentos'] += reintentos
+            operacion['latencias'].append(duracion)
+
+    def rechazada(self, nombre: str):
+        with self._lock:
+            self._operacion(nombre)['rechazadas'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        resultado = {}
+        with self._lock:
+            for nombre, operacion in self._operaciones.items():
+                latencias = sorted(operacion['latencias'])
+
+                def _p(p):
+                    if not latencias:
+                        return None
+                    return round(latencias[min(len(latencias) - 1, int(p / 100 * len(latencias)))] * 1000, 1)
+
+                resultado[nombre] = {
+                    'llamadas': operacion['llamadas'],
+                    'errores': operacion['errores'],
+                    'reintentos': operacion['reintentos'],
+                    'rechazadas': operacion['rechazadas'],
+                    'latencia_p50_ms': _p(50),
+                    'latencia_p95_ms': _p(95),
+                    'latencia_max_ms': round(latencias[-1] * 1000, 1) if latencias else None,
+                }
+        return resultado
+
+
+class GatewayClient:
+    """Cliente compartido de la pasarela (una instancia por proceso)"""
+
+    def __init__(self, base_url: str, api_key: str, timeout: Optional[float] = None,
+                 config: Optional[Dict[str, Any]] = None):
+        self.config = {**GATEWAY_CONFIG, **(config or {})}
+        if timeout is not None:
+            self.config['timeout'] = timeout
+        self.api_key = api_key
+        self.pool = ConnectionPool(base_url, self.config['pool_size'], self.config['timeout'])
+        self.breaker = CircuitBreaker(self.config['breaker_threshold'], self.config['breaker_cooldown'])
+        self.metrics = GatewayMetrics(self.config['metrics_window'])
+        self._en_vuelo = threading.BoundedSemaphore(self.config['max_concurrent'])
+
+    def get(self, path: str, operacion: str) -> Dict[str, Any]:
+        return self.request('GET', path, operacion=operacion)
+
+    def post(self, path: str, data: Dict[str, Any], operacion: str,
+             idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        return self.request('POST', path, data, operacion=operacion,
+                            idempotency_key=idempotency_key or str(uuid.uuid4()))
+
+    def request(self, method: str, path: str, data: Optional[Dict[str, Any]] = None,
+                operacion: str = 'request', idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Ejecutar una llamada con reintentos
+
+        Las llamadas POST llevan siempre Idempotency-Key (la misma en todos los
+        reintentos), así que reintentar no duplica cobros.
+
+        Raises:
+            CircuitoAbierto, PasarelaSaturada o GatewayError
+        """
+        if not self._en_vuelo.acquire(timeout=self.config['acquire_timeout']):
+            self.metrics.rechazada(operacion)
+            raise PasarelaSaturada('Pasarela saturada: demasiadas llamadas simultáneas')
+
+        inicio = time.monotonic()
+        reintentos = 0
+        error = True
+        try:
+            cuerpo = urlencode(_codificar(data)).encode() if data else None
+            cabeceras = {
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'Connection': 'keep-alive',
+            }
+            if idempotency_key:
+                cabeceras['Idempotency-Key'] = idempotency_key
+
+            while True:
+                if not self.breaker.permitir():
+                    self.metrics.rechazada(operacion)
+                    raise CircuitoAbierto('Pasarela no disponible temporalmente (circuito abierto)')
+
+                try:
+                    status, respuesta, reintentar_en = self._intento(method, path, cuerpo, cabeceras)
+                except (OSError, http.client.HTTPException) as e:
+                    status, respuesta, reintentar_en = None, {'error': {'message': str(e)}}, None
+
+                if status is not None and status < 400:
+                    self.breaker.exito()
+                    error = False
+                    return respuesta
+
+                reintentable = status is None or status in ESTADOS_REINTENTABLES
+                if reintentable:
+                    self.breaker.fallo()
+                else:
+                    # Errores del cliente (4xx): la pasarela está sana
+                    self.breaker.exito()
+
+                mensaje = respuesta.get('error', {}).get('message', f'HTTP {status}')
+                espera = self._backoff(reintentos, reintentar_en)
+                transcurrido = time.monotonic() - inicio
+                if (not reintentable or reintentos >= self.config['max_retries']
+                        or transcurrido + espera > self.config['deadline']):
+                    raise GatewayError(mensaje, status=status, cuerpo=respuesta)
+
+                reintentos += 1
+                logger.warning(f"Pasarela {operacion}: {mensaje}; reintento {reintentos} en {espera:.2f}s")
+                time.sleep(espera)
+        finally:
+            duracion = time.monotonic() - inicio
+            self._en_vuelo.release()
+            self.metrics.registrar(operacion, duracion, error, reintentos)
+            if duracion > self.config['slow_call_seconds']:
+                logger.warning(f"Pasarela {operacion} lenta: {duracion:.2f}s")
+
+    def _intento(self, method, path, cuerpo, cabeceras):
+        conexion = self.pool.adquirir()
+        reutilizable = False
+        try:
+            conexion.request(method, self.pool.prefijo + path, body=cuerpo, headers=cabeceras)
+            respuesta = conexion.getresponse()
+            datos = respuesta.read()
+            reutilizable = not respuesta.will_close
+            try:
+                contenido = json.loads(datos) if datos else {}
+            except ValueError:
+                contenido = {'error': {'message': datos[:200].decode(errors='replace')}}
+            reintentar_en = respuesta.getheader('Retry-After')
+            return respuesta.status, contenido, float(reintentar_en) if reintentar_en and reintentar_en.isdigit() else None
+        finally:
+            self.pool.liberar(conexion, reutilizable)
+
+    def _backoff(self, intento: int, reintentar_en: Optional[float]) -> float:
+        """Backoff exponencial con jitter completo (o Retry-After si la pasarela lo indica)"""
+        if reintentar_en is not None:
+            return min(reintentar_en, self.config['backoff_max'])
+        techo = min(self.config['backoff_max'], self.config['backoff_base'] * (2 ** intento))
+        return random.uniform(0, techo)
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            'circuito': self.breaker.estado,
+            'fallos_consecutivos': self.breaker.fallos,
+            'operaciones': self.metrics.snapshot(),
+        }
+
+    def close(self):
+        self.pool.cerrar()
@@ -0,0 +1,290 @@
+"""
+Comando para verificar los planes de consulta de facturas y pagos
+Siembra un volumen grande de facturas y comprueba que las consultas
+frecuentes del módulo usan los índices definidos en los modelos
+"""
+import json
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.payments.models import ConceptoPago, MetodoPago, Factura, Pago
+from apps.residences.models import Vivienda
+
+User = get_user_model()
+
+NODOS_INDICE = {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan'}
+ESTADOS_POR_COBRAR = ['pendiente', 'parcialmente_pagada']
+
+
+class _Rollback(Exception):
+    """Se lanza para descartar los datos sembrados al final del benchmark"""
+
+
+class Command(BaseCommand):
+    help = 'Siembra facturas masivas y verifica que las consultas frecuentes usan índices'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--facturas',
+            type=int,
+            default=1_000_000,
+            help='Número de facturas a sembrar (default: 1.000.000)'
+        )
+        parser.add_argument(
+            '--viviendas',
+            type=int,
+            default=2000,
+            help='Número de viviendas a sembrar (default: 2000)'
+        )
+        parser.add_argument(
+            '--pagos',
+            type=int,
+            default=200_000,
+            help='Número de pagos a sembrar (default: 200.000)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10_000,
+            help='Tamaño de lote para bulk_create'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Conservar los datos sembrados (por defecto se revierten)'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Este benchmark requiere PostgreSQL (usa EXPLAIN FORMAT JSON)')
+
+        self.batch_size = options['batch_size']
+        resultados = []
+
+        try:
+            with transaction.atomic():
+                contexto = self._sembrar(options)
+                self._analizar()
+                resultados = self._verificar_planes(contexto)
+                if not options['keep']:
+                    raise _Rollback()
+        except _Rollback:
+            self.stdout.write(self.style.WARNING('\n↺ Datos de benchmark revertidos'))
+
+        fallidas = [r for r in resultados if not r['usa_indice']]
+
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write('📊 PLANES DE CONSULTA:')
+        for r in resultados:
+            estilo = self.style.SUCCESS if r['usa_indice'] else self.style.ERROR
+            indices = ', '.join(r['indices']) or '-'
+            self.stdout.write(estilo(
+                f"  • {r['nombre']}: {' > '.join(r['nodos'])} "
+                f"[{indices}] ({r['duracion_ms']:.2f} ms)"
+            ))
+
+        if fallidas:
+            raise CommandError(
+                'Consultas sin uso de índice: ' + ', '.join(r['nombre'] for r in fallidas)
+            )
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Todas las consultas frecuentes usan índices'))
+
+    # ------------------------------------------------------------------
+    # Siembra de datos
+    # ------------------------------------------------------------------
+
+    def _sembrar(self, options):
+        rng = random.Random(42)
+        ahora = timezone.now()
+        total_facturas = options['facturas']
+        total_viviendas = options['viviendas']
+
+        self.stdout.write(f'Sembrando {total_viviendas} viviendas...')
+        viviendas = Vivienda.objects.bulk_create([
+            Vivienda(
+                identificador=f'BENCH-{i:06d}',
+                bloque=f'B{i % 20:02d}',
+                tipo='apartamento',
+                metros_cuadrados=Decimal('60.00') + (i % 40),
+                cuota_administracion=Decimal('250000.00'),
+            )
+            for i in range(total_viviendas)
+        ], batch_size=self.batch_size)
+        vivienda_ids = [v.pk for v in viviendas]
+
+        conceptos = ConceptoPago.objects.bulk_create([
+            ConceptoPago(
+                nombre=f'BENCH Concepto {i}',
+                descripcion='Concepto de benchmark',
+                valor_base=Decimal('50000.00'),
+            )
+            for i in range(5)
+        ])
+        concepto_ids = [c.pk for c in conceptos]
+
+        usuario = User.objects.create(
+            username='bench-payments',
+            email='bench-payments@backresidences.local',
+            documento_numero='BENCH-000001',
+        )
+        metodo = MetodoPago.objects.create(
+            nombre='BENCH Método',
+            codigo='bench',
+            descripcion='Método de benchmark',
+        )
+
+        # Períodos hacia atrás desde el mes actual hasta cubrir el total pedido
+        por_periodo = len(vivienda_ids) * len(concepto_ids)
+        num_periodos = -(-total_facturas // por_periodo)
+        periodos = []
+        anio, mes = ahora.year, ahora.month
+        for _ in range(num_periodos):
+            periodos.append((anio, mes))
+            mes -= 1
+            if mes == 0:
+                anio, mes = anio - 1, 12
+
+        self.stdout.write(f'Sembrando {total_facturas} facturas en {num_periodos} períodos...')
+        inicio = time.perf_counter()
+        lote = []
+        secuencia = 0
+        for indice_periodo, (anio, mes) in enumerate(periodos):
+            periodo = f'{anio:04d}-{mes:02d}'
+            vencimiento = ahora - timedelta(days=30 * indice_periodo - 15)
+            for vivienda_id in vivienda_ids:
+                for concepto_id in concepto_ids:
+                    if secuencia >= total_facturas:
+                        break
+                    secuencia += 1
+                    # Lo histórico está casi todo pagado; lo reciente sigue abierto
+                    if indice_periodo > 2 and rng.random() < 0.97:
+                        estado, saldo = 'pagada', Decimal('0.00')
+                    else:
+                        estado = rng.choice(ESTADOS_POR_COBRAR)
+                        saldo = Decimal('50000.00') if estado == 'pendiente' else Decimal('20000.00')
+                    lote.append(Factura(
+                        numero_factura=f'BENCH-{secuencia:08d}',
+                        vivienda_id=vivienda_id,
+                        concepto_id=concepto_id,
+                        periodo=periodo,
+                        fecha_vencimiento=vencimiento,
+                        monto_original=Decimal('50000.00'),
+                        monto_total=Decimal('50000.00'),
+                        saldo_pendiente=saldo,
+                        estado=estado,
+                    ))
+                    if len(lote) >= self.batch_size:
+                        Factura.objects.bulk_create(lote)
+                        lote = []
+        if lote:
+            Factura.objects.bulk_create(lote)
+        self.stdout.write(f'  ✓ Facturas sembradas en {time.perf_counter() - inicio:.1f}s')
+
+        self.stdout.write(f'Sembrando {options["pagos"]} pagos...')
+        lote = []
+        for i in range(options['pagos']):
+            fecha_pago = ahora - timedelta(days=rng.randint(0, 30 * num_periodos))
+            lote.append(Pago(
+                numero_pago=f'BENCH-{i:08d}',
+                vivienda_id=rng.choice(vivienda_ids),
+                monto_total=Decimal('50000.00'),
+                metodo_pago=metodo,
+                fecha_pago=fecha_pago,
+                estado='confirmado' if rng.random() < 0.9 else 'pendiente',
+                registrado_por=usuario,
+            ))
+            if len(lote) >= self.batch_size:
+                Pago.objects.bulk_create(lote)
+                lote = []
+        if lote:
+            Pago.objects.bulk_create(lote)
+
+        return {
+            'ahora': ahora,
+            'vivienda_id': rng.choice(vivienda_ids),
+            'periodo': f'{periodos[len(periodos) // 2][0]:04d}-{periodos[len(periodos) // 2][1]:02d}',
+            'metodo_id': metodo.pk,
+        }
+
+    def _analizar(self):
+        """Actualizar estadísticas para que el planificador vea el volumen real"""
+        with connection.cursor() as cursor:
+            for modelo in (Factura, Pago, Vivienda):
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(modelo._meta.db_table)}')
+
+    # ------------------------------------------------------------------
+    # Verificación de planes
+    # ------------------------------------------------------------------
+
+    def _consultas_frecuentes(self, contexto):
+        ahora = contexto['ahora']
+        vivienda_id = contexto['vivienda_id']
+        return [
+            ('estado_cuenta_por_cobrar', Factura.objects.filter(
+                vivienda_id=vivienda_id, estado__in=ESTADOS_POR_COBRAR
+            )),
+            ('estado_cuenta_saldo', Factura.objects.filter(
+                vivienda_id=vivienda_id, saldo_pendiente__gt=0
+            )),
+            ('dashboard_periodo', Factura.objects.filter(periodo=contexto['periodo'])),
+            ('calculate_interest', Factura.objects.filter(
+                fecha_vencimiento__lt=ahora,
+                estado__in=ESTADOS_POR_COBRAR,
+                saldo_pendiente__gt=0
+            )),
+            ('excluir_morosos', Factura.objects.filter(
+                fecha_vencimiento__lt=ahora,
+                estado__in=ESTADOS_POR_COBRAR
+            ).values_list('vivienda_id', flat=True)),
+            ('ultimo_pago_vivienda', Pago.objects.filter(
+                vivienda_id=vivienda_id, estado='confirmado'
+            ).order_by('-fecha_pago')[:1]),
+            ('recaudo_periodo_metodo', Pago.objects.filter(
+                fecha_pago__gte=ahora - timedelta(days=30),
+                fecha_pago__lt=ahora,
+                estado='confirmado',
+                metodo_pago_id=contexto['metodo_id']
+            )),
+        ]
+
+    def _verificar_planes(self, contexto):
+        resultados = []
+        with connection.cursor() as cursor:
+            for nombre, queryset in self._consultas_frecuentes(contexto):
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+
+                nodos, indices = [], []
+                self._recorrer_plan(plan[0]['Plan'], nodos, indices)
+
+                inicio = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                duracion_ms = (time.perf_counter() - inicio) * 1000
+
+                resultados.append({
+                    'nombre': nombre,
+                    'nodos': nodos,
+                    'indices': indices,
+                    'usa_indice': any(nodo in NODOS_INDICE for nodo in nodos),
+                    'duracion_ms': duracion_ms,
+                })
+        return resultados
+
+    def _recorrer_plan(self, nodo, nodos, indices):
+        nodos.append(nodo['Node Type'])
+        if 'Index Name' in nodo:
+            indices.append(nodo['Index Name'])
+        for hijo in nodo.get('Plans', []):
+            self._recorrer_plan(hijo, nodos, indices)
@@ -0,0 +1,71 @@
+"""
+Comando para precalcular la proyección de recaudo del período siguiente
+Pensado para ejecutarse cada noche (cron) y alimentar el dashboard de BI
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.payments.config import REPORTS_CONFIG
+from apps.payments.forecasting import forecast_service, METODOS
+
+
+class Command(BaseCommand):
+    help = 'Proyecta la tasa de recaudo por concepto y bloque y la guarda en ProyeccionRecaudo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hasta',
+            help='Último período histórico (YYYY-MM). Por defecto el mes anterior'
+        )
+        parser.add_argument(
+            '--periodos',
+            type=int,
+            default=REPORTS_CONFIG['forecast_history_periods'],
+            help='Número de períodos históricos a considerar'
+        )
+        parser.add_argument(
+            '--metodo',
+            choices=METODOS,
+            default='regresion',
+            help='Método de proyección (default: regresion)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Calcular sin guardar las proyecciones'
+        )
+
+    def handle(self, *args, **options):
+        if options['periodos'] < 1:
+            raise CommandError('--periodos debe ser mayor que 0')
+
+        try:
+            resultado = forecast_service.calcular(
+                hasta=options['hasta'],
+                periodos=options['periodos'],
+                metodo=options['metodo'],
+                dry_run=options['dry_run']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        proyecciones = resultado['proyecciones']
+        historicos = resultado['historicos']
+
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write(f"📈 PROYECCIÓN DE RECAUDO {resultado['periodo']}:")
+        self.stdout.write(f"  • Históricos: {historicos[0]} a {historicos[-1]}")
+        self.stdout.write(f"  • Series proyectadas: {len(proyecciones)}")
+        self.stdout.write(
+            f"  • Por regresión: {sum(1 for p in proyecciones if p.metodo == 'regresion')}"
+        )
+
+        if options['verbosity'] > 1:
+            for p in proyecciones:
+                self.stdout.write(
+                    f"    - concepto {p.concepto_id} bloque {p.bloque or '-'}: "
+                    f"{p.tasa_recaudo}% ({p.metodo})"
+                )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('\n⚠️  Modo simulación: no se guardaron proyecciones'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✅ Proyecciones guardadas'))
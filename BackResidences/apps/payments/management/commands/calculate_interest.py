@@ -4,6 +4,7 @@ Comando para calcular intereses de mora automáticamente
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from apps.payments.models import Factura
+from apps.payments.money import interes_mora
 from decimal import Decimal
 
 
@@ -38,7 +39,7 @@ class Command(BaseCommand):
             fecha_vencimiento__lt=timezone.now(),
             estado__in=['pendiente', 'parcialmente_pagada'],
             saldo_pendiente__gt=0
-        )
+        ).select_related('concepto')
         
         total_facturas = facturas_vencidas.count()
         facturas_procesadas = 0
@@ -51,9 +52,12 @@ class Command(BaseCommand):
             dias_vencido = (timezone.now().date() - factura.fecha_vencimiento.date()).days
             
             if dias_vencido > 0:
-                # Calcular intereses
-                interes_diario = factura.concepto.porcentaje_interes_mora / Decimal('30')
-                nuevos_intereses = factura.monto_original * (interes_diario / Decimal('100')) * dias_vencido
+                # Calcular intereses (centavos enteros, un solo redondeo)
+                nuevos_intereses = interes_mora(
+                    factura.monto_original,
+                    factura.concepto.porcentaje_interes_mora,
+                    dias_vencido
+                ).decimal
                 
                 if nuevos_intereses != intereses_anteriores:
                     if not dry_run:
@@ -80,7 +84,8 @@ class Command(BaseCommand):
         )
         
         if not dry_run:
-            count_vencidas = facturas_pendientes_vencidas.update(estado='vencida')
+            # updated_at explícito: update() no lo toca y versiona los snapshots de períodos cerrados
+            count_vencidas = facturas_pendientes_vencidas.update(estado='vencida', updated_at=timezone.now())
         else:
             count_vencidas = facturas_pendientes_vencidas.count()
         
@@ -0,0 +1,62 @@
+"""
+Comando para cerrar un período y congelar los estados de cuenta por vivienda
+Pensado para ejecutarse a inicio de mes sobre el mes anterior (cron)
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.payments.statements import statement_service
+
+
+class Command(BaseCommand):
+    help = 'Cierra un período de facturación y guarda snapshots de estado de cuenta por vivienda'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'periodo',
+            nargs='?',
+            help='Período a cerrar (YYYY-MM). Por defecto el mes anterior'
+        )
+        parser.add_argument(
+            '--reabrir',
+            action='store_true',
+            help='Reabrir el período y borrar sus snapshots'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Calcular los snapshots sin guardarlos'
+        )
+
+    def handle(self, *args, **options):
+        periodo = options['periodo']
+        if not periodo:
+            primero = timezone.localdate().replace(day=1)
+            periodo = (primero - timedelta(days=1)).strftime('%Y-%m')
+
+        if options['reabrir']:
+            try:
+                borrados = statement_service.reabrir(periodo)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Período {periodo} reabierto ({borrados} snapshots eliminados)'
+            ))
+            return
+
+        try:
+            resultado = statement_service.cerrar(periodo, dry_run=options['dry_run'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write(f"🔒 CIERRE DEL PERÍODO {resultado['periodo']}:")
+        self.stdout.write(f"  • Viviendas: {resultado['viviendas']}")
+        self.stdout.write(f"  • Facturas: {resultado['facturas']}")
+        self.stdout.write(f"  • Pagos: {resultado['pagos']}")
+        self.stdout.write(f"  • Tamaño comprimido: {resultado['bytes'] / 1024:.1f} KB")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('\n⚠️  Modo simulación: no se guardaron snapshots'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✅ Período cerrado'))
@@ -0,0 +1,54 @@
+"""
+Comando para enviar recordatorios de cobro agrupados por residente
+Pensado para ejecutarse cada noche (cron)
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.payments.notifications import dunning_service, get_backend, DUNNING_CONFIG
+
+
+class Command(BaseCommand):
+    help = 'Envía un recordatorio por residente con sus facturas próximas a vencer o vencidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend',
+            default=DUNNING_CONFIG['backend'],
+            help='Backend de entrega: console, file, email o ruta importable'
+        )
+        parser.add_argument(
+            '--dias-anticipacion',
+            type=int,
+            default=DUNNING_CONFIG['days_before_due'],
+            help='Incluir facturas que vencen en los próximos N días'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Agrupar y deduplicar sin entregar ni registrar envíos'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            backend = get_backend(options['backend'])
+        except ImportError as e:
+            raise CommandError(f"Backend inválido: {e}")
+
+        resultado = dunning_service.run(
+            backend=backend,
+            dias_anticipacion=options['dias_anticipacion'],
+            dry_run=options['dry_run']
+        )
+
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write(f'📨 RECORDATORIOS DE COBRO ({backend.canal}):')
+        self.stdout.write(f"  • Destinatarios evaluados: {resultado['destinatarios']}")
+        self.stdout.write(f"  • Enviados: {resultado['enviados']}")
+        self.stdout.write(f"  • Omitidos (ya notificados): {resultado['omitidos']}")
+
+        if resultado['fallidos']:
+            self.stdout.write(self.style.ERROR(f"  • Fallidos: {resultado['fallidos']}"))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('\n⚠️  Modo simulación: no se entregaron mensajes'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✅ Recordatorios procesados'))
@@ -0,0 +1,55 @@
+"""
+Comando para levantar la pasarela local compatible con Stripe
+Uso típico en pruebas de carga:
+    STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_WEBHOOK_SECRET=whsec_local python manage.py runserver
+    python manage.py fake_stripe --webhook-secret whsec_local --latency-ms 120 --failure-rate 0.02
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.payments.fake_gateway import FakeStripeGateway
+
+
+class Command(BaseCommand):
+    help = 'Levanta una pasarela local de PaymentIntents con latencia, fallos y webhooks configurables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Interfaz de escucha')
+        parser.add_argument('--port', type=int, default=12111, help='Puerto (default: 12111)')
+        parser.add_argument('--latency-ms', type=float, default=0, help='Latencia media por petición')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='Variación uniforme de la latencia')
+        parser.add_argument(
+            '--failure-rate',
+            type=float,
+            default=0.0,
+            help='Fracción de peticiones que responden 500 (0 a 1)'
+        )
+        parser.add_argument(
+            '--webhook-url',
+            default='http://127.0.0.1:8000/api/v1/payments/stripe/webhook/',
+            help='URL que recibe los eventos payment_intent.succeeded'
+        )
+        parser.add_argument('--webhook-secret', default='', help='Secreto para firmar los webhooks')
+        parser.add_argument('--webhook-delay-ms', type=float, default=0, help='Demora antes de enviar el webhook')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['failure_rate'] <= 1:
+            raise CommandError('--failure-rate debe estar entre 0 y 1')
+
+        servidor = FakeStripeGateway(
+            (options['host'], options['port']),
+            latencia_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            tasa_fallos=options['failure_rate'],
+            webhook_url=options['webhook_url'] or None,
+            webhook_secret=options['webhook_secret'],
+            webhook_delay_ms=options['webhook_delay_ms'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'💳 Pasarela local escuchando en {servidor.url}'))
+        self.stdout.write(f"  • Webhooks → {options['webhook_url'] or '(desactivados)'}")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+            self.stdout.write(f'\n📊 Estadísticas: {servidor.estadisticas}')
@@ -0,0 +1,14 @@
+"""
+Comando para liberar las facturas de sesiones de checkout vencidas
+Pensado para ejecutarse cada minuto (cron)
+"""
+from django.core.management.base import BaseCommand
+from apps.payments.services import checkout_service
+
+
+class Command(BaseCommand):
+    help = 'Expira las sesiones de checkout vencidas y libera sus facturas reservadas'
+
+    def handle(self, *args, **options):
+        liberadas = checkout_service.liberar_expiradas()
+        self.stdout.write(self.style.SUCCESS(f'✅ Sesiones de checkout expiradas: {liberadas}'))
@@ -0,0 +1,249 @@
+"""
+Prueba de carga del flujo de pago con Stripe de extremo a extremo
+Crea pagos por la API (PagoViewSet.create), los confirma en la pasarela y
+espera el webhook que los marca como confirmados. Reporta rendimiento y
+latencias p50/p95/p99.
+
+Requiere el servidor de la API y `manage.py fake_stripe` en ejecución, con
+STRIPE_API_BASE apuntando a la pasarela y STRIPE_WEBHOOK_SECRET igual al
+--webhook-secret de la pasarela (o STRIPE_WEBHOOK_ALLOW_UNSIGNED=True si se
+prueban webhooks sin firmar).
+"""
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from decimal import Decimal
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.payments.models import ConceptoPago, MetodoPago, Factura, Pago
+from apps.residences.models import Vivienda
+
+User = get_user_model()
+
+PREFIJO = 'LOADTEST'
+MONTO = Decimal('85000.00')
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (valores en segundos)"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga: creación de pagos por API + confirmación por webhook de la pasarela'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='URL del servidor de la API')
+        parser.add_argument('--gateway-url', default='http://127.0.0.1:12111', help='URL de la pasarela local')
+        parser.add_argument('--requests', type=int, default=500, help='Número de pagos a crear')
+        parser.add_argument('--concurrency', type=int, default=50, help='Peticiones simultáneas')
+        parser.add_argument(
+            '--viviendas', type=int, default=None,
+            help='Viviendas sobre las que repartir los pagos (default: una por pago; no puede ser menor que --requests)'
+        )
+        parser.add_argument('--timeout', type=float, default=60, help='Segundos de espera por los webhooks')
+        parser.add_argument('--keep', action='store_true', help='Conservar los datos creados')
+
+    def handle(self, *args, **options):
+        self.base_url = options['base_url'].rstrip('/')
+        self.gateway_url = options['gateway_url'].rstrip('/')
+        # Factura es única por (vivienda, concepto, periodo): cada factura necesita su vivienda
+        options['viviendas'] = options['viviendas'] or options['requests']
+        if options['viviendas'] < options['requests']:
+            raise CommandError('--viviendas no puede ser menor que --requests (una factura por vivienda y período)')
+
+        try:
+            urlopen(f'{self.gateway_url}/health', timeout=5).read()
+        except (URLError, OSError) as e:
+            raise CommandError(f'Pasarela no disponible en {self.gateway_url}: {e}')
+
+        datos = self._preparar(options)
+        try:
+            self._ejecutar(datos, options)
+        finally:
+            if not options['keep']:
+                self._limpiar(datos)
+
+    # ------------------------------------------------------------------
+    # Datos
+    # ------------------------------------------------------------------
+
+    def _preparar(self, options):
+        usuario, _ = User.objects.get_or_create(
+            email=f'{PREFIJO.lower()}@backresidences.local',
+            defaults={
+                'username': f'{PREFIJO.lower()}-pagos',
+                'documento_numero': f'{PREFIJO}-000001',
+                'is_staff': True,
+            }
+        )
+        metodo, _ = MetodoPago.objects.get_or_create(
+            codigo='stripe',
+            defaults={'nombre': 'Stripe', 'descripcion': 'Pago en línea con Stripe'}
+        )
+        concepto = ConceptoPago.objects.create(
+            nombre=f'{PREFIJO} {timezone.now():%Y%m%d%H%M%S}',
+            descripcion='Concepto de prueba de carga',
+            valor_base=MONTO,
+            activo=False,
+        )
+        sello = f'{timezone.now():%H%M%S}'
+        viviendas = Vivienda.objects.bulk_create([
+            Vivienda(
+                identificador=f'{PREFIJO[:4]}-{sello}-{i:04d}',
+                bloque='LT',
+                tipo='apartamento',
+                metros_cuadrados=Decimal('60.00'),
+                cuota_administracion=MONTO,
+            )
+            for i in range(options['viviendas'])
+        ])
+        vencimiento = timezone.now() + timedelta(days=15)
+        facturas = Factura.objects.bulk_create([
+            Factura(
+                numero_factura=f'{PREFIJO}-{sello}-{i:07d}',
+                vivienda=viviendas[i % len(viviendas)],
+                concepto=concepto,
+                periodo=f'{timezone.now():%Y-%m}',
+                fecha_vencimiento=vencimiento,
+                monto_original=MONTO,
+                monto_total=MONTO,
+                saldo_pendiente=MONTO,
+                estado='pendiente',
+            )
+            for i in range(options['requests'])
+        ], batch_size=1000)
+
+        return {
+            'token': str(RefreshToken.for_user(usuario).access_token),
+            'metodo_id': metodo.pk,
+            'concepto': concepto,
+            'viviendas': viviendas,
+            'facturas': facturas,
+        }
+
+    def _limpiar(self, datos):
+        # Pagos y facturas se eliminan en cascada con las viviendas
+        Vivienda.objects.filter(pk__in=[v.pk for v in datos['viviendas']]).delete()
+        datos['concepto'].delete()
+        self.stdout.write(self.style.WARNING('\n↺ Datos de prueba eliminados'))
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+
+    def _post(self, url, cuerpo, cabeceras):
+        peticion = Request(url, data=json.dumps(cuerpo).encode(), method='POST', headers={
+            'Content-Type': 'application/json', **cabeceras
+        })
+        with urlopen(peticion, timeout=60) as respuesta:
+            return json.loads(respuesta.read() or b'{}')
+
+    def _pagar(self, datos, factura):
+        """Crear el pago por la API y confirmarlo en la pasarela"""
+        resultado = {'factura': factura.pk}
+        inicio = time.perf_counter()
+        try:
+            respuesta = self._post(f'{self.base_url}/api/v1/payments/pagos/', {
+                'vivienda': factura.vivienda_id,
+                'monto_total': str(MONTO),
+                'metodo_pago': datos['metodo_id'],
+                'facturas': [factura.pk],
+                'fecha_pago': timezone.now().isoformat(),
+            }, {'Authorization': f"Bearer {datos['token']}"})
+        except HTTPError as e:
+            resultado['error'] = f'api_{e.code}'
+            return resultado
+        except (URLError, OSError):
+            resultado['error'] = 'api_conexion'
+            return resultado
+        resultado['crear'] = time.perf_counter() - inicio
+
+        intent_id = respuesta.get('data', {}).get('stripe_data', {}).get('stripe_payment_intent_id')
+        if not intent_id:
+            resultado['error'] = 'sin_payment_intent'
+            return resultado
+        resultado['intent'] = intent_id
+
+        inicio = time.perf_counter()
+        try:
+            self._post(f'{self.gateway_url}/v1/payment_intents/{intent_id}/confirm', {}, {})
+        except HTTPError as e:
+            resultado['error'] = f'pasarela_{e.code}'
+            return resultado
+        except (URLError, OSError):
+            resultado['error'] = 'pasarela_conexion'
+            return resultado
+        resultado['confirmar'] = time.perf_counter() - inicio
+        resultado['confirmado_en'] = time.time()
+        return resultado
+
+    def _ejecutar(self, datos, options):
+        total = len(datos['facturas'])
+        self.stdout.write(
+            f"Enviando {total} pagos con concurrencia {options['concurrency']} a {self.base_url}..."
+        )
+
+        resultados = []
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            futuros = [pool.submit(self._pagar, datos, factura) for factura in datos['facturas']]
+            for futuro in as_completed(futuros):
+                resultados.append(futuro.result())
+        duracion = time.perf_counter() - inicio
+
+        # Esperar los webhooks: una consulta por ronda sobre los pendientes
+        confirmaciones = {r['intent']: r['confirmado_en'] for r in resultados if 'confirmado_en' in r}
+        latencias_webhook = []
+        limite = time.monotonic() + options['timeout']
+        while confirmaciones and time.monotonic() < limite:
+            for referencia, fecha in Pago.objects.filter(
+                numero_referencia__in=list(confirmaciones), estado='confirmado'
+            ).values_list('numero_referencia', 'fecha_confirmacion'):
+                latencias_webhook.append(max(0.0, fecha.timestamp() - confirmaciones.pop(referencia)))
+            if confirmaciones:
+                time.sleep(0.2)
+
+        self._reportar(resultados, duracion, latencias_webhook, len(confirmaciones))
+
+    def _reportar(self, resultados, duracion, latencias_webhook, sin_webhook):
+        crear = [r['crear'] for r in resultados if 'crear' in r]
+        confirmar = [r['confirmar'] for r in resultados if 'confirmar' in r]
+        errores = {}
+        for r in resultados:
+            if 'error' in r:
+                errores[r['error']] = errores.get(r['error'], 0) + 1
+
+        def _linea(nombre, valores):
+            if not valores:
+                return f'  • {nombre}: sin datos'
+            p50, p95, p99 = (percentil(valores, p) * 1000 for p in (50, 95, 99))
+            return f'  • {nombre}: p50 {p50:.1f} ms | p95 {p95:.1f} ms | p99 {p99:.1f} ms'
+
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write('📊 RESULTADOS DE CARGA:')
+        self.stdout.write(f'  • Pagos creados: {len(crear)}/{len(resultados)} en {duracion:.2f}s')
+        self.stdout.write(f'  • Rendimiento: {len(crear) / duracion if duracion else 0:.1f} pagos/s')
+        self.stdout.write(_linea('PagoViewSet.create', crear))
+        self.stdout.write(_linea('Confirmación en pasarela', confirmar))
+        self.stdout.write(_linea('Webhook → pago confirmado', latencias_webhook))
+
+        if errores:
+            self.stdout.write(self.style.ERROR(f'  • Errores: {errores}'))
+        if sin_webhook:
+            self.stdout.write(self.style.ERROR(f'  • Pagos sin confirmar por webhook: {sin_webhook}'))
+
+        if not errores and not sin_webhook:
+            self.stdout.write(self.style.SUCCESS('\n✅ Flujo de pago completo sin errores'))
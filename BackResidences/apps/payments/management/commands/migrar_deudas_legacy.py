@@ -0,0 +1,186 @@
+"""
+Comando para trasladar deudas legacy al modelo de facturas
+Los DetalleDeuda de cada concepto se convierten en una Factura del mismo
+período y vivienda; los endpoints legacy leen luego esas facturas agrupadas
+"""
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.payments.models import (
+    ConceptoPago, MetodoPago, Factura, TipoPago, Deuda
+)
+from apps.payments.services import concepto_service
+
+CONCEPTO_SIN_DETALLE = 'Deuda legacy'
+# Los conceptos migrados llevan su propio espacio de nombres para no
+# reutilizar un ConceptoPago vigente con el mismo nombre
+PREFIJO_CONCEPTO = 'Legacy: '
+
+ESTADOS = {
+    'pendiente': 'pendiente',
+    'parcial': 'parcialmente_pagada',
+    'pagada': 'pagada',
+    'vencida': 'vencida',
+}
+
+
+class Command(BaseCommand):
+    help = 'Convierte Deuda/DetalleDeuda en facturas y TipoPago en métodos de pago'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Deudas leídas y facturas insertadas por lote (default: 2000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Calcular sin escribir en la base de datos'
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self._conceptos = {}
+
+        with transaction.atomic():
+            metodos = self._migrar_tipos_pago()
+            deudas, facturas = self._migrar_deudas()
+            if self.dry_run:
+                transaction.set_rollback(True)
+            elif facturas:
+                concepto_service.invalidar_resumen()
+
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write('📊 RESUMEN DE MIGRACIÓN LEGACY:')
+        self.stdout.write(f'  • Métodos de pago creados: {metodos}')
+        self.stdout.write(f'  • Deudas procesadas: {deudas}')
+        self.stdout.write(f'  • Facturas generadas: {facturas}')
+        if self.omitidas:
+            self.stdout.write(self.style.WARNING(
+                f'  • Facturas omitidas (ya existían para el número, o para vivienda, concepto y período): {self.omitidas}'
+            ))
+
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING('\n⚠️  Modo simulación: no se guardaron cambios'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✅ Migración legacy completada'))
+
+    def _migrar_tipos_pago(self):
+        existentes = set(MetodoPago.objects.values_list('nombre', flat=True))
+        nuevos = [
+            MetodoPago(
+                nombre=tipo.nombre,
+                codigo=f'legacy_{tipo.pk}',
+                descripcion=tipo.descripcion,
+                requiere_comprobante=tipo.requiere_comprobante,
+                activo=tipo.activo,
+            )
+            for tipo in TipoPago.objects.all()
+            if tipo.nombre not in existentes
+        ]
+        MetodoPago.objects.bulk_create(nuevos, ignore_conflicts=True)
+        return len(nuevos)
+
+    @staticmethod
+    def _nombre_concepto(nombre):
+        return f'{PREFIJO_CONCEPTO}{nombre}'[:100]
+
+    def _concepto(self, nombre, interes_mora):
+        """ConceptoPago inactivo (nombre ya con PREFIJO_CONCEPTO) para que el programador de facturación lo ignore"""
+        concepto = self._conceptos.get(nombre)
+        if concepto is None:
+            concepto, _ = ConceptoPago.objects.get_or_create(
+                nombre=nombre,
+                defaults={
+                    'descripcion': 'Concepto migrado desde deudas legacy',
+                    'tipo': 'variable',
+                    'valor_base': Decimal('0.01'),
+                    'frecuencia': 'unica',
+                    'aplica_a_todos': False,
+                    'porcentaje_interes_mora': interes_mora,
+                    'activo': False,
+                }
+            )
+            self._conceptos[nombre] = concepto
+        return concepto
+
+    @staticmethod
+    def _fecha(fecha):
+        return timezone.make_aware(datetime.combine(fecha, time.min))
+
+    def _facturas_de(self, deuda):
+        periodo = f'{deuda.periodo_ano:04d}-{deuda.periodo_mes:02d}'
+        detalles = list(deuda.detalles.all())
+        if detalles:
+            # Factura es única por (vivienda, concepto, periodo): los detalles
+            # del mismo concepto se suman en una sola partida
+            agrupadas = {}
+            for d in detalles:
+                nombre = self._nombre_concepto(d.concepto)
+                monto, textos = agrupadas.get(nombre, (Decimal('0.00'), []))
+                if d.detalle:
+                    textos.append(d.detalle)
+                agrupadas[nombre] = (monto + d.monto, textos)
+            partidas = [(nombre, monto, '; '.join(textos)) for nombre, (monto, textos) in agrupadas.items()]
+        else:
+            partidas = [(self._nombre_concepto(CONCEPTO_SIN_DETALLE), deuda.monto_total, '')]
+
+        estado = ESTADOS.get(deuda.estado, 'pendiente')
+        facturas = []
+        for indice, (concepto, monto, detalle) in enumerate(partidas):
+            # El descuento legacy es por deuda: se aplica a la primera partida
+            descuento = min(deuda.descuento, monto) if indice == 0 else Decimal('0.00')
+            total = monto - descuento
+            sufijo = f'-{indice}' if indice else ''
+            facturas.append(Factura(
+                numero_factura=f'LEG-{deuda.numero_factura}{sufijo}'[:50],
+                vivienda_id=deuda.vivienda_id,
+                concepto=self._concepto(concepto, deuda.interes_mora),
+                periodo=periodo,
+                fecha_generacion=self._fecha(deuda.fecha_emision),
+                fecha_vencimiento=self._fecha(deuda.fecha_vencimiento),
+                monto_original=monto,
+                descuentos=descuento,
+                monto_total=total,
+                saldo_pendiente=Decimal('0.00') if estado == 'pagada' else total,
+                estado=estado,
+                observaciones=detalle or deuda.observaciones,
+                activo=deuda.activo,
+            ))
+        return facturas
+
+    def _migrar_deudas(self):
+        deudas = Deuda.objects.prefetch_related('detalles').order_by('pk')
+        procesadas = generadas = 0
+        self.omitidas = 0
+        lote = []
+
+        for deuda in deudas.iterator(chunk_size=self.batch_size):
+            lote.extend(self._facturas_de(deuda))
+            procesadas += 1
+            if len(lote) >= self.batch_size:
+                generadas += self._insertar(lote)
+                lote = []
+        if lote:
+            generadas += self._insertar(lote)
+
+        return procesadas, generadas
+
+    def _insertar(self, lote):
+        # ignore_conflicts hace el comando re-ejecutable (numero_factura es único).
+        # Con ignore_conflicts no se devuelven los ids, así que las insertadas se
+        # cuentan por número de factura antes y después
+        numeros = Factura.objects.filter(numero_factura__in=[f.numero_factura for f in lote])
+        antes = numeros.count()
+        Factura.objects.bulk_create(lote, ignore_conflicts=True)
+        insertadas = numeros.count() - antes
+        self.omitidas += len(lote) - insertadas
+        self.stdout.write(f'  ✓ Lote de {len(lote)} facturas ({insertadas} insertadas)')
+        return insertadas
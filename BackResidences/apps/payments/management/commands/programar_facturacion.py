@@ -0,0 +1,69 @@
+"""
+Comando para la facturación recurrente según la frecuencia de cada concepto
+Diseñado para ejecutarse cada hora (cron); solo factura los períodos nuevos
+"""
+from django.core.management.base import BaseCommand
+from apps.payments.services import billing_scheduler
+
+
+class Command(BaseCommand):
+    help = 'Encola y ejecuta las corridas de facturación recurrente pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hasta',
+            help='Último período a facturar (YYYY-MM). Por defecto el mes actual'
+        )
+        parser.add_argument(
+            '--desde',
+            help='Primer período (YYYY-MM) a facturar para conceptos sin corridas. '
+                 'Sin él no se facturan meses pasados'
+        )
+        parser.add_argument(
+            '--limite',
+            type=int,
+            help='Máximo de corridas a ejecutar en esta invocación'
+        )
+        parser.add_argument(
+            '--solo-encolar',
+            action='store_true',
+            help='Encolar las corridas sin ejecutarlas'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar las corridas que se encolarían sin guardar cambios'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING('🔍 MODO SIMULACIÓN - No se guardarán cambios')
+            )
+
+        nuevas = billing_scheduler.encolar(
+            hasta=options['hasta'], dry_run=dry_run, desde=options['desde']
+        )
+        self.stdout.write(f'Corridas nuevas encoladas: {len(nuevas)}')
+        for corrida in nuevas:
+            self.stdout.write(f'  • {corrida.concepto.nombre} → {corrida.periodo}')
+
+        if dry_run or options['solo_encolar']:
+            return
+
+        procesadas = billing_scheduler.procesar(limite=options['limite'])
+
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write('📊 RESUMEN DE FACTURACIÓN RECURRENTE:')
+        for corrida in procesadas:
+            estilo = self.style.SUCCESS if corrida.estado == 'completada' else self.style.ERROR
+            self.stdout.write(estilo(
+                f'  • {corrida.concepto.nombre} {corrida.periodo}: '
+                f'{corrida.estado}, {corrida.facturas_creadas} facturas'
+            ))
+        self.stdout.write(f'  • Corridas ejecutadas: {len(procesadas)}')
+        self.stdout.write(
+            self.style.SUCCESS('\n✅ Facturación recurrente completada')
+        )
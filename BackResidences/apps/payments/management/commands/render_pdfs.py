@@ -0,0 +1,55 @@
+"""
+Comando para renderizar en lote los PDFs de facturas y paz y salvos
+Pensado para ejecutarse al cierre de cada corrida de facturación
+"""
+from django.core.management.base import BaseCommand
+from apps.payments.config import FILE_CONFIG
+from apps.payments.documents import document_service
+from apps.payments.models import Factura, PazYSalvo
+
+
+class Command(BaseCommand):
+    help = 'Renderiza en paralelo los PDFs de facturas y paz y salvos (con caché por contenido)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--periodo',
+            help='Período de facturas a renderizar (YYYY-MM). Por defecto todas las activas'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=FILE_CONFIG['pdf_render_workers'],
+            help='Número de procesos del pool (default: número de CPUs)'
+        )
+        parser.add_argument(
+            '--solo-facturas',
+            action='store_true',
+            help='No renderizar paz y salvos'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+
+        facturas = Factura.objects.filter(activo=True).exclude(estado='anulada')
+        if options['periodo']:
+            facturas = facturas.filter(periodo=options['periodo'])
+
+        self.stdout.write('Renderizando facturas...')
+        resultado = document_service.render_facturas(facturas, workers=workers)
+        self.stdout.write(
+            f"  • Facturas renderizadas: {resultado['renderizados']}, "
+            f"reutilizadas de caché: {resultado['reutilizados']}"
+        )
+
+        if not options['solo_facturas']:
+            self.stdout.write('Renderizando paz y salvos...')
+            resultado = document_service.render_paz_y_salvos(
+                PazYSalvo.objects.filter(activo=True), workers=workers
+            )
+            self.stdout.write(
+                f"  • Paz y salvos renderizados: {resultado['renderizados']}, "
+                f"reutilizados de caché: {resultado['reutilizados']}"
+            )
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Renderizado de documentos completado'))
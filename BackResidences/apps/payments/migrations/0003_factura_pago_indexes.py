@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_conceptopago_metodopago_alter_pago_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['vivienda', 'estado'], name='factura_vivienda_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['periodo', 'concepto'], name='factura_periodo_concepto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['fecha_vencimiento', 'estado'], name='factura_venc_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(condition=models.Q(('estado__in', ['pendiente', 'parcialmente_pagada'])), fields=['fecha_vencimiento', 'vivienda'], name='factura_por_cobrar_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(condition=models.Q(('saldo_pendiente__gt', 0)), fields=['vivienda'], name='factura_saldo_pendiente_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['vivienda', 'estado', 'fecha_pago'], name='pago_vivienda_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(condition=models.Q(('estado', 'confirmado')), fields=['fecha_pago', 'metodo_pago'], name='pago_fecha_metodo_idx'),
+        ),
+    ]
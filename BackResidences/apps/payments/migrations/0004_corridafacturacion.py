@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_factura_pago_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorridaFacturacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('periodo', models.CharField(max_length=7, verbose_name='Periodo (YYYY-MM)')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completada', 'Completada'), ('fallida', 'Fallida')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('facturas_creadas', models.PositiveIntegerField(default=0, verbose_name='Facturas creadas')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Inicio de ejecución')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin de ejecución')),
+                ('intentos', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('error', models.TextField(blank=True, verbose_name='Último error')),
+                ('concepto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='corridas', to='payments.conceptopago', verbose_name='Concepto')),
+            ],
+            options={
+                'verbose_name': 'Corrida de Facturación',
+                'verbose_name_plural': 'Corridas de Facturación',
+                'ordering': ['periodo', 'concepto'],
+                'unique_together': {('concepto', 'periodo')},
+                'indexes': [models.Index(fields=['estado', 'periodo'], name='corrida_estado_periodo_idx')],
+            },
+        ),
+    ]
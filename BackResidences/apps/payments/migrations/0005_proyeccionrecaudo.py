@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_corridafacturacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProyeccionRecaudo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('bloque', models.CharField(blank=True, max_length=10, verbose_name='Bloque')),
+                ('periodo', models.CharField(max_length=7, verbose_name='Periodo proyectado (YYYY-MM)')),
+                ('metodo', models.CharField(choices=[('regresion', 'Regresión lineal'), ('promedio_movil', 'Promedio móvil')], max_length=20, verbose_name='Método')),
+                ('tasa_recaudo', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='Tasa de recaudo proyectada (%)')),
+                ('facturado_proyectado', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Facturado proyectado')),
+                ('recaudo_proyectado', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Recaudo proyectado')),
+                ('tasa_ultimo_periodo', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Tasa del último período (%)')),
+                ('periodos_historicos', models.PositiveIntegerField(verbose_name='Períodos históricos usados')),
+                ('calculado_en', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Calculado en')),
+                ('concepto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proyecciones', to='payments.conceptopago', verbose_name='Concepto')),
+            ],
+            options={
+                'verbose_name': 'Proyección de Recaudo',
+                'verbose_name_plural': 'Proyecciones de Recaudo',
+                'ordering': ['periodo', 'concepto', 'bloque'],
+                'unique_together': {('concepto', 'bloque', 'periodo')},
+                'indexes': [models.Index(fields=['periodo', 'bloque'], name='proyeccion_periodo_idx')],
+            },
+        ),
+    ]
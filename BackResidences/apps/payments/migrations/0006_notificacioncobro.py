@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payments', '0005_proyeccionrecaudo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionCobro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('destino', models.CharField(max_length=254, verbose_name='Destino')),
+                ('canal', models.CharField(max_length=50, verbose_name='Canal')),
+                ('huella', models.CharField(max_length=64, verbose_name='Huella del contenido')),
+                ('facturas', models.PositiveIntegerField(verbose_name='Facturas incluidas')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Total adeudado')),
+                ('enviado_en', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Enviado en')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones_cobro', to=settings.AUTH_USER_MODEL, verbose_name='Destinatario')),
+            ],
+            options={
+                'verbose_name': 'Notificación de Cobro',
+                'verbose_name_plural': 'Notificaciones de Cobro',
+                'ordering': ['-enviado_en'],
+                'indexes': [models.Index(fields=['usuario', 'enviado_en'], name='notif_cobro_usuario_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('residences', '0001_initial'),
+        ('payments', '0006_notificacioncobro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SesionCheckout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('estado', models.CharField(choices=[('activa', 'Activa'), ('completada', 'Completada'), ('expirada', 'Expirada'), ('cancelada', 'Cancelada')], default='activa', max_length=20, verbose_name='Estado')),
+                ('monto_total', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Monto total')),
+                ('moneda', models.CharField(default='COP', max_length=3, verbose_name='Moneda')),
+                ('payment_intent_id', models.CharField(blank=True, max_length=255, null=True, unique=True, verbose_name='PaymentIntent')),
+                ('expira_en', models.DateTimeField(verbose_name='Expira en')),
+                ('pago', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sesion_checkout', to='payments.pago', verbose_name='Pago generado')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sesiones_checkout', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+                ('vivienda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='residences.vivienda', verbose_name='Vivienda')),
+            ],
+            options={
+                'verbose_name': 'Sesión de Checkout',
+                'verbose_name_plural': 'Sesiones de Checkout',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('estado', 'activa')), fields=['expira_en'], name='checkout_activa_expira_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SesionCheckoutFactura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Saldo reservado')),
+                ('factura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_checkout', to='payments.factura', verbose_name='Factura')),
+                ('sesion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='payments.sesioncheckout', verbose_name='Sesión')),
+            ],
+            options={
+                'verbose_name': 'Factura en Checkout',
+                'verbose_name_plural': 'Facturas en Checkout',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('activo', True)), fields=('factura',), name='checkout_factura_activa_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:10
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('residences', '0001_initial'),
+        ('payments', '0007_sesioncheckout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierrePeriodo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('periodo', models.CharField(max_length=7, unique=True, verbose_name='Período (YYYY-MM)')),
+                ('cerrado_en', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Cerrado en')),
+                ('viviendas', models.PositiveIntegerField(default=0, verbose_name='Viviendas con snapshot')),
+                ('resumen', models.BinaryField(blank=True, null=True, verbose_name='Resumen del período (JSON comprimido)')),
+                ('resumen_version', models.CharField(blank=True, max_length=32, verbose_name='Versión del resumen')),
+                ('cerrado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cierres_periodo', to=settings.AUTH_USER_MODEL, verbose_name='Cerrado por')),
+            ],
+            options={
+                'verbose_name': 'Cierre de Período',
+                'verbose_name_plural': 'Cierres de Período',
+                'ordering': ['-periodo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EstadoCuentaSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('periodo', models.CharField(max_length=7, verbose_name='Período (YYYY-MM)')),
+                ('datos', models.BinaryField(verbose_name='Facturas y pagos (JSON comprimido)')),
+                ('version', models.CharField(max_length=32, verbose_name='Versión de los datos de origen')),
+                ('facturas', models.PositiveIntegerField(default=0, verbose_name='Facturas')),
+                ('pagos', models.PositiveIntegerField(default=0, verbose_name='Pagos')),
+                ('facturado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Facturado')),
+                ('pagado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Pagado')),
+                ('saldo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Saldo pendiente')),
+                ('cierre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='payments.cierreperiodo', verbose_name='Cierre')),
+                ('vivienda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estados_cuenta', to='residences.vivienda', verbose_name='Vivienda')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Estado de Cuenta',
+                'verbose_name_plural': 'Snapshots de Estado de Cuenta',
+                'ordering': ['vivienda', 'periodo'],
+                'unique_together': {('vivienda', 'periodo')},
+            },
+        ),
+    ]
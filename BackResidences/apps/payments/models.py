@@ -1,5 +1,6 @@
 from decimal import Decimal
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import datetime, timedelta
@@ -7,12 +8,33 @@ from typing import TYPE_CHECKING
 from apps.core.models import BaseModel
 from apps.authentication.models import User
 from apps.residences.models import Vivienda
+from .money import interes_mora
 
 # Evitar imports circulares
 if TYPE_CHECKING:
     from django.db.models import QuerySet
 
 
+class ConceptoPagoQuerySet(models.QuerySet):
+    """QuerySet de conceptos con estadísticas de facturación anotadas"""
+
+    def with_stats(self):
+        """
+        Anotar facturas generadas y total recaudado en la misma consulta
+
+        Las propiedades total_facturas_generadas y total_recaudado usan estas
+        anotaciones cuando existen en lugar de consultar por cada concepto.
+        """
+        return self.annotate(
+            num_facturas=models.Count('facturas'),
+            monto_recaudado=Coalesce(
+                models.Sum('facturas__monto_total', filter=models.Q(facturas__estado='pagada')),
+                models.Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2)
+            ),
+        )
+
+
 class ConceptoPago(BaseModel):
     """Conceptos de pago disponibles en el condominio"""
     
@@ -68,17 +90,23 @@ class ConceptoPago(BaseModel):
         verbose_name="Porcentaje interés mora"
     )
 
+    objects = ConceptoPagoQuerySet.as_manager()
+
     def __str__(self):
         return self.nombre
 
     @property
     def total_facturas_generadas(self):
         """Total de facturas generadas para este concepto"""
+        if hasattr(self, 'num_facturas'):
+            return self.num_facturas
         return self.facturas.count()
         
     @property
     def total_recaudado(self):
         """Total recaudado para este concepto"""
+        if hasattr(self, 'monto_recaudado'):
+            return self.monto_recaudado
         return self.facturas.filter(estado='pagada').aggregate(
             total=models.Sum('monto_total')
         )['total'] or Decimal('0.00')
@@ -186,9 +214,9 @@ class Factura(BaseModel):
         if self.fecha_vencimiento < timezone.now() and self.saldo_pendiente > 0:
             dias_vencido = (timezone.now() - self.fecha_vencimiento).days
             if dias_vencido > 0:
-                interes_diario = self.concepto.porcentaje_interes_mora / Decimal('30')  # Por día
-                interes = self.monto_original * (interes_diario / Decimal('100')) * dias_vencido
-                self.intereses = interes
+                self.intereses = interes_mora(
+                    self.monto_original, self.concepto.porcentaje_interes_mora, dias_vencido
+                ).decimal
                 self.save()
                 
     @property
@@ -214,6 +242,25 @@ class Factura(BaseModel):
         verbose_name_plural = "Facturas"
         ordering = ['-fecha_generacion']
         unique_together = ['vivienda', 'concepto', 'periodo']
+        indexes = [
+            # Estado de cuenta y facturas pendientes por vivienda
+            models.Index(fields=['vivienda', 'estado'], name='factura_vivienda_estado_idx'),
+            # Dashboard y reportes por período
+            models.Index(fields=['periodo', 'concepto'], name='factura_periodo_concepto_idx'),
+            # Vencimientos (calculate_interest, morosidad)
+            models.Index(fields=['fecha_vencimiento', 'estado'], name='factura_venc_estado_idx'),
+            # Parcial: solo facturas con saldo por cobrar
+            models.Index(
+                fields=['fecha_vencimiento', 'vivienda'],
+                name='factura_por_cobrar_idx',
+                condition=models.Q(estado__in=['pendiente', 'parcialmente_pagada']),
+            ),
+            models.Index(
+                fields=['vivienda'],
+                name='factura_saldo_pendiente_idx',
+                condition=models.Q(saldo_pendiente__gt=0),
+            ),
+        ]
 
 
 class Pago(BaseModel):
@@ -286,6 +333,13 @@ class Pago(BaseModel):
         verbose_name = "Pago"
         verbose_name_plural = "Pagos"
         ordering = ['-fecha_registro']
+        indexes = [
+            # Último pago y total pagado por vivienda
+            models.Index(fields=['vivienda', 'estado', 'fecha_pago'], name='pago_vivienda_estado_idx'),
+            # Recaudo del período y por método de pago
+            models.Index(fields=['fecha_pago', 'metodo_pago'], name='pago_fecha_metodo_idx',
+                         condition=models.Q(estado='confirmado')),
+        ]
 
 
 class PagoFactura(BaseModel):
@@ -363,6 +417,277 @@ class PazYSalvo(BaseModel):
         ordering = ['-fecha_generacion']
 
 
+class SesionCheckout(BaseModel):
+    """Sesión de pago en línea que reserva un conjunto de facturas por tiempo limitado"""
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='sesiones_checkout',
+        verbose_name="Usuario"
+    )
+    vivienda = models.ForeignKey(Vivienda, on_delete=models.CASCADE, verbose_name="Vivienda")
+    estado = models.CharField(
+        max_length=20,
+        choices=[
+            ('activa', 'Activa'),
+            ('completada', 'Completada'),
+            ('expirada', 'Expirada'),
+            ('cancelada', 'Cancelada'),
+        ],
+        default='activa',
+        verbose_name="Estado"
+    )
+    monto_total = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Monto total")
+    moneda = models.CharField(max_length=3, default='COP', verbose_name="Moneda")
+    payment_intent_id = models.CharField(
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name="PaymentIntent"
+    )
+    expira_en = models.DateTimeField(verbose_name="Expira en")
+    pago = models.OneToOneField(
+        Pago,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='sesion_checkout',
+        verbose_name="Pago generado"
+    )
+
+    @property
+    def vigente(self):
+        return self.estado == 'activa' and self.expira_en > timezone.now()
+
+    def __str__(self):
+        return f"Checkout {self.pk} - {self.vivienda.identificador} ({self.estado})"
+
+    class Meta:  # type: ignore
+        verbose_name = "Sesión de Checkout"
+        verbose_name_plural = "Sesiones de Checkout"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['expira_en'],
+                name='checkout_activa_expira_idx',
+                condition=models.Q(estado='activa')
+            ),
+        ]
+
+
+class SesionCheckoutFactura(BaseModel):
+    """Factura reservada por una sesión de checkout; activo mientras dure la reserva"""
+    sesion = models.ForeignKey(
+        SesionCheckout,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name="Sesión"
+    )
+    factura = models.ForeignKey(
+        Factura,
+        on_delete=models.CASCADE,
+        related_name='reservas_checkout',
+        verbose_name="Factura"
+    )
+    monto = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Saldo reservado")
+
+    def __str__(self):
+        return f"{self.factura.numero_factura} en checkout {self.sesion_id}"
+
+    class Meta:  # type: ignore
+        verbose_name = "Factura en Checkout"
+        verbose_name_plural = "Facturas en Checkout"
+        constraints = [
+            # Una factura solo puede estar reservada por una sesión a la vez
+            models.UniqueConstraint(
+                fields=['factura'],
+                condition=models.Q(activo=True),
+                name='checkout_factura_activa_uniq'
+            ),
+        ]
+
+
+class CorridaFacturacion(BaseModel):
+    """Corridas de facturación recurrente por concepto y período"""
+    concepto = models.ForeignKey(
+        ConceptoPago,
+        on_delete=models.CASCADE,
+        related_name='corridas',
+        verbose_name="Concepto"
+    )
+    periodo = models.CharField(max_length=7, verbose_name="Periodo (YYYY-MM)")
+    estado = models.CharField(
+        max_length=20,
+        choices=[
+            ('pendiente', 'Pendiente'),
+            ('en_proceso', 'En proceso'),
+            ('completada', 'Completada'),
+            ('fallida', 'Fallida'),
+        ],
+        default='pendiente',
+        verbose_name="Estado"
+    )
+    facturas_creadas = models.PositiveIntegerField(default=0, verbose_name="Facturas creadas")
+    fecha_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Inicio de ejecución")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fin de ejecución")
+    intentos = models.PositiveIntegerField(default=0, verbose_name="Intentos")
+    error = models.TextField(blank=True, verbose_name="Último error")
+
+    def __str__(self):
+        return f"Corrida {self.concepto.nombre} {self.periodo} ({self.estado})"
+
+    class Meta:  # type: ignore
+        verbose_name = "Corrida de Facturación"
+        verbose_name_plural = "Corridas de Facturación"
+        ordering = ['periodo', 'concepto']
+        unique_together = ['concepto', 'periodo']
+        indexes = [
+            models.Index(fields=['estado', 'periodo'], name='corrida_estado_periodo_idx'),
+        ]
+
+
+class ProyeccionRecaudo(BaseModel):
+    """Proyección precalculada de la tasa de recaudo por concepto, bloque y período"""
+    concepto = models.ForeignKey(
+        ConceptoPago,
+        on_delete=models.CASCADE,
+        related_name='proyecciones',
+        verbose_name="Concepto"
+    )
+    bloque = models.CharField(max_length=10, blank=True, verbose_name="Bloque")
+    periodo = models.CharField(max_length=7, verbose_name="Periodo proyectado (YYYY-MM)")
+    metodo = models.CharField(
+        max_length=20,
+        choices=[
+            ('regresion', 'Regresión lineal'),
+            ('promedio_movil', 'Promedio móvil'),
+        ],
+        verbose_name="Método"
+    )
+    tasa_recaudo = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        verbose_name="Tasa de recaudo proyectada (%)"
+    )
+    facturado_proyectado = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        verbose_name="Facturado proyectado"
+    )
+    recaudo_proyectado = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        verbose_name="Recaudo proyectado"
+    )
+    tasa_ultimo_periodo = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Tasa del último período (%)"
+    )
+    periodos_historicos = models.PositiveIntegerField(verbose_name="Períodos históricos usados")
+    calculado_en = models.DateTimeField(default=timezone.now, verbose_name="Calculado en")
+
+    def __str__(self):
+        return f"Proyección {self.concepto.nombre} {self.bloque or '-'} {self.periodo}: {self.tasa_recaudo}%"
+
+    class Meta:  # type: ignore
+        verbose_name = "Proyección de Recaudo"
+        verbose_name_plural = "Proyecciones de Recaudo"
+        ordering = ['periodo', 'concepto', 'bloque']
+        unique_together = ['concepto', 'bloque', 'periodo']
+        indexes = [
+            models.Index(fields=['periodo', 'bloque'], name='proyeccion_periodo_idx'),
+        ]
+
+
+class NotificacionCobro(BaseModel):
+    """Registro de recordatorios de cobro enviados (para deduplicar por destinatario)"""
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notificaciones_cobro',
+        verbose_name="Destinatario"
+    )
+    destino = models.CharField(max_length=254, verbose_name="Destino")
+    canal = models.CharField(max_length=50, verbose_name="Canal")
+    huella = models.CharField(max_length=64, verbose_name="Huella del contenido")
+    facturas = models.PositiveIntegerField(verbose_name="Facturas incluidas")
+    total = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Total adeudado")
+    enviado_en = models.DateTimeField(default=timezone.now, verbose_name="Enviado en")
+
+    def __str__(self):
+        return f"Recordatorio a {self.destino} ({self.enviado_en:%Y-%m-%d})"
+
+    class Meta:  # type: ignore
+        verbose_name = "Notificación de Cobro"
+        verbose_name_plural = "Notificaciones de Cobro"
+        ordering = ['-enviado_en']
+        indexes = [
+            models.Index(fields=['usuario', 'enviado_en'], name='notif_cobro_usuario_idx'),
+        ]
+
+
+class CierrePeriodo(BaseModel):
+    """Cierre de un período de facturación; sus estados de cuenta se sirven desde snapshots"""
+    periodo = models.CharField(max_length=7, unique=True, verbose_name="Período (YYYY-MM)")
+    cerrado_en = models.DateTimeField(default=timezone.now, verbose_name="Cerrado en")
+    cerrado_por = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='cierres_periodo',
+        verbose_name="Cerrado por"
+    )
+    viviendas = models.PositiveIntegerField(default=0, verbose_name="Viviendas con snapshot")
+    resumen = models.BinaryField(null=True, blank=True, verbose_name="Resumen del período (JSON comprimido)")
+    resumen_version = models.CharField(max_length=32, blank=True, verbose_name="Versión del resumen")
+
+    def __str__(self):
+        return f"Cierre {self.periodo}"
+
+    class Meta:  # type: ignore
+        verbose_name = "Cierre de Período"
+        verbose_name_plural = "Cierres de Período"
+        ordering = ['-periodo']
+
+
+class EstadoCuentaSnapshot(BaseModel):
+    """Estado de cuenta congelado de una vivienda en un período cerrado"""
+    cierre = models.ForeignKey(
+        CierrePeriodo,
+        on_delete=models.CASCADE,
+        related_name='snapshots',
+        verbose_name="Cierre"
+    )
+    vivienda = models.ForeignKey(
+        Vivienda,
+        on_delete=models.CASCADE,
+        related_name='estados_cuenta',
+        verbose_name="Vivienda"
+    )
+    periodo = models.CharField(max_length=7, verbose_name="Período (YYYY-MM)")
+    datos = models.BinaryField(verbose_name="Facturas y pagos (JSON comprimido)")
+    version = models.CharField(max_length=32, verbose_name="Versión de los datos de origen")
+    facturas = models.PositiveIntegerField(default=0, verbose_name="Facturas")
+    pagos = models.PositiveIntegerField(default=0, verbose_name="Pagos")
+    facturado = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), verbose_name="Facturado")
+    pagado = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), verbose_name="Pagado")
+    saldo = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), verbose_name="Saldo pendiente")
+
+    def __str__(self):
+        return f"Estado de cuenta {self.vivienda_id} {self.periodo}"
+
+    class Meta:  # type: ignore
+        verbose_name = "Snapshot de Estado de Cuenta"
+        verbose_name_plural = "Snapshots de Estado de Cuenta"
+        ordering = ['vivienda', 'periodo']
+        unique_together = ['vivienda', 'periodo']
+
+
 # Mantener modelos existentes por compatibilidad
 class TipoPago(BaseModel):
     """Tipos de pago disponibles (modelo legacy)"""
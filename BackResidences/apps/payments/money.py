@@ -0,0 +1,200 @@
+"""
+Aritmética monetaria en unidades menores (centavos) con enteros
+Los modelos siguen guardando Decimal; la conversión se hace en los bordes
+y los motores de facturación, intereses y aplicación de pagos operan con int
+
+Regla de redondeo única: mitad hacia arriba, alejándose de cero (ROUND_HALF_UP)
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable, List, Tuple, Union
+
+MONEDA_DEFECTO = 'COP'
+
+# Decimales de la unidad menor por moneda (ISO 4217 / convención de Stripe)
+DECIMALES_MONEDA = {
+    'COP': 2,
+    'USD': 2,
+    'EUR': 2,
+    'JPY': 0,
+}
+
+Numero = Union[int, str, Decimal]
+
+
+def dividir_redondeando(numerador: int, denominador: int) -> int:
+    """División entera con redondeo mitad hacia arriba (alejándose de cero)"""
+    if denominador < 0:
+        numerador, denominador = -numerador, -denominador
+    cociente, resto = divmod(abs(numerador), denominador)
+    if resto * 2 >= denominador:
+        cociente += 1
+    return cociente if numerador >= 0 else -cociente
+
+
+def como_fraccion(valor: Numero) -> Tuple[int, int]:
+    """
+    Representar un número decimal como fracción exacta de enteros
+
+    Se usa una sola vez por factor (no en los lazos): 1.25 -> (125, 100)
+    """
+    signo, digitos, exponente = Decimal(str(valor)).as_tuple()
+    numerador = int(''.join(map(str, digitos)) or '0')
+    if signo:
+        numerador = -numerador
+    if exponente >= 0:
+        return numerador * 10 ** exponente, 1
+    return numerador, 10 ** -exponente
+
+
+def a_centavos(valor: Numero, moneda: str = MONEDA_DEFECTO) -> int:
+    """Convertir un Decimal/str/int en unidades menores, redondeando mitad hacia arriba"""
+    decimales = DECIMALES_MONEDA[moneda]
+    numerador, denominador = como_fraccion(valor)
+    return dividir_redondeando(numerador * 10 ** decimales, denominador)
+
+
+def a_decimal(centavos: int, moneda: str = MONEDA_DEFECTO) -> Decimal:
+    """Convertir unidades menores al Decimal que guardan los modelos"""
+    return Decimal(centavos).scaleb(-DECIMALES_MONEDA[moneda])
+
+
+class Money:
+    """Monto inmutable en unidades menores enteras con su moneda"""
+
+    __slots__ = ('centavos', 'moneda')
+
+    def __init__(self, centavos: int = 0, moneda: str = MONEDA_DEFECTO):
+        if moneda not in DECIMALES_MONEDA:
+            raise ValueError(f"Moneda no soportada: {moneda}")
+        object.__setattr__(self, 'centavos', int(centavos))
+        object.__setattr__(self, 'moneda', moneda)
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError('Money es inmutable')
+
+    @classmethod
+    def de(cls, valor: Numero, moneda: str = MONEDA_DEFECTO) -> 'Money':
+        """Crear desde un Decimal (p. ej. un campo de modelo)"""
+        return cls(a_centavos(valor, moneda), moneda)
+
+    @property
+    def decimal(self) -> Decimal:
+        return a_decimal(self.centavos, self.moneda)
+
+    def _misma_moneda(self, otro: 'Money'):
+        if not isinstance(otro, Money):
+            raise TypeError(f"No se puede operar Money con {type(otro).__name__}")
+        if otro.moneda != self.moneda:
+            raise ValueError(f"Monedas distintas: {self.moneda} y {otro.moneda}")
+
+    def __add__(self, otro: 'Money') -> 'Money':
+        self._misma_moneda(otro)
+        return Money(self.centavos + otro.centavos, self.moneda)
+
+    def __sub__(self, otro: 'Money') -> 'Money':
+        self._misma_moneda(otro)
+        return Money(self.centavos - otro.centavos, self.moneda)
+
+    def __neg__(self) -> 'Money':
+        return Money(-self.centavos, self.moneda)
+
+    def __mul__(self, factor: Numero) -> 'Money':
+        """Multiplicar por un factor exacto (int o decimal) con un solo redondeo"""
+        if isinstance(factor, int):
+            return Money(self.centavos * factor, self.moneda)
+        numerador, denominador = como_fraccion(factor)
+        return Money(dividir_redondeando(self.centavos * numerador, denominador), self.moneda)
+
+    __rmul__ = __mul__
+
+    def porcentaje(self, tasa: Numero) -> 'Money':
+        """Aplicar un porcentaje: Money.de('1000').porcentaje('2.5') == 25.00"""
+        numerador, denominador = como_fraccion(tasa)
+        return Money(dividir_redondeando(self.centavos * numerador, denominador * 100), self.moneda)
+
+    def repartir(self, pesos: Iterable[int]) -> List['Money']:
+        """
+        Repartir el monto en proporción a pesos enteros sin perder centavos
+
+        Los centavos sobrantes se asignan por mayor residuo.
+        """
+        pesos = list(pesos)
+        total_pesos = sum(pesos)
+        if total_pesos <= 0:
+            raise ValueError('La suma de pesos debe ser positiva')
+        partes = []
+        residuos = []
+        for i, peso in enumerate(pesos):
+            parte, residuo = divmod(self.centavos * peso, total_pesos)
+            partes.append(parte)
+            residuos.append((residuo, -i))
+        sobrante = self.centavos - sum(partes)
+        for _, indice in sorted(residuos, reverse=True)[:sobrante]:
+            partes[-indice] += 1
+        return [Money(parte, self.moneda) for parte in partes]
+
+    def __eq__(self, otro) -> bool:
+        return isinstance(otro, Money) and (self.centavos, self.moneda) == (otro.centavos, otro.moneda)
+
+    def __lt__(self, otro: 'Money') -> bool:
+        self._misma_moneda(otro)
+        return self.centavos < otro.centavos
+
+    def __le__(self, otro: 'Money') -> bool:
+        self._misma_moneda(otro)
+        return self.centavos <= otro.centavos
+
+    def __gt__(self, otro: 'Money') -> bool:
+        self._misma_moneda(otro)
+        return self.centavos > otro.centavos
+
+    def __ge__(self, otro: 'Money') -> bool:
+        self._misma_moneda(otro)
+        return self.centavos >= otro.centavos
+
+    def __hash__(self):
+        return hash((self.centavos, self.moneda))
+
+    def __bool__(self) -> bool:
+        return self.centavos != 0
+
+    def __str__(self):
+        return f'{self.decimal} {self.moneda}'
+
+    def __repr__(self):
+        return f'Money({self.centavos}, {self.moneda!r})'
+
+
+# ================== MOTORES ==================
+
+def interes_mora(monto_original: Numero, porcentaje_mensual: Numero, dias: int,
+                 moneda: str = MONEDA_DEFECTO) -> Money:
+    """
+    Interés simple por mora: monto × (porcentaje / 30 / 100) × días
+
+    Calculado con enteros y un solo redondeo al final.
+    """
+    if dias <= 0:
+        return Money(0, moneda)
+    numerador, denominador = como_fraccion(porcentaje_mensual)
+    return Money(
+        dividir_redondeando(a_centavos(monto_original, moneda) * numerador * dias, denominador * 3000),
+        moneda
+    )
+
+
+def asignar_pago(monto: Money, saldos: Iterable[Money]) -> List[Money]:
+    """
+    Distribuir un pago sobre saldos en orden, sin exceder ninguno
+
+    Returns:
+        Monto aplicado a cada saldo (misma longitud y orden)
+    """
+    restante = monto.centavos
+    aplicados = []
+    for saldo in saldos:
+        monto._misma_moneda(saldo)
+        aplicar = min(restante, saldo.centavos) if restante > 0 else 0
+        aplicados.append(Money(max(aplicar, 0), monto.moneda))
+        restante -= max(aplicar, 0)
+    return aplicados
@@ -0,0 +1,289 @@
+"""
+Recordatorios de cobro para residentes
+Selecciona en una sola consulta las facturas próximas a vencer o vencidas,
+agrupa un mensaje por destinatario y lo entrega en lotes por un backend
+intercambiable (consola, archivo o email)
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from decimal import Decimal
+from itertools import groupby
+from typing import Any, Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .config import PAYMENT_NOTIFICATIONS
+from .models import Factura, NotificacionCobro
+
+logger = logging.getLogger(__name__)
+
+DUNNING_CONFIG = PAYMENT_NOTIFICATIONS['dunning']
+
+
+# ================== BACKENDS DE ENTREGA ==================
+
+class BaseNotificationBackend(ABC):
+    """Backend de entrega por lotes; las subclases implementan send_batch"""
+    canal = 'base'
+
+    @abstractmethod
+    def send_batch(self, mensajes: List[Dict[str, Any]]) -> int:
+        """
+        Entregar un lote de mensajes
+
+        Returns:
+            Número de mensajes entregados
+        """
+
+    def close(self):
+        """Liberar recursos al final de la corrida"""
+
+
+class ConsoleBackend(BaseNotificationBackend):
+    """Escribe los mensajes en el log (desarrollo)"""
+    canal = 'console'
+
+    def send_batch(self, mensajes):
+        for mensaje in mensajes:
+            logger.info(f"[recordatorio] {mensaje['destino']}: {mensaje['asunto']}")
+        return len(mensajes)
+
+
+class FileBackend(BaseNotificationBackend):
+    """Agrega los mensajes como JSON lines en un archivo diario bajo MEDIA_ROOT"""
+    canal = 'file'
+
+    def __init__(self, directorio: Optional[str] = None):
+        self.directorio = directorio or os.path.join(settings.MEDIA_ROOT, DUNNING_CONFIG['file_path'])
+        self._archivo = None
+
+    def send_batch(self, mensajes):
+        if self._archivo is None:
+            os.makedirs(self.directorio, exist_ok=True)
+            ruta = os.path.join(self.directorio, f"cobro-{timezone.localdate():%Y-%m-%d}.jsonl")
+            self._archivo = open(ruta, 'a', encoding='utf-8')
+        for mensaje in mensajes:
+            self._archivo.write(json.dumps(mensaje, ensure_ascii=False, default=str) + '\n')
+        self._archivo.flush()
+        return len(mensajes)
+
+    def close(self):
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+
+class EmailBackend(BaseNotificationBackend):
+    """Envía los mensajes reutilizando una conexión de correo por lote"""
+    canal = 'email'
+
+    def __init__(self, connection=None):
+        self.connection = connection
+
+    def send_batch(self, mensajes):
+        connection = self.connection or get_connection()
+        correos = [
+            EmailMessage(
+                subject=mensaje['asunto'],
+                body=mensaje['cuerpo'],
+                to=[mensaje['destino']],
+                connection=connection,
+            )
+            for mensaje in mensajes
+        ]
+        return connection.send_messages(correos) or 0
+
+
+BACKENDS = {
+    'console': ConsoleBackend,
+    'file': FileBackend,
+    'email': EmailBackend,
+}
+
+
+def get_backend(nombre: Optional[str] = None) -> BaseNotificationBackend:
+    """Instanciar un backend por nombre corto o ruta importable"""
+    nombre = nombre or DUNNING_CONFIG['backend']
+    clase = BACKENDS.get(nombre) or import_string(nombre)
+    return clase()
+
+
+class RateLimiter:
+    """Limita la entrega a un máximo de mensajes por segundo"""
+
+    def __init__(self, por_segundo: float):
+        self.intervalo = 1.0 / por_segundo if por_segundo else 0.0
+        self._siguiente = time.monotonic()
+
+    def esperar(self, cantidad: int):
+        ahora = time.monotonic()
+        if self._siguiente > ahora:
+            time.sleep(self._siguiente - ahora)
+            ahora = self._siguiente
+        self._siguiente = ahora + self.intervalo * cantidad
+
+
+# ================== SERVICIO ==================
+
+class DunningService:
+    """Servicio para seleccionar, agrupar y entregar recordatorios de cobro"""
+
+    def facturas_por_cobrar(self, dias_anticipacion: int):
+        """
+        Facturas con saldo que vencen dentro de `dias_anticipacion` días o ya vencidas
+
+        El destinatario es el inquilino de la vivienda o, si no hay, el propietario.
+        La consulta se ordena por destinatario para agrupar en streaming.
+        """
+        limite = timezone.now() + timedelta(days=dias_anticipacion)
+        return Factura.objects.filter(
+            activo=True,
+            estado__in=['generada', 'pendiente', 'parcialmente_pagada', 'vencida'],
+            saldo_pendiente__gt=0,
+            fecha_vencimiento__lte=limite,
+        ).annotate(
+            destinatario_id=Coalesce(
+                F('vivienda__usuario_inquilino_id'), F('vivienda__usuario_propietario_id')
+            ),
+            destinatario_email=Coalesce(
+                F('vivienda__usuario_inquilino__email'), F('vivienda__usuario_propietario__email')
+            ),
+            destinatario_nombre=Coalesce(
+                F('vivienda__usuario_inquilino__first_name'), F('vivienda__usuario_propietario__first_name')
+            ),
+        ).filter(
+            destinatario_id__isnull=False
+        ).values(
+            'id', 'numero_factura', 'periodo', 'fecha_vencimiento', 'saldo_pendiente',
+            'concepto__nombre', 'vivienda__identificador',
+            'destinatario_id', 'destinatario_email', 'destinatario_nombre',
+        ).order_by('destinatario_id', 'fecha_vencimiento', 'id')
+
+    def construir_mensaje(self, facturas: List[Dict[str, Any]], ahora) -> Dict[str, Any]:
+        """Mensaje único con todas las facturas de un destinatario"""
+        primera = facturas[0]
+        total = sum((f['saldo_pendiente'] for f in facturas), Decimal('0.00'))
+        lineas = []
+        for f in facturas:
+            situacion = 'VENCIDA' if f['fecha_vencimiento'] < ahora else 'vence'
+            lineas.append(
+                f"- {f['numero_factura']} {f['concepto__nombre']} ({f['vivienda__identificador']}, "
+                f"{f['periodo']}): ${f['saldo_pendiente']:,.2f} {situacion} "
+                f"{timezone.localtime(f['fecha_vencimiento']):%Y-%m-%d}"
+            )
+        cuerpo = (
+            f"Hola {primera['destinatario_nombre'] or ''},\n\n"
+            f"Tiene {len(facturas)} factura(s) pendiente(s) por un total de ${total:,.2f}:\n"
+            + '\n'.join(lineas)
+            + "\n\nPuede pagar desde la aplicación o en la administración."
+        )
+        huella = hashlib.sha256(
+            '|'.join(f"{f['id']}:{f['saldo_pendiente']}" for f in facturas).encode()
+        ).hexdigest()
+        return {
+            'usuario_id': primera['destinatario_id'],
+            'destino': primera['destinatario_email'],
+            'asunto': DUNNING_CONFIG['subject'].format(cantidad=len(facturas), total=f'{total:,.2f}'),
+            'cuerpo': cuerpo,
+            'huella': huella,
+            'facturas': len(facturas),
+            'total': total,
+        }
+
+    def mensajes(self, dias_anticipacion: int, chunk_size: int = 2000) -> Iterator[Dict[str, Any]]:
+        """Recorrer las facturas una sola vez y producir un mensaje por destinatario"""
+        ahora = timezone.now()
+        filas = self.facturas_por_cobrar(dias_anticipacion).iterator(chunk_size=chunk_size)
+        for _, grupo in groupby(filas, key=lambda fila: fila['destinatario_id']):
+            facturas = list(grupo)
+            if facturas[0]['destinatario_email']:
+                yield self.construir_mensaje(facturas, ahora)
+
+    def _ya_enviados(self, lote: List[Dict[str, Any]], desde) -> set:
+        return set(
+            NotificacionCobro.objects.filter(
+                usuario_id__in=[m['usuario_id'] for m in lote],
+                enviado_en__gte=desde,
+            ).values_list('usuario_id', 'huella')
+        )
+
+    def run(self, backend: Optional[BaseNotificationBackend] = None,
+            dias_anticipacion: Optional[int] = None, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Ejecutar una corrida de recordatorios
+
+        Un destinatario no recibe de nuevo el mismo contenido (mismas facturas y
+        saldos) antes de `resend_after_days` días.
+
+        Returns:
+            Dict con destinatarios evaluados, enviados, omitidos y fallidos
+        """
+        backend = backend or get_backend()
+        if dias_anticipacion is None:
+            dias_anticipacion = DUNNING_CONFIG['days_before_due']
+        batch_size = DUNNING_CONFIG['batch_size']
+        limitador = RateLimiter(DUNNING_CONFIG['rate_per_second'])
+        reenvio_desde = timezone.now() - timedelta(days=DUNNING_CONFIG['resend_after_days'])
+        resultado = {'destinatarios': 0, 'enviados': 0, 'omitidos': 0, 'fallidos': 0}
+
+        def _entregar(lote):
+            enviados = self._ya_enviados(lote, reenvio_desde)
+            pendientes = [m for m in lote if (m['usuario_id'], m['huella']) not in enviados]
+            resultado['omitidos'] += len(lote) - len(pendientes)
+            if dry_run:
+                resultado['enviados'] += len(pendientes)
+                return
+            if not pendientes:
+                return
+            limitador.esperar(len(pendientes))
+            try:
+                entregados = backend.send_batch(pendientes)
+            except Exception as e:
+                logger.error(f"Error entregando recordatorios de cobro: {str(e)}")
+                resultado['fallidos'] += len(pendientes)
+                return
+            resultado['enviados'] += entregados
+            resultado['fallidos'] += len(pendientes) - entregados
+            ahora = timezone.now()
+            NotificacionCobro.objects.bulk_create([
+                NotificacionCobro(
+                    usuario_id=m['usuario_id'],
+                    destino=m['destino'],
+                    canal=backend.canal,
+                    huella=m['huella'],
+                    facturas=m['facturas'],
+                    total=m['total'],
+                    enviado_en=ahora,
+                )
+                for m in pendientes[:entregados]
+            ])
+
+        lote = []
+        try:
+            for mensaje in self.mensajes(dias_anticipacion):
+                resultado['destinatarios'] += 1
+                lote.append(mensaje)
+                if len(lote) >= batch_size:
+                    _entregar(lote)
+                    lote = []
+            if lote:
+                _entregar(lote)
+        finally:
+            backend.close()
+
+        logger.info(f"Recordatorios de cobro: {resultado}")
+        return resultado
+
+
+# Instancia global del servicio
+dunning_service = DunningService()
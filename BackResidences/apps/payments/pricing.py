@@ -0,0 +1,154 @@
+"""
+Motor de reglas de precio para conceptos de pago
+Compila ConceptoPago.criterios_aplicacion una sola vez en un plan reutilizable
+
+Claves soportadas en criterios_aplicacion:
+    por_metro_cuadrado: valor por m² (reemplaza el valor base)
+    rangos_metros: [{"desde": 0, "hasta": 60, "valor": 180000}, ...]
+        valor base según el rango de m² ("hasta" excluyente y opcional)
+    factor_tipo: {"apartamento": 1.0, "casa": 1.3, ...}
+    factor_bloque: {"A": 1.1, ...}
+    solo_tipos / solo_bloques: lista de tipos o bloques a los que aplica
+    minimo / maximo: topes del monto final
+"""
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Tuple
+
+from .money import a_centavos, a_decimal, como_fraccion, dividir_redondeando
+
+CLAVES_SOPORTADAS = {
+    'por_metro_cuadrado', 'rangos_metros', 'factor_tipo', 'factor_bloque',
+    'solo_tipos', 'solo_bloques', 'minimo', 'maximo',
+}
+
+
+def _decimal(valor: Any, clave: str) -> Decimal:
+    try:
+        resultado = Decimal(str(valor))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(f"Valor inválido para '{clave}': {valor!r}")
+    if resultado < 0:
+        raise ValueError(f"'{clave}' no puede ser negativo")
+    return resultado
+
+
+def _factores(valor: Any, clave: str) -> Dict[str, Tuple[int, int]]:
+    if not isinstance(valor, dict):
+        raise ValueError(f"'{clave}' debe ser un objeto {{clave: factor}}")
+    return {str(k): como_fraccion(_decimal(v, f'{clave}.{k}')) for k, v in valor.items()}
+
+
+class PricingPlan:
+    """
+    Plan de precio compilado para un concepto
+
+    Los valores se compilan a centavos y los factores a fracciones enteras,
+    de modo que el cálculo por vivienda es aritmética entera con un solo
+    redondeo (mitad hacia arriba) al final.
+    """
+
+    __slots__ = (
+        'valor_base', 'por_metro', 'rangos', 'factor_tipo', 'factor_bloque',
+        'solo_tipos', 'solo_bloques', 'minimo', 'maximo', '_cache',
+    )
+
+    def __init__(self, valor_base: Decimal, criterios: Optional[Dict[str, Any]] = None):
+        criterios = criterios or {}
+        if not isinstance(criterios, dict):
+            raise ValueError('criterios_aplicacion debe ser un objeto JSON')
+
+        desconocidas = set(criterios) - CLAVES_SOPORTADAS
+        if desconocidas:
+            raise ValueError(f"Criterios no soportados: {', '.join(sorted(desconocidas))}")
+
+        # Montos en centavos; metros cuadrados en centésimas de m²
+        self.valor_base = a_centavos(valor_base)
+        self.por_metro = (
+            a_centavos(_decimal(criterios['por_metro_cuadrado'], 'por_metro_cuadrado'))
+            if 'por_metro_cuadrado' in criterios else None
+        )
+
+        self.rangos: List[Tuple[int, Optional[int], int]] = []
+        for i, rango in enumerate(criterios.get('rangos_metros', [])):
+            if not isinstance(rango, dict) or 'valor' not in rango:
+                raise ValueError(f"rangos_metros[{i}] debe tener 'valor'")
+            desde = a_centavos(_decimal(rango.get('desde', 0), f'rangos_metros[{i}].desde'))
+            hasta = rango.get('hasta')
+            hasta = a_centavos(_decimal(hasta, f'rangos_metros[{i}].hasta')) if hasta is not None else None
+            self.rangos.append((desde, hasta, a_centavos(_decimal(rango['valor'], f'rangos_metros[{i}].valor'))))
+        self.rangos.sort(key=lambda r: r[0])
+
+        self.factor_tipo = _factores(criterios.get('factor_tipo', {}), 'factor_tipo')
+        self.factor_bloque = _factores(criterios.get('factor_bloque', {}), 'factor_bloque')
+        self.solo_tipos = frozenset(criterios['solo_tipos']) if 'solo_tipos' in criterios else None
+        self.solo_bloques = frozenset(criterios['solo_bloques']) if 'solo_bloques' in criterios else None
+        self.minimo = a_centavos(_decimal(criterios['minimo'], 'minimo')) if 'minimo' in criterios else None
+        self.maximo = a_centavos(_decimal(criterios['maximo'], 'maximo')) if 'maximo' in criterios else None
+        if self.minimo is not None and self.maximo is not None and self.minimo > self.maximo:
+            raise ValueError("'minimo' no puede ser mayor que 'maximo'")
+
+        # Las viviendas se repiten mucho en (m², tipo, bloque): memoizar por combinación
+        self._cache: Dict[Tuple[Any, str, str], int] = {}
+
+    def calcular_centavos(self, metros_cuadrados: Decimal, tipo: str, bloque: str) -> int:
+        """Monto en centavos para una vivienda; 0 si el concepto no le aplica"""
+        clave = (metros_cuadrados, tipo, bloque)
+        monto = self._cache.get(clave)
+        if monto is None:
+            monto = self._calcular(a_centavos(metros_cuadrados or 0), tipo, bloque)
+            self._cache[clave] = monto
+        return monto
+
+    def calcular(self, metros_cuadrados: Decimal, tipo: str, bloque: str) -> Decimal:
+        """Monto para una vivienda; 0 si el concepto no le aplica"""
+        return a_decimal(self.calcular_centavos(metros_cuadrados, tipo, bloque))
+
+    def _calcular(self, metros: int, tipo, bloque) -> int:
+        if self.solo_tipos is not None and tipo not in self.solo_tipos:
+            return 0
+        if self.solo_bloques is not None and bloque not in self.solo_bloques:
+            return 0
+
+        numerador, denominador = self.valor_base, 1
+        for desde, hasta, valor in self.rangos:
+            if metros >= desde and (hasta is None or metros < hasta):
+                numerador = valor
+                break
+        if self.por_metro is not None:
+            numerador, denominador = metros * self.por_metro, 100
+
+        factor = self.factor_tipo.get(tipo)
+        if factor:
+            numerador, denominador = numerador * factor[0], denominador * factor[1]
+        factor = self.factor_bloque.get(bloque)
+        if factor:
+            numerador, denominador = numerador * factor[0], denominador * factor[1]
+
+        monto = dividir_redondeando(numerador, denominador)
+        if self.minimo is not None and monto < self.minimo:
+            monto = self.minimo
+        if self.maximo is not None and monto > self.maximo:
+            monto = self.maximo
+        return monto
+
+
+_planes: Dict[Tuple[int, Any], PricingPlan] = {}
+
+
+def compilar_plan(concepto) -> PricingPlan:
+    """
+    Compilar (o reutilizar) el plan de precio de un concepto
+
+    El plan se reutiliza mientras el concepto no cambie (misma updated_at).
+    """
+    if concepto.pk is None:
+        return PricingPlan(concepto.valor_base, concepto.criterios_aplicacion)
+
+    clave = (concepto.pk, concepto.updated_at)
+    plan = _planes.get(clave)
+    if plan is None:
+        plan = PricingPlan(concepto.valor_base, concepto.criterios_aplicacion)
+        if len(_planes) > 256:
+            _planes.clear()
+        _planes[clave] = plan
+    return plan
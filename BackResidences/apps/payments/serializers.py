@@ -5,8 +5,10 @@ from apps.authentication.models import User
 from apps.residences.models import Vivienda
 from .models import (
     ConceptoPago, MetodoPago, Factura, Pago, PagoFactura, PazYSalvo,
+    ProyeccionRecaudo, SesionCheckout, SesionCheckoutFactura,
     TipoPago, Deuda, DetalleDeuda
 )
+from .pricing import PricingPlan
 
 
 # ================== SERIALIZERS PRINCIPALES ==================
@@ -15,6 +17,7 @@ class ConceptoPagoListSerializer(serializers.ModelSerializer):
     """Serializer para listar conceptos de pago"""
     total_facturas_generadas = serializers.ReadOnlyField()
     total_recaudado = serializers.ReadOnlyField()
+    fecha_creacion = serializers.DateTimeField(source='created_at', read_only=True)
     
     class Meta:
         model = ConceptoPago
@@ -53,6 +56,14 @@ class ConceptoPagoCreateSerializer(serializers.ModelSerializer):
         if value <= 0:
             raise serializers.ValidationError("El valor base debe ser mayor a 0")
         return value
+    
+    def validate_criterios_aplicacion(self, value):
+        """Validar que los criterios compilen a un plan de precio"""
+        try:
+            PricingPlan(Decimal('1.00'), value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
 
 
 class MetodoPagoSerializer(serializers.ModelSerializer):
@@ -323,29 +334,94 @@ class PazYSalvoCreateSerializer(serializers.ModelSerializer):
 
 
 # ================== MODELOS LEGACY (COMPATIBILIDAD) ==================
+# Proyecciones de solo lectura sobre MetodoPago y Factura con la forma de los
+# modelos legacy TipoPago, Deuda y DetalleDeuda
 
-class TipoPagoSerializer(serializers.ModelSerializer):
-    """Serializer para tipos de pago (legacy)"""
-    
-    class Meta:
-        model = TipoPago
-        fields = '__all__'
+METODOS_VERIFICACION_AUTOMATICA = ['stripe', 'tarjeta_credito', 'pse_stripe']
 
 
-class DeudaSerializer(serializers.ModelSerializer):
-    """Serializer para deudas (legacy)"""
+class TipoPagoSerializer(serializers.ModelSerializer):
+    """Serializer para tipos de pago (legacy, proyectado desde MetodoPago)"""
+    verificacion_automatica = serializers.SerializerMethodField()
     
     class Meta:
-        model = Deuda
-        fields = '__all__'
+        model = MetodoPago
+        fields = [
+            'id', 'created_at', 'updated_at', 'activo', 'nombre', 'descripcion',
+            'requiere_comprobante', 'verificacion_automatica'
+        ]
+    
+    def get_verificacion_automatica(self, obj):
+        return obj.codigo in METODOS_VERIFICACION_AUTOMATICA
+
+
+class DeudaSerializer(serializers.Serializer):
+    """Serializer para deudas (legacy, facturas agrupadas por vivienda y período)"""
+    id = serializers.IntegerField(source='deuda_id')
+    created_at = serializers.DateTimeField(source='creada')
+    updated_at = serializers.DateTimeField(source='actualizada')
+    activo = serializers.BooleanField(source='vigente')
+    vivienda = serializers.IntegerField(source='vivienda_id')
+    periodo_mes = serializers.SerializerMethodField()
+    periodo_ano = serializers.SerializerMethodField()
+    monto_total = serializers.DecimalField(source='total', max_digits=12, decimal_places=2)
+    fecha_emision = serializers.SerializerMethodField()
+    fecha_vencimiento = serializers.SerializerMethodField()
+    interes_mora = serializers.DecimalField(max_digits=5, decimal_places=2)
+    descuento = serializers.DecimalField(max_digits=10, decimal_places=2)
+    estado = serializers.SerializerMethodField()
+    numero_factura = serializers.CharField(source='numero')
+    observaciones = serializers.CharField(source='notas', allow_null=True)
+    
+    def get_periodo_mes(self, obj):
+        return int(obj['periodo'][5:7])
+    
+    def get_periodo_ano(self, obj):
+        return int(obj['periodo'][:4])
+    
+    def get_fecha_emision(self, obj):
+        return timezone.localtime(obj['emision']).date()
+    
+    def get_fecha_vencimiento(self, obj):
+        return timezone.localtime(obj['vencimiento']).date()
+    
+    def get_estado(self, obj):
+        if obj['saldo'] <= 0:
+            return 'pagada'
+        if obj['vencimiento'] < timezone.now():
+            return 'vencida'
+        if obj['saldo'] < obj['total']:
+            return 'parcial'
+        return 'pendiente'
 
 
 class DetalleDeudaSerializer(serializers.ModelSerializer):
-    """Serializer para detalles de deuda (legacy)"""
+    """Serializer para detalles de deuda (legacy, una factura por detalle)"""
+    deuda = serializers.IntegerField(source='deuda_id')
+    concepto = serializers.CharField(source='concepto.nombre')
+    cantidad = serializers.SerializerMethodField()
+    precio_unitario = serializers.DecimalField(source='monto_original', max_digits=12, decimal_places=2)
+    monto = serializers.DecimalField(source='monto_original', max_digits=12, decimal_places=2)
+    detalle = serializers.SerializerMethodField()
+    periodo_consumo = serializers.CharField(source='periodo')
+    base_calculo = serializers.SerializerMethodField()
     
     class Meta:
-        model = DetalleDeuda
-        fields = '__all__'
+        model = Factura
+        fields = [
+            'id', 'created_at', 'updated_at', 'activo', 'deuda', 'concepto',
+            'cantidad', 'precio_unitario', 'monto', 'detalle',
+            'periodo_consumo', 'base_calculo'
+        ]
+    
+    def get_cantidad(self, obj):
+        return '1.00'
+    
+    def get_detalle(self, obj):
+        return obj.observaciones or ''
+    
+    def get_base_calculo(self, obj):
+        return None
 
 
 # ================== SERIALIZERS PARA REPORTES ==================
@@ -373,6 +449,19 @@ class EstadoCuentaSerializer(serializers.Serializer):
     total_pagado_ano = serializers.DecimalField(max_digits=15, decimal_places=2)
 
 
+class ProyeccionRecaudoSerializer(serializers.ModelSerializer):
+    """Serializer para proyecciones de recaudo precalculadas"""
+    concepto_nombre = serializers.CharField(source='concepto.nombre', read_only=True)
+    
+    class Meta:
+        model = ProyeccionRecaudo
+        fields = [
+            'id', 'concepto', 'concepto_nombre', 'bloque', 'periodo', 'metodo',
+            'tasa_recaudo', 'facturado_proyectado', 'recaudo_proyectado',
+            'tasa_ultimo_periodo', 'periodos_historicos', 'calculado_en'
+        ]
+
+
 # ================== SERIALIZERS PARA STRIPE ==================
 
 class StripePaymentIntentSerializer(serializers.Serializer):
@@ -391,6 +480,42 @@ class StripePaymentIntentSerializer(serializers.Serializer):
         return value
 
 
+class CheckoutCreateSerializer(serializers.Serializer):
+    """Serializer para abrir una sesión de checkout sobre varias facturas"""
+    facturas = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=100
+    )
+
+
+class SesionCheckoutFacturaSerializer(serializers.ModelSerializer):
+    """Serializer para facturas reservadas en un checkout"""
+    numero_factura = serializers.CharField(source='factura.numero_factura', read_only=True)
+    concepto = serializers.CharField(source='factura.concepto.nombre', read_only=True)
+    
+    class Meta:
+        model = SesionCheckoutFactura
+        fields = ['factura', 'numero_factura', 'concepto', 'monto']
+
+
+class SesionCheckoutSerializer(serializers.ModelSerializer):
+    """Serializer para sesiones de checkout"""
+    items = SesionCheckoutFacturaSerializer(many=True, read_only=True)
+    client_secret = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = SesionCheckout
+        fields = [
+            'id', 'vivienda', 'estado', 'monto_total', 'moneda',
+            'payment_intent_id', 'client_secret', 'expira_en', 'pago', 'items'
+        ]
+    
+    def get_client_secret(self, obj):
+        # Solo disponible en la respuesta de creación
+        return getattr(obj, 'client_secret', None)
+
+
 class StripeWebhookSerializer(serializers.Serializer):
     """Serializer para webhooks de Stripe"""
     type = serializers.CharField()
@@ -2,19 +2,63 @@
 Servicios para el módulo de pagos
 Incluye integración con Stripe y lógica de negocio
 """
+import hashlib
+import hmac
+import json
 import logging
+import random
+import time
+from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Dict, List, Optional, Any
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth
 from rest_framework import status
 from rest_framework.response import Response
 
-from .models import Pago, Factura, PagoFactura, ConceptoPago, MetodoPago
+from .models import (
+    Pago, Factura, PagoFactura, ConceptoPago, MetodoPago, CorridaFacturacion,
+    SesionCheckout, SesionCheckoutFactura
+)
+from .config import BILLING_CONFIG, REPORTS_CONFIG, SECURITY_CONFIG
+from .pricing import compilar_plan
+from .money import Money, a_decimal, asignar_pago
+from .gateway import GatewayClient, GatewayError
 
 logger = logging.getLogger(__name__)
 
+STRIPE_API_URL = 'https://api.stripe.com'
+
+
+def firmar_webhook(payload: str, secret: str, timestamp: Optional[int] = None) -> str:
+    """Cabecera Stripe-Signature (t=..., v1=HMAC-SHA256) para un payload"""
+    timestamp = timestamp or int(time.time())
+    firma = hmac.new(
+        secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256
+    ).hexdigest()
+    return f't={timestamp},v1={firma}'
+
+
+def verificar_firma_webhook(payload: str, sig_header: str, secret: str,
+                            tolerancia: int = 300) -> bool:
+    """Verificar una cabecera Stripe-Signature con el mismo esquema de Stripe"""
+    partes = {}
+    for elemento in sig_header.split(','):
+        clave, _, valor = elemento.partition('=')
+        partes.setdefault(clave.strip(), []).append(valor.strip())
+    try:
+        timestamp = int(partes['t'][0])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > tolerancia:
+        return False
+    esperada = firmar_webhook(payload, secret, timestamp).split('v1=', 1)[1]
+    return any(hmac.compare_digest(esperada, firma) for firma in partes.get('v1', []))
+
 
 class StripeService:
     """Servicio para integración con Stripe"""
@@ -23,22 +67,35 @@ class StripeService:
         self.api_key = getattr(settings, 'STRIPE_SECRET_KEY', None)
         self.publishable_key = getattr(settings, 'STRIPE_PUBLISHABLE_KEY', None)
         self.webhook_secret = getattr(settings, 'STRIPE_WEBHOOK_SECRET', None)
+        self.webhook_allow_unsigned = getattr(settings, 'STRIPE_WEBHOOK_ALLOW_UNSIGNED', False)
         self.is_test_mode = getattr(settings, 'STRIPE_TEST_MODE', True)
+        # Pasarela HTTP alternativa con la API de Stripe (p. ej. `manage.py fake_stripe`)
+        self.api_base = getattr(settings, 'STRIPE_API_BASE', '')
+        self.timeout = getattr(settings, 'STRIPE_TIMEOUT_SECONDS', 10)
         
-        # En modo de prueba, no inicializamos Stripe real
-        if not self.is_test_mode and self.api_key:
-            try:
-                import stripe
-                stripe.api_key = self.api_key
-                self.stripe = stripe
-            except ImportError:
-                logger.warning("Stripe library not installed. Install with: pip install stripe")
-                self.stripe = None
+        # Un único cliente con pool de conexiones por proceso. En modo de prueba
+        # sin STRIPE_API_BASE no hay pasarela y las respuestas se simulan.
+        if self.api_base:
+            self.gateway = GatewayClient(self.api_base, self.api_key or 'sk_test_local', self.timeout)
+        elif not self.is_test_mode and self.api_key:
+            self.gateway = GatewayClient(STRIPE_API_URL, self.api_key, self.timeout)
         else:
-            self.stripe = None
+            self.gateway = None
+    
+    @staticmethod
+    def _intent(intent: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'id': intent['id'],
+            'client_secret': intent.get('client_secret'),
+            'amount': intent['amount'],
+            'amount_received': intent.get('amount_received', 0),
+            'currency': intent['currency'],
+            'status': intent['status'],
+            'metadata': intent.get('metadata', {})
+        }
     
     def create_payment_intent(self, amount: int, currency: str = 'cop', 
-                            metadata: Dict = None) -> Dict[str, Any]:
+                            metadata: Dict = None, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """
         Crear un PaymentIntent en Stripe
         
@@ -46,10 +103,29 @@ class StripeService:
             amount: Monto en centavos
             currency: Moneda (default: cop)
             metadata: Metadatos adicionales
+            idempotency_key: Clave para que un reintento no cree otro intent
             
         Returns:
             Dict con información del PaymentIntent
         """
+        if self.gateway:
+            data = {
+                'amount': amount,
+                'currency': currency,
+                'metadata': metadata or {},
+            }
+            if not self.api_base:
+                data['automatic_payment_methods'] = {'enabled': True}
+            try:
+                return self._intent(self.gateway.post(
+                    '/v1/payment_intents', data,
+                    operacion='payment_intents.create',
+                    idempotency_key=idempotency_key
+                ))
+            except GatewayError as e:
+                logger.error(f"Error creating Stripe PaymentIntent: {str(e)}")
+                raise Exception(f"Error procesando pago: {str(e)}")
+        
         if self.is_test_mode:
             # Simulación para desarrollo
             return {
@@ -61,29 +137,7 @@ class StripeService:
                 'metadata': metadata or {}
             }
         
-        if not self.stripe:
-            raise Exception("Stripe not configured properly")
-            
-        try:
-            intent = self.stripe.PaymentIntent.create(
-                amount=amount,
-                currency=currency,
-                metadata=metadata or {},
-                automatic_payment_methods={'enabled': True}
-            )
-            
-            return {
-                'id': intent.id,
-                'client_secret': intent.client_secret,
-                'amount': intent.amount,
-                'currency': intent.currency,
-                'status': intent.status,
-                'metadata': intent.metadata
-            }
-            
-        except Exception as e:
-            logger.error(f"Error creating Stripe PaymentIntent: {str(e)}")
-            raise Exception(f"Error procesando pago: {str(e)}")
+        raise Exception("Stripe not configured properly")
     
     def confirm_payment(self, payment_intent_id: str) -> Dict[str, Any]:
         """
@@ -95,6 +149,16 @@ class StripeService:
         Returns:
             Dict con información del pago confirmado
         """
+        if self.gateway:
+            try:
+                return self._intent(self.gateway.get(
+                    f'/v1/payment_intents/{payment_intent_id}',
+                    operacion='payment_intents.retrieve'
+                ))
+            except GatewayError as e:
+                logger.error(f"Error confirming Stripe payment: {str(e)}")
+                raise Exception(f"Error confirmando pago: {str(e)}")
+        
         if self.is_test_mode:
             # Simulación para desarrollo
             return {
@@ -111,27 +175,74 @@ class StripeService:
                     }]
                 }
             }
-            
-        if not self.stripe:
-            raise Exception("Stripe not configured properly")
-            
-        try:
-            intent = self.stripe.PaymentIntent.retrieve(payment_intent_id)
-            return {
-                'id': intent.id,
-                'status': intent.status,
-                'amount_received': intent.amount_received,
-                'currency': intent.currency,
-                'charges': intent.charges
-            }
-        except Exception as e:
-            logger.error(f"Error confirming Stripe payment: {str(e)}")
-            raise Exception(f"Error confirmando pago: {str(e)}")
+        
+        raise Exception("Stripe not configured properly")
+    
+    def cancel_payment_intent(self, payment_intent_id: str) -> Dict[str, Any]:
+        """
+        Cancelar un PaymentIntent para que el cliente ya no pueda pagarlo
+        
+        Stripe rechaza la cancelación de un intent ya cobrado; en ese caso el
+        webhook llega después y CheckoutService.completar lo reembolsa.
+        """
+        if self.gateway:
+            try:
+                return self._intent(self.gateway.post(
+                    f'/v1/payment_intents/{payment_intent_id}/cancel', {},
+                    operacion='payment_intents.cancel',
+                    idempotency_key=f'cancel-{payment_intent_id}'
+                ))
+            except GatewayError as e:
+                logger.error(f"Error canceling Stripe PaymentIntent: {str(e)}")
+                raise Exception(f"Error cancelando pago: {str(e)}")
+        
+        if self.is_test_mode:
+            return {'id': payment_intent_id, 'status': 'canceled'}
+        
+        raise Exception("Stripe not configured properly")
+    
+    def refund_payment_intent(self, payment_intent_id: str, amount: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Reembolsar un PaymentIntent (una sola vez por intent)
+        
+        Args:
+            payment_intent_id: ID del PaymentIntent cobrado
+            amount: Centavos a devolver; por defecto todo lo cobrado
+        """
+        if self.gateway:
+            data = {'payment_intent': payment_intent_id}
+            if amount is not None:
+                data['amount'] = amount
+            try:
+                return self.gateway.post(
+                    '/v1/refunds', data,
+                    operacion='refunds.create',
+                    idempotency_key=f'refund-{payment_intent_id}'
+                )
+            except GatewayError as e:
+                logger.error(f"Error refunding Stripe PaymentIntent: {str(e)}")
+                raise Exception(f"Error reembolsando pago: {str(e)}")
+        
+        if self.is_test_mode:
+            return {'id': f're_test_{timezone.now().timestamp()}', 'payment_intent': payment_intent_id,
+                    'amount': amount, 'status': 'succeeded'}
+        
+        raise Exception("Stripe not configured properly")
+    
+    def metricas(self) -> Dict[str, Any]:
+        """Latencia, errores, reintentos y estado del circuito de la pasarela"""
+        if not self.gateway:
+            return {'circuito': None, 'fallos_consecutivos': 0, 'operaciones': {}}
+        return self.gateway.metricas()
     
     def process_webhook(self, payload: str, sig_header: str) -> Dict[str, Any]:
         """
         Procesar webhook de Stripe
         
+        El endpoint no tiene otra autenticación que la firma: sin
+        STRIPE_WEBHOOK_SECRET se rechaza todo, salvo que se active
+        explícitamente STRIPE_WEBHOOK_ALLOW_UNSIGNED (pruebas locales).
+        
         Args:
             payload: Payload del webhook
             sig_header: Signature header
@@ -139,41 +250,32 @@ class StripeService:
         Returns:
             Dict con el evento procesado
         """
-        if self.is_test_mode:
-            # En modo de prueba, simular evento
-            import json
-            try:
-                event_data = json.loads(payload)
-                return {
-                    'type': event_data.get('type', 'payment_intent.succeeded'),
-                    'data': event_data.get('data', {}),
-                    'livemode': False
-                }
-            except json.JSONDecodeError:
-                return {
-                    'type': 'test_event',
-                    'data': {'object': {'id': 'test_id'}},
-                    'livemode': False
-                }
+        if self.webhook_secret:
+            if not verificar_firma_webhook(payload, sig_header or '', self.webhook_secret):
+                raise Exception("Firma de webhook inválida")
+        elif self.webhook_allow_unsigned:
+            logger.warning("Webhook de Stripe aceptado sin firma (STRIPE_WEBHOOK_ALLOW_UNSIGNED)")
+        else:
+            raise Exception("Webhook rechazado: STRIPE_WEBHOOK_SECRET no está configurado")
         
-        if not self.stripe or not self.webhook_secret:
-            raise Exception("Stripe webhook not configured properly")
-            
         try:
-            event = self.stripe.Webhook.construct_event(
-                payload, sig_header, self.webhook_secret
-            )
-            return event
-        except Exception as e:
-            logger.error(f"Error processing Stripe webhook: {str(e)}")
-            raise Exception(f"Error procesando webhook: {str(e)}")
+            event_data = json.loads(payload)
+        except json.JSONDecodeError:
+            raise Exception("Error procesando webhook: payload inválido")
+        if not isinstance(event_data, dict) or not event_data.get('type'):
+            raise Exception("Error procesando webhook: evento sin tipo")
+        return {
+            'type': event_data['type'],
+            'data': event_data.get('data', {}),
+            'livemode': event_data.get('livemode', False)
+        }
 
 
 class PaymentService:
     """Servicio para lógica de negocio de pagos"""
     
-    def __init__(self):
-        self.stripe_service = StripeService()
+    def __init__(self, stripe=None):
+        self.stripe_service = stripe or StripeService()
     
     @transaction.atomic
     def create_payment_with_stripe(self, pago_data: Dict, user) -> Pago:
@@ -205,10 +307,12 @@ class PaymentService:
             
             # Crear PaymentIntent en Stripe si es pago online
             stripe_data = {}
-            metodo_pago = MetodoPago.objects.get(id=pago_data['metodo_pago'])
+            metodo_pago = pago_data['metodo_pago']
+            if not isinstance(metodo_pago, MetodoPago):
+                metodo_pago = MetodoPago.objects.get(id=metodo_pago)
             
             if metodo_pago.codigo in ['stripe', 'tarjeta_credito', 'pse_stripe']:
-                amount_cents = int(pago_data['monto_total'] * 100)  # Convertir a centavos
+                amount_cents = Money.de(pago_data['monto_total']).centavos
                 metadata = {
                     'vivienda_id': str(pago_data['vivienda'].id),
                     'facturas': ','.join(map(str, facturas_ids)),
@@ -237,7 +341,8 @@ class PaymentService:
                 vivienda=pago_data['vivienda'],
                 monto_total=pago_data['monto_total'],
                 metodo_pago=metodo_pago,
-                numero_referencia=pago_data.get('numero_referencia', ''),
+                # El PaymentIntent identifica el pago al llegar el webhook
+                numero_referencia=stripe_data.get('stripe_payment_intent_id') or pago_data.get('numero_referencia', ''),
                 fecha_pago=pago_data.get('fecha_pago', timezone.now()),
                 observaciones=pago_data.get('observaciones', ''),
                 archivo_comprobante=pago_data.get('archivo_comprobante', ''),
@@ -258,21 +363,21 @@ class PaymentService:
             raise Exception(f"Error creando pago: {str(e)}")
     
     def _apply_payment_to_invoices(self, pago: Pago, facturas):
-        """Aplicar pago a facturas"""
-        monto_restante = pago.monto_total
+        """Aplicar pago a facturas (las más antiguas primero)"""
+        facturas = list(facturas.order_by('fecha_vencimiento'))
+        aplicados = asignar_pago(
+            Money.de(pago.monto_total),
+            [Money.de(factura.saldo_pendiente) for factura in facturas]
+        )
         
-        for factura in facturas.order_by('fecha_vencimiento'):
-            if monto_restante <= 0:
-                break
-                
-            monto_aplicar = min(monto_restante, factura.saldo_pendiente)
-            if monto_aplicar > 0:
+        for factura, monto_aplicar in zip(facturas, aplicados):
+            if monto_aplicar.centavos > 0:
                 PagoFactura.objects.create(
                     pago=pago,
                     factura=factura,
-                    monto_aplicado=monto_aplicar
+                    monto_aplicado=monto_aplicar.decimal
                 )
-                monto_restante -= monto_aplicar
+        concepto_service.invalidar_resumen()
     
     @transaction.atomic
     def confirm_stripe_payment(self, payment_intent_id: str) -> Optional[Pago]:
@@ -286,23 +391,38 @@ class PaymentService:
             Pago confirmado o None si no se encuentra
         """
         try:
-            # Buscar pago por payment_intent_id
-            # Nota: Necesitaríamos agregar este campo al modelo Pago
-            # Por ahora usamos numero_referencia o agregamos campo específico
-            
             stripe_payment = self.stripe_service.confirm_payment(payment_intent_id)
             
             if stripe_payment['status'] == 'succeeded':
-                # Buscar y actualizar pago
-                # Por ahora simulamos la búsqueda
-                # En implementación real, agregar campo stripe_payment_intent_id al modelo
-                
-                logger.info(f"Stripe payment confirmed: {payment_intent_id}")
-                return None  # Retornar el pago encontrado y actualizado
+                return self.mark_stripe_payment_confirmed(stripe_payment)
             
         except Exception as e:
             logger.error(f"Error confirming Stripe payment: {str(e)}")
+        return None
+    
+    @transaction.atomic
+    def mark_stripe_payment_confirmed(self, payment_intent: Dict[str, Any]) -> Optional[Pago]:
+        """
+        Confirmar el Pago pendiente asociado a un PaymentIntent exitoso
+        
+        Idempotente: un pago ya confirmado se devuelve sin cambios.
+        """
+        pago = Pago.objects.select_for_update().filter(
+            numero_referencia=payment_intent['id']
+        ).first()
+        if pago is None or pago.estado != 'pendiente':
+            return pago
+        
+        recibido = payment_intent.get('amount_received') or payment_intent.get('amount')
+        if recibido != Money.de(pago.monto_total).centavos:
+            logger.error(f"Pago {pago.numero_pago}: monto recibido {recibido} no coincide")
             return None
+        
+        pago.estado = 'confirmado'
+        pago.fecha_confirmacion = timezone.now()
+        pago.save(update_fields=['estado', 'fecha_confirmacion', 'updated_at'])
+        logger.info(f"Stripe payment confirmed: {payment_intent['id']} -> {pago.numero_pago}")
+        return pago
     
     def generate_payment_reports(self, periodo: str = None) -> Dict[str, Any]:
         """
@@ -347,15 +467,488 @@ class PaymentService:
                 estado__in=['pendiente', 'parcialmente_pagada']
             ).count()
         }
+    
+    def payment_method_stats(self, periodo: str = None, meses: int = 6) -> Dict[str, Any]:
+        """
+        Estadísticas de recaudo y comisiones por método de pago
+        
+        Una sola consulta agrupada por método y mes cubre el período pedido
+        y la tendencia de los `meses` anteriores.
+        
+        Args:
+            periodo: Período final en formato YYYY-MM
+            meses: Número de períodos de la tendencia (incluye el final)
+            
+        Returns:
+            Dict con el detalle del período y la tendencia mensual por método
+        """
+        if not periodo:
+            periodo = timezone.now().strftime('%Y-%m')
+        
+        anio, mes = (int(parte) for parte in periodo.split('-'))
+        indice_fin = anio * 12 + mes - 1
+        indice_inicio = indice_fin - meses + 1
+        periodos = [
+            f'{i // 12:04d}-{i % 12 + 1:02d}' for i in range(indice_inicio, indice_fin + 1)
+        ]
+        
+        tz = timezone.get_current_timezone()
+        desde = timezone.make_aware(datetime(indice_inicio // 12, indice_inicio % 12 + 1, 1), tz)
+        hasta = timezone.make_aware(datetime((indice_fin + 1) // 12, (indice_fin + 1) % 12 + 1, 1), tz)
+        
+        comision = ExpressionWrapper(
+            F('monto_total') * F('metodo_pago__comision_porcentaje') / Decimal('100'),
+            output_field=DecimalField(max_digits=15, decimal_places=4)
+        )
+        filas = Pago.objects.filter(
+            fecha_pago__gte=desde,
+            fecha_pago__lt=hasta,
+            estado='confirmado'
+        ).annotate(
+            mes=TruncMonth('fecha_pago', tzinfo=tz)
+        ).values(
+            'metodo_pago_id', 'metodo_pago__nombre', 'metodo_pago__comision_porcentaje', 'mes'
+        ).annotate(
+            cantidad=Count('id'),
+            monto=Sum('monto_total'),
+            # Sin método de pago (metodo_pago nulo) no hay comisión
+            comision=Coalesce(Sum(comision), Decimal('0'), output_field=DecimalField(max_digits=15, decimal_places=4))
+        ).order_by()
+        
+        metodos: Dict[int, Dict[str, Any]] = {}
+        for fila in filas:
+            metodo = metodos.setdefault(fila['metodo_pago_id'], {
+                'metodo_id': fila['metodo_pago_id'],
+                'metodo': fila['metodo_pago__nombre'] or 'Sin método',
+                'comision_porcentaje': fila['metodo_pago__comision_porcentaje'],
+                'tendencia': {
+                    p: {'periodo': p, 'cantidad': 0, 'monto': Decimal('0.00'), 'comision': Decimal('0.00')}
+                    for p in periodos
+                },
+            })
+            punto = metodo['tendencia'][fila['mes'].strftime('%Y-%m')]
+            punto['cantidad'] = fila['cantidad']
+            punto['monto'] = fila['monto']
+            punto['comision'] = fila['comision'].quantize(Decimal('0.01'))
+        
+        total_periodo = sum(
+            (m['tendencia'][periodo]['monto'] for m in metodos.values()), Decimal('0.00')
+        )
+        resultado = []
+        for metodo in sorted(metodos.values(), key=lambda m: m['metodo']):
+            actual = metodo['tendencia'][periodo]
+            resultado.append({
+                'metodo_id': metodo['metodo_id'],
+                'metodo': metodo['metodo'],
+                'comision_porcentaje': metodo['comision_porcentaje'],
+                'cantidad': actual['cantidad'],
+                'monto': actual['monto'],
+                'comision': actual['comision'],
+                'monto_neto': actual['monto'] - actual['comision'],
+                'porcentaje': round(actual['monto'] / total_periodo * 100, 2) if total_periodo > 0 else 0,
+                'tendencia': list(metodo['tendencia'].values()),
+            })
+        
+        return {
+            'periodo': periodo,
+            'periodos': periodos,
+            'total_recaudado': total_periodo,
+            'total_comisiones': sum((m['comision'] for m in resultado), Decimal('0.00')),
+            'metodos': resultado,
+        }
+
+
+class ConflictoCheckout(Exception):
+    """Alguna factura ya está reservada por otra sesión de checkout vigente"""
+
+
+class CheckoutService:
+    """Sesiones de pago en línea con reserva temporal de facturas"""
+    
+    ESTADOS_COBRABLES = ['generada', 'pendiente', 'parcialmente_pagada', 'vencida']
+    # Las facturas no registran moneda: sus saldos están en pesos
+    MONEDA = 'COP'
+    
+    def __init__(self, stripe=None):
+        self.stripe_service = stripe or StripeService()
+    
+    def _liberar(self, sesiones, estado: str) -> int:
+        """
+        Cerrar sesiones activas, liberar sus facturas y cancelar sus PaymentIntents
+        
+        Sin cancelar el intent el cliente podría seguir pagándolo después de que
+        otra sesión tome las mismas facturas. La cancelación es una llamada
+        externa y se hace cuando la transacción confirma.
+        """
+        filas = list(sesiones.filter(estado='activa').values_list('id', 'payment_intent_id'))
+        if not filas:
+            return 0
+        ids = [sesion_id for sesion_id, _ in filas]
+        SesionCheckoutFactura.objects.filter(sesion_id__in=ids, activo=True).update(activo=False)
+        liberadas = SesionCheckout.objects.filter(id__in=ids, estado='activa').update(estado=estado)
+        intents = [intent for _, intent in filas if intent]
+        if intents:
+            transaction.on_commit(lambda: self._cancelar_intents(intents))
+        return liberadas
+    
+    def _cancelar_intents(self, intents: List[str]):
+        for intent in intents:
+            try:
+                self.stripe_service.cancel_payment_intent(intent)
+            except Exception as e:
+                # Si ya se cobró, completar() lo reembolsará al llegar el webhook
+                logger.warning(f"No se pudo cancelar el PaymentIntent {intent}: {str(e)}")
+    
+    def _reembolsar(self, sesion_id: int, payment_intent_id: str, centavos: Optional[int] = None):
+        try:
+            self.stripe_service.refund_payment_intent(payment_intent_id, centavos)
+            logger.warning(
+                f"Checkout {sesion_id}: cobro {payment_intent_id} reembolsado"
+                f"{f' ({centavos} centavos)' if centavos is not None else ''}"
+            )
+        except Exception as e:
+            logger.error(
+                f"Checkout {sesion_id}: no se pudo reembolsar {payment_intent_id}, "
+                f"requiere revisión manual: {str(e)}"
+            )
+    
+    def verificar_libres(self, facturas_ids) -> None:
+        """
+        Rechazar pagos por otra vía sobre facturas retenidas por un checkout vigente
+        
+        Raises:
+            ConflictoCheckout: Alguna factura tiene una reserva activa sin vencer
+        """
+        reservadas = list(SesionCheckoutFactura.objects.filter(
+            factura__in=list(facturas_ids), activo=True,
+            sesion__estado='activa', sesion__expira_en__gt=timezone.now()
+        ).values_list('factura__numero_factura', flat=True))
+        if reservadas:
+            raise ConflictoCheckout(f"Facturas en proceso de pago: {', '.join(reservadas)}")
+    
+    def liberar_expiradas(self) -> int:
+        """Liberar las reservas vencidas (barrido periódico)"""
+        with transaction.atomic():
+            return self._liberar(
+                SesionCheckout.objects.select_for_update(skip_locked=True).filter(
+                    estado='activa', expira_en__lte=timezone.now()
+                ),
+                'expirada'
+            )
+    
+    def crear_sesion(self, user, facturas_ids: List[int]) -> SesionCheckout:
+        """
+        Reservar facturas y crear el PaymentIntent por su saldo exacto
+        
+        Las facturas se bloquean (SELECT ... FOR UPDATE, en orden de id) mientras
+        se verifica que no estén reservadas y se toma su saldo, de modo que dos
+        checkouts simultáneos de la misma factura no pueden cobrarla dos veces.
+        
+        Raises:
+            ValueError: Facturas inválidas, de otra vivienda o sin permiso
+            ConflictoCheckout: Alguna factura ya tiene una reserva vigente
+        """
+        moneda = self.MONEDA
+        facturas_ids = sorted(set(facturas_ids))
+        if not facturas_ids:
+            raise ValueError("Debe indicar al menos una factura")
+        
+        ahora = timezone.now()
+        with transaction.atomic():
+            facturas = list(
+                Factura.objects.select_for_update()
+                .filter(id__in=facturas_ids, activo=True, estado__in=self.ESTADOS_COBRABLES,
+                        saldo_pendiente__gt=0)
+                .select_related('vivienda')
+                .order_by('id')
+            )
+            if len(facturas) != len(facturas_ids):
+                raise ValueError("Algunas facturas no existen o no tienen saldo pendiente")
+            
+            vivienda = facturas[0].vivienda
+            if any(f.vivienda_id != vivienda.pk for f in facturas):
+                raise ValueError("Todas las facturas deben pertenecer a la misma vivienda")
+            if not user.is_staff and user.pk not in (
+                vivienda.usuario_propietario_id, vivienda.usuario_inquilino_id
+            ):
+                raise ValueError("No tiene permiso para pagar estas facturas")
+            
+            # Reservas vencidas que el barrido aún no liberó
+            self._liberar(
+                SesionCheckout.objects.filter(
+                    items__factura_id__in=facturas_ids, items__activo=True, expira_en__lte=ahora
+                ).distinct(),
+                'expirada'
+            )
+            reservadas = list(SesionCheckoutFactura.objects.filter(
+                factura_id__in=facturas_ids, activo=True
+            ).values_list('factura__numero_factura', flat=True))
+            if reservadas:
+                raise ConflictoCheckout(
+                    f"Facturas en proceso de pago: {', '.join(reservadas)}"
+                )
+            
+            montos = [Money.de(f.saldo_pendiente, moneda) for f in facturas]
+            total = sum(montos, Money(0, moneda))
+            sesion = SesionCheckout.objects.create(
+                usuario=user,
+                vivienda=vivienda,
+                monto_total=total.decimal,
+                moneda=moneda,
+                expira_en=ahora + timedelta(minutes=SECURITY_CONFIG['payment_session_timeout_minutes'])
+            )
+            SesionCheckoutFactura.objects.bulk_create([
+                SesionCheckoutFactura(sesion=sesion, factura=factura, monto=monto.decimal)
+                for factura, monto in zip(facturas, montos)
+            ])
+        
+        # Llamada externa fuera de la transacción: la reserva ya protege las facturas
+        try:
+            intent = self.stripe_service.create_payment_intent(
+                amount=total.centavos,
+                currency=moneda.lower(),
+                metadata={
+                    'checkout_id': str(sesion.pk),
+                    'vivienda_id': str(vivienda.pk),
+                    'facturas': ','.join(map(str, facturas_ids)),
+                    'user_id': str(user.pk)
+                },
+                idempotency_key=f'checkout-{sesion.pk}'
+            )
+        except Exception:
+            self._liberar(SesionCheckout.objects.filter(pk=sesion.pk), 'cancelada')
+            raise
+        
+        sesion.payment_intent_id = intent['id']
+        sesion.save(update_fields=['payment_intent_id', 'updated_at'])
+        sesion.client_secret = intent['client_secret']
+        return sesion
+    
+    def cancelar(self, sesion: SesionCheckout) -> bool:
+        """Cancelar una sesión activa y liberar sus facturas"""
+        with transaction.atomic():
+            return bool(self._liberar(
+                SesionCheckout.objects.select_for_update().filter(pk=sesion.pk), 'cancelada'
+            ))
+    
+    @transaction.atomic
+    def completar(self, payment_intent_id: str, monto_recibido: int) -> Optional[Pago]:
+        """
+        Registrar el pago de una sesión a partir del PaymentIntent confirmado
+        
+        Idempotente: si la sesión ya se completó devuelve el pago existente.
+        El pago se aplica con los saldos reservados, nunca con montos del cliente.
+        Una sesión expirada o cancelada ya no reserva sus facturas (otra sesión
+        pudo tomarlas o pagarlas), así que su cobro se reembolsa y no se aplica.
+        Si un pago manual redujo algún saldo durante la reserva, el Pago se
+        registra por lo aplicado y la diferencia se reembolsa.
+        """
+        sesion = SesionCheckout.objects.select_for_update().filter(
+            payment_intent_id=payment_intent_id
+        ).first()
+        if sesion is None:
+            return None
+        if sesion.estado == 'completada':
+            return sesion.pago
+        if sesion.estado != 'activa':
+            logger.error(
+                f"Checkout {sesion.pk} en estado {sesion.estado} recibió el cobro {payment_intent_id}; "
+                f"se reembolsa sin aplicarlo"
+            )
+            transaction.on_commit(lambda: self._reembolsar(sesion.pk, payment_intent_id))
+            return None
+        
+        total = Money.de(sesion.monto_total, sesion.moneda)
+        if monto_recibido != total.centavos:
+            logger.error(
+                f"Checkout {sesion.pk}: monto recibido {monto_recibido} != reservado {total.centavos}"
+            )
+            raise ValueError("El monto recibido no coincide con el de la sesión")
+        
+        items = list(sesion.items.order_by('factura_id'))
+        # Bloquear las facturas antes de modificar sus saldos
+        facturas = {
+            factura.pk: factura
+            for factura in Factura.objects.select_for_update().filter(
+                id__in=[item.factura_id for item in items]
+            ).order_by('id')
+        }
+        
+        # El saldo pudo reducirse por un pago manual durante la reserva
+        aplicar = [
+            (facturas[item.factura_id], min(item.monto, facturas[item.factura_id].saldo_pendiente))
+            for item in items
+        ]
+        aplicado = sum((monto for _, monto in aplicar if monto > 0), Decimal('0.00'))
+        excedente = total.centavos - Money.de(aplicado, sesion.moneda).centavos
+        if excedente > 0:
+            logger.warning(
+                f"Checkout {sesion.pk}: saldos reducidos durante la reserva; se reembolsan {excedente} centavos"
+            )
+            transaction.on_commit(lambda: self._reembolsar(sesion.pk, payment_intent_id, excedente))
+        
+        sesion.items.filter(activo=True).update(activo=False)
+        if aplicado <= 0:
+            # Todas las facturas se pagaron por otro medio: no hay Pago que registrar
+            sesion.estado = 'cancelada'
+            sesion.save(update_fields=['estado', 'updated_at'])
+            return None
+        
+        ahora = timezone.now()
+        secuencia = Pago.objects.filter(numero_pago__startswith=f'PAG-{ahora.year}-').count() + 1
+        pago = Pago.objects.create(
+            numero_pago=f'PAG-{ahora.year}-{secuencia:06d}',
+            vivienda_id=sesion.vivienda_id,
+            monto_total=aplicado,
+            metodo_pago=MetodoPago.objects.filter(codigo='stripe').first(),
+            numero_referencia=payment_intent_id,
+            fecha_pago=ahora,
+            registrado_por=sesion.usuario,
+            estado='confirmado',
+            fecha_confirmacion=ahora
+        )
+        for factura, monto in aplicar:
+            if monto > 0:
+                PagoFactura.objects.create(pago=pago, factura=factura, monto_aplicado=monto)
+        concepto_service.invalidar_resumen()
+        
+        sesion.estado = 'completada'
+        sesion.pago = pago
+        sesion.save(update_fields=['estado', 'pago', 'updated_at'])
+        return pago
+
+
+class ConceptoService:
+    """Resumen del catálogo de conceptos (pantalla de conceptos), cacheado"""
+    
+    CACHE_KEY = 'payments:conceptos:resumen'
+    
+    def resumen_catalogo(self) -> Dict[str, Any]:
+        """
+        Conceptos, facturas y recaudo por tipo de concepto
+        
+        Se calcula en una consulta agrupada y se guarda en caché
+        `concept_catalog_cache_seconds`; se invalida al modificar conceptos,
+        al generar o modificar facturas y al aplicar o reversar pagos.
+        """
+        resumen = cache.get(self.CACHE_KEY)
+        if resumen is not None:
+            return resumen
+        
+        filas = (
+            ConceptoPago.objects.values('tipo')
+            .annotate(
+                conceptos=Count('id', distinct=True),
+                activos=Count('id', distinct=True, filter=Q(activo=True)),
+                facturas=Count('facturas'),
+                recaudado=Sum('facturas__monto_total', filter=Q(facturas__estado='pagada')),
+            )
+            .order_by('tipo')
+        )
+        por_tipo = {
+            fila['tipo']: {
+                'conceptos': fila['conceptos'],
+                'activos': fila['activos'],
+                'facturas': fila['facturas'],
+                'total_recaudado': fila['recaudado'] or Decimal('0.00'),
+            }
+            for fila in filas
+        }
+        resumen = {
+            'total_conceptos': sum(t['conceptos'] for t in por_tipo.values()),
+            'conceptos_activos': sum(t['activos'] for t in por_tipo.values()),
+            'total_facturas': sum(t['facturas'] for t in por_tipo.values()),
+            'total_recaudado': sum((t['total_recaudado'] for t in por_tipo.values()), Decimal('0.00')),
+            'por_tipo': por_tipo,
+            'calculado_en': timezone.now(),
+        }
+        cache.set(self.CACHE_KEY, resumen, REPORTS_CONFIG['concept_catalog_cache_seconds'])
+        return resumen
+    
+    def invalidar_resumen(self):
+        """Descartar el resumen al confirmar la transacción en curso (o de inmediato si no hay)"""
+        transaction.on_commit(lambda: cache.delete(self.CACHE_KEY))
 
 
 class InvoiceService:
     """Servicio para gestión de facturas"""
     
-    @transaction.atomic
+    def _get_conceptos(self, conceptos_ids: List[int]):
+        conceptos = list(ConceptoPago.objects.filter(
+            id__in=conceptos_ids,
+            activo=True
+        ))
+        if not conceptos:
+            raise Exception("No se encontraron conceptos válidos")
+        return conceptos
+    
+    def _get_viviendas(self, filtros: Dict = None):
+        """Viviendas activas según los filtros de facturación"""
+        from apps.residences.models import Vivienda
+        
+        viviendas = Vivienda.objects.filter(activo=True)
+        
+        if filtros:
+            if 'bloques' in filtros:
+                viviendas = viviendas.filter(bloque__in=filtros['bloques'])
+            if 'solo_ocupadas' in filtros and filtros['solo_ocupadas']:
+                viviendas = viviendas.exclude(usuario_propietario__isnull=True)
+            if 'excluir_morosos' in filtros and filtros['excluir_morosos']:
+                # Excluir viviendas con facturas vencidas
+                morosos = Factura.objects.filter(
+                    fecha_vencimiento__lt=timezone.now(),
+                    estado__in=['pendiente', 'parcialmente_pagada']
+                ).values_list('vivienda_id', flat=True)
+                viviendas = viviendas.exclude(id__in=morosos)
+        
+        return viviendas
+    
+    def _planificar(self, conceptos, viviendas, periodo: str) -> Dict[str, Any]:
+        """
+        Calcular en memoria las facturas que generaría una corrida
+        
+        Carga las viviendas y las facturas existentes del período una sola vez
+        y aplica el plan compilado de cada concepto sobre todas las viviendas.
+        
+        Returns:
+            Dict con filas de viviendas, facturas planificadas
+            (fila_vivienda, concepto, monto en centavos), omitidas y errores
+        """
+        filas = list(viviendas.values_list(
+            'id', 'identificador', 'metros_cuadrados', 'tipo', 'bloque'
+        ))
+        existentes = set(Factura.objects.filter(
+            periodo=periodo,
+            concepto__in=conceptos
+        ).values_list('vivienda_id', 'concepto_id'))
+        
+        facturas = []
+        errores = []
+        for concepto in conceptos:
+            try:
+                plan = compilar_plan(concepto)
+            except ValueError as e:
+                errores.append(f"Error en concepto {concepto.nombre}: {str(e)}")
+                continue
+            
+            calcular = plan.calcular_centavos
+            for fila in filas:
+                if (fila[0], concepto.pk) in existentes:
+                    continue
+                monto = calcular(fila[2], fila[3], fila[4])
+                if monto > 0:
+                    facturas.append((fila, concepto, monto))
+        
+        return {
+            'viviendas': filas,
+            'facturas': facturas,
+            'ya_facturadas': len(existentes),
+            'errores': errores,
+        }
+    
     def generate_bulk_invoices(self, conceptos_ids: List[int], periodo: str, 
                               fecha_vencimiento, filtros: Dict = None, 
-                              user=None) -> Dict[str, Any]:
+                              user=None, simular: bool = False) -> Dict[str, Any]:
         """
         Generar facturas masivas
         
@@ -365,89 +958,157 @@ class InvoiceService:
             fecha_vencimiento: Fecha de vencimiento
             filtros: Filtros para viviendas
             user: Usuario que genera las facturas
+            simular: Calcular la corrida en memoria sin escribir (ver simulate_bulk_invoices)
             
         Returns:
             Dict con resultado del proceso
         """
+        if simular:
+            return self.simulate_bulk_invoices(conceptos_ids, periodo, filtros)
+        
+        with transaction.atomic():
+            return self._generate_bulk_invoices(
+                conceptos_ids, periodo, fecha_vencimiento, filtros, user
+            )
+    
+    def _generate_bulk_invoices(self, conceptos_ids, periodo, fecha_vencimiento,
+                                filtros, user) -> Dict[str, Any]:
         try:
-            from apps.residences.models import Vivienda
+            conceptos = self._get_conceptos(conceptos_ids)
+            viviendas = self._get_viviendas(filtros)
+            plan = self._planificar(conceptos, viviendas, periodo)
             
-            # Obtener conceptos
-            conceptos = ConceptoPago.objects.filter(
-                id__in=conceptos_ids,
-                activo=True
-            )
+            # Numeración consecutiva calculada una sola vez para toda la corrida
+            year = timezone.now().year
+            secuencia = Factura.objects.filter(
+                numero_factura__startswith=f'FAC-{year}-'
+            ).count()
+            prefijo = f'FAC-{year}-{periodo.replace("-", "")}'
             
-            if not conceptos.exists():
-                raise Exception("No se encontraron conceptos válidos")
-            
-            # Obtener viviendas según filtros
-            viviendas = Vivienda.objects.filter(activo=True)
-            
-            if filtros:
-                if 'bloques' in filtros:
-                    viviendas = viviendas.filter(bloque__in=filtros['bloques'])
-                if 'solo_ocupadas' in filtros and filtros['solo_ocupadas']:
-                    viviendas = viviendas.exclude(usuario_propietario__isnull=True)
-                if 'excluir_morosos' in filtros and filtros['excluir_morosos']:
-                    # Excluir viviendas con facturas vencidas
-                    morosos = Factura.objects.filter(
-                        fecha_vencimiento__lt=timezone.now(),
-                        estado__in=['pendiente', 'parcialmente_pagada']
-                    ).values_list('vivienda_id', flat=True)
-                    viviendas = viviendas.exclude(id__in=morosos)
-            
-            facturas_creadas = 0
-            errores = []
-            
-            for vivienda in viviendas:
-                for concepto in conceptos:
-                    try:
-                        # Verificar si ya existe factura
-                        if Factura.objects.filter(
-                            vivienda=vivienda,
-                            concepto=concepto,
-                            periodo=periodo
-                        ).exists():
-                            continue
-                        
-                        # Calcular monto según criterios del concepto
-                        monto = self._calculate_invoice_amount(concepto, vivienda)
-                        
-                        if monto > 0:
-                            # Generar número de factura
-                            ultimo_numero = Factura.objects.filter(
-                                numero_factura__startswith=f'FAC-{timezone.now().year}-'
-                            ).count() + 1
-                            numero_factura = f'FAC-{timezone.now().year}-{periodo.replace("-", "")}-{ultimo_numero:06d}'
-                            
-                            Factura.objects.create(
-                                numero_factura=numero_factura,
-                                vivienda=vivienda,
-                                concepto=concepto,
-                                periodo=periodo,
-                                fecha_vencimiento=fecha_vencimiento,
-                                monto_original=monto,
-                                monto_total=monto,
-                                saldo_pendiente=monto,
-                                generada_por=user
-                            )
-                            facturas_creadas += 1
-                            
-                    except Exception as e:
-                        errores.append(f"Error en {vivienda.identificador}: {str(e)}")
+            nuevas = []
+            for fila, concepto, centavos in plan['facturas']:
+                secuencia += 1
+                monto = a_decimal(centavos)
+                nuevas.append(Factura(
+                    numero_factura=f'{prefijo}-{secuencia:06d}',
+                    vivienda_id=fila[0],
+                    concepto=concepto,
+                    periodo=periodo,
+                    fecha_vencimiento=fecha_vencimiento,
+                    monto_original=monto,
+                    monto_total=monto,
+                    saldo_pendiente=monto,
+                    generada_por=user
+                ))
+            
+            Factura.objects.bulk_create(
+                nuevas, batch_size=BILLING_CONFIG['bulk_billing_batch_size']
+            )
+            if nuevas:
+                concepto_service.invalidar_resumen()
             
             return {
-                'facturas_creadas': facturas_creadas,
-                'viviendas_procesadas': viviendas.count(),
-                'errores': errores,
-                'conceptos_aplicados': conceptos.count()
+                'facturas_creadas': len(nuevas),
+                'viviendas_procesadas': len(plan['viviendas']),
+                'errores': plan['errores'],
+                'conceptos_aplicados': len(conceptos)
             }
             
         except Exception as e:
             logger.error(f"Error generating bulk invoices: {str(e)}")
             raise Exception(f"Error generando facturas masivas: {str(e)}")
     
+    def simulate_bulk_invoices(self, conceptos_ids: List[int], periodo: str,
+                               filtros: Dict = None, tamano_muestra: int = 20) -> Dict[str, Any]:
+        """
+        Simular una facturación masiva en memoria sin escribir nada
+        
+        Calcula el conjunto completo de facturas de la corrida y lo agrega
+        por concepto, por bloque y por bloque × concepto.
+        
+        Args:
+            conceptos_ids: IDs de conceptos a facturar
+            periodo: Período en formato YYYY-MM
+            filtros: Filtros para viviendas
+            tamano_muestra: Número de facturas de ejemplo a devolver
+            
+        Returns:
+            Dict con totales proyectados, agregados y una muestra
+        """
+        conceptos = self._get_conceptos(conceptos_ids)
+        plan = self._planificar(conceptos, self._get_viviendas(filtros), periodo)
+        
+        # Acumulación en centavos enteros; conversión a Decimal solo al final
+        def _resumen():
+            return {'facturas': 0, 'total': 0, 'monto_minimo': None, 'monto_maximo': None}
+        
+        def _a_decimal(resumen):
+            for clave in ('total', 'monto_minimo', 'monto_maximo'):
+                if resumen.get(clave) is not None:
+                    resumen[clave] = a_decimal(resumen[clave])
+            return resumen
+        
+        def _acumular(resumen, monto):
+            resumen['facturas'] += 1
+            resumen['total'] += monto
+            if resumen['monto_minimo'] is None or monto < resumen['monto_minimo']:
+                resumen['monto_minimo'] = monto
+            if resumen['monto_maximo'] is None or monto > resumen['monto_maximo']:
+                resumen['monto_maximo'] = monto
+        
+        por_concepto = {
+            concepto.pk: {'concepto_id': concepto.pk, 'concepto': concepto.nombre, **_resumen()}
+            for concepto in conceptos
+        }
+        por_bloque = {}
+        por_bloque_concepto = {}
+        total = 0
+        
+        for fila, concepto, monto in plan['facturas']:
+            bloque = fila[4] or 'Sin bloque'
+            total += monto
+            _acumular(por_concepto[concepto.pk], monto)
+            if bloque not in por_bloque:
+                por_bloque[bloque] = {'bloque': bloque, **_resumen()}
+            _acumular(por_bloque[bloque], monto)
+            clave = (bloque, concepto.pk)
+            if clave not in por_bloque_concepto:
+                por_bloque_concepto[clave] = {
+                    'bloque': bloque, 'concepto_id': concepto.pk, 'concepto': concepto.nombre,
+                    'facturas': 0, 'total': 0
+                }
+            por_bloque_concepto[clave]['facturas'] += 1
+            por_bloque_concepto[clave]['total'] += monto
+        
+        # Muestra reproducible para un mismo período
+        facturas = plan['facturas']
+        muestra = random.Random(periodo).sample(facturas, min(tamano_muestra, len(facturas)))
+        
+        return {
+            'simulacion': True,
+            'periodo': periodo,
+            'viviendas_procesadas': len(plan['viviendas']),
+            'facturas_proyectadas': len(facturas),
+            'ya_facturadas': plan['ya_facturadas'],
+            'total_proyectado': a_decimal(total),
+            'por_concepto': [_a_decimal(r) for r in por_concepto.values()],
+            'por_bloque': sorted(
+                (_a_decimal(r) for r in por_bloque.values()), key=lambda r: r['bloque']
+            ),
+            'por_bloque_concepto': sorted(
+                (_a_decimal(r) for r in por_bloque_concepto.values()),
+                key=lambda r: (r['bloque'], r['concepto'])
+            ),
+            'muestra': [{
+                'vivienda_id': fila[0],
+                'vivienda': fila[1],
+                'bloque': fila[4],
+                'concepto': concepto.nombre,
+                'monto': a_decimal(monto),
+            } for fila, concepto, monto in muestra],
+            'errores': plan['errores'],
+        }
+    
     def _calculate_invoice_amount(self, concepto: ConceptoPago, vivienda) -> Decimal:
         """
         Calcular monto de factura según concepto y vivienda
@@ -459,25 +1120,186 @@ class InvoiceService:
         Returns:
             Monto calculado
         """
-        monto_base = concepto.valor_base
+        return compilar_plan(concepto).calcular(
+            vivienda.metros_cuadrados, vivienda.tipo, vivienda.bloque
+        )
+
+
+class BillingScheduler:
+    """Programador de facturación recurrente según ConceptoPago.frecuencia"""
+    
+    MESES_POR_FRECUENCIA = {
+        'mensual': 1,
+        'bimestral': 2,
+        'trimestral': 3,
+        'semestral': 6,
+        'anual': 12,
+    }
+    
+    # Una corrida en proceso más antigua que esto se considera abandonada
+    TIMEOUT_CORRIDA = timedelta(hours=1)
+    MAX_INTENTOS = 3
+    # Espera mínima entre reintentos de una corrida fallida
+    RETRASO_REINTENTO = timedelta(minutes=30)
+    
+    @staticmethod
+    def _periodo(anio: int, mes: int) -> str:
+        return f'{anio:04d}-{mes:02d}'
+    
+    @staticmethod
+    def _indice(periodo: str) -> int:
+        anio, mes = periodo.split('-')
+        return int(anio) * 12 + int(mes) - 1
+    
+    def periodos_vencidos(self, concepto: ConceptoPago, hasta: str,
+                          ultimo: Optional[str] = None, desde: Optional[str] = None) -> List[str]:
+        """
+        Períodos pendientes de facturar para un concepto
+        
+        Un concepto sin corridas empieza en `hasta` (el período actual): no se
+        generan facturas de meses pasados, que nacerían vencidas y con mora,
+        salvo que se pida explícitamente con `desde`.
+        
+        Args:
+            concepto: Concepto de pago
+            hasta: Último período a considerar (YYYY-MM)
+            ultimo: Último período ya encolado para el concepto
+            desde: Primer período a facturar si el concepto no tiene corridas
+            
+        Returns:
+            Lista de períodos YYYY-MM posteriores a `ultimo`
+        """
+        inicio = timezone.localtime(concepto.fecha_inicio or concepto.created_at)
+        indice_inicio = inicio.year * 12 + inicio.month - 1
+        paso = self.MESES_POR_FRECUENCIA.get(concepto.frecuencia, 1)
+        if ultimo is None:
+            piso = self._indice(desde or hasta)
+            if piso > indice_inicio:
+                # Primer período del ciclo del concepto que no es anterior al piso
+                indice_inicio += -(-(piso - indice_inicio) // paso) * paso
+        indice_hasta = self._indice(hasta)
+        if concepto.fecha_fin:
+            fin = timezone.localtime(concepto.fecha_fin)
+            indice_hasta = min(indice_hasta, fin.year * 12 + fin.month - 1)
+        
+        if concepto.frecuencia == 'unica':
+            if ultimo is None and indice_inicio <= indice_hasta:
+                return [self._periodo(indice_inicio // 12, indice_inicio % 12 + 1)]
+            return []
+        
+        if concepto.frecuencia not in self.MESES_POR_FRECUENCIA:
+            return []
+        
+        indice = indice_inicio
+        if ultimo is not None:
+            indice = self._indice(ultimo) + paso
+        
+        periodos = []
+        while indice <= indice_hasta:
+            periodos.append(self._periodo(indice // 12, indice % 12 + 1))
+            indice += paso
+        return periodos
+    
+    def encolar(self, hasta: Optional[str] = None, dry_run: bool = False,
+                desde: Optional[str] = None) -> List[CorridaFacturacion]:
+        """
+        Encolar las corridas pendientes de todos los conceptos activos
+        
+        Idempotente: solo crea corridas posteriores a la última registrada
+        por concepto y la restricción única (concepto, periodo) evita duplicados.
+        `desde` habilita facturar períodos pasados de conceptos sin corridas.
+        """
+        ahora = timezone.localtime()
+        hasta = hasta or self._periodo(ahora.year, ahora.month)
         
-        # Aplicar criterios específicos si existen
-        if concepto.criterios_aplicacion:
-            criterios = concepto.criterios_aplicacion
+        ultimos = dict(
+            CorridaFacturacion.objects.values('concepto_id')
+            .annotate(ultimo=Max('periodo'))
+            .values_list('concepto_id', 'ultimo')
+        )
+        
+        nuevas = []
+        conceptos = ConceptoPago.objects.filter(activo=True).exclude(
+            fecha_inicio__gt=ahora
+        )
+        for concepto in conceptos:
+            for periodo in self.periodos_vencidos(concepto, hasta, ultimos.get(concepto.pk), desde):
+                nuevas.append(CorridaFacturacion(concepto=concepto, periodo=periodo))
+        
+        if nuevas and not dry_run:
+            CorridaFacturacion.objects.bulk_create(nuevas, ignore_conflicts=True)
+        return nuevas
+    
+    def _reclamar(self) -> Optional[CorridaFacturacion]:
+        """Tomar la siguiente corrida pendiente sin bloquear a otros procesos"""
+        ahora = timezone.now()
+        limite = ahora - self.TIMEOUT_CORRIDA
+        with transaction.atomic():
+            corrida = (
+                CorridaFacturacion.objects
+                .select_for_update(skip_locked=True)
+                .filter(
+                    Q(estado='pendiente') |
+                    Q(estado='en_proceso', fecha_inicio__lt=limite) |
+                    Q(estado='fallida', intentos__lt=self.MAX_INTENTOS,
+                      fecha_fin__lt=ahora - self.RETRASO_REINTENTO)
+                )
+                .order_by('periodo', 'id')
+                .first()
+            )
+            if corrida is None:
+                return None
+            corrida.estado = 'en_proceso'
+            corrida.fecha_inicio = ahora
+            corrida.intentos += 1
+            corrida.save(update_fields=['estado', 'fecha_inicio', 'intentos', 'updated_at'])
+            return corrida
+    
+    def procesar(self, limite: Optional[int] = None, user=None) -> List[CorridaFacturacion]:
+        """
+        Ejecutar las corridas encoladas, una transacción por corrida
+        
+        Args:
+            limite: Máximo de corridas a ejecutar en esta invocación
+            user: Usuario registrado como generador de las facturas
+        """
+        procesadas = []
+        while limite is None or len(procesadas) < limite:
+            corrida = self._reclamar()
+            if corrida is None:
+                break
+            
+            anio, mes = corrida.periodo.split('-')
+            fecha_vencimiento = timezone.make_aware(
+                datetime(int(anio), int(mes), 1)
+            ) + timedelta(days=BILLING_CONFIG['default_due_days'])
             
-            # Ejemplo: aplicar según metros cuadrados
-            if 'por_metro_cuadrado' in criterios:
-                monto_base = vivienda.metros_cuadrados * Decimal(str(criterios['por_metro_cuadrado']))
+            try:
+                resultado = invoice_service.generate_bulk_invoices(
+                    conceptos_ids=[corrida.concepto_id],
+                    periodo=corrida.periodo,
+                    fecha_vencimiento=fecha_vencimiento,
+                    user=user
+                )
+                corrida.estado = 'completada'
+                corrida.facturas_creadas = resultado['facturas_creadas']
+                corrida.error = '\n'.join(resultado['errores'])
+            except Exception as e:
+                logger.error(f"Error en corrida {corrida.pk}: {str(e)}")
+                corrida.estado = 'fallida'
+                corrida.error = str(e)
             
-            # Ejemplo: aplicar según tipo de vivienda
-            if 'factor_tipo' in criterios and vivienda.tipo in criterios['factor_tipo']:
-                factor = Decimal(str(criterios['factor_tipo'][vivienda.tipo]))
-                monto_base *= factor
+            corrida.fecha_fin = timezone.now()
+            corrida.save(update_fields=['estado', 'facturas_creadas', 'error', 'fecha_fin', 'updated_at'])
+            procesadas.append(corrida)
         
-        return monto_base
+        return procesadas
 
 
 # Instancias globales de servicios
-payment_service = PaymentService()
+stripe_service = StripeService()
+payment_service = PaymentService(stripe_service)
 invoice_service = InvoiceService()
-stripe_service = StripeService()
\ No newline at end of file
+concepto_service = ConceptoService()
+checkout_service = CheckoutService(stripe_service)
+billing_scheduler = BillingScheduler()
@@ -0,0 +1,304 @@
+"""
+Estados de cuenta congelados para períodos cerrados
+Al cerrar un período se guarda por vivienda un snapshot JSON comprimido con
+sus facturas y pagos serializados, y un resumen del período para el dashboard.
+Las lecturas de períodos cerrados salen del snapshot; solo el período abierto
+se calcula en vivo.
+
+Cada snapshot guarda la versión de sus filas de origen (cantidad y último
+updated_at). Leerlo cuesta una agregación indexada en lugar de serializar las
+filas; si algo cambió después del cierre (p. ej. un pago tardío), el snapshot
+se reconstruye en ese momento.
+"""
+import hashlib
+import json
+import logging
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CierrePeriodo, EstadoCuentaSnapshot, Factura, Pago
+from .serializers import FacturaListSerializer, PagoListSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def comprimir(datos: Any) -> bytes:
+    return zlib.compress(json.dumps(datos, cls=DjangoJSONEncoder, separators=(',', ':')).encode(), 6)
+
+
+def descomprimir(datos: bytes) -> Any:
+    return json.loads(zlib.decompress(bytes(datos)))
+
+
+def rango_periodo(periodo: str) -> Tuple[datetime, datetime]:
+    """
+    Inicio (inclusive) y fin (exclusivo) del mes en la zona horaria local
+
+    Raises:
+        ValueError: si el período no tiene el formato YYYY-MM o el mes no existe
+    """
+    try:
+        anio, mes = (int(parte) for parte in periodo.split('-'))
+        inicio = timezone.make_aware(datetime(anio, mes, 1))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Período inválido: {periodo!r} (use YYYY-MM)")
+    if periodo != f'{anio:04d}-{mes:02d}':
+        raise ValueError(f"Período inválido: {periodo!r} (use YYYY-MM)")
+    fin = timezone.make_aware(datetime(anio + mes // 12, mes % 12 + 1, 1))
+    return inicio, fin
+
+
+def _version(facturas: Tuple[int, Any], pagos: Tuple[int, Any]) -> str:
+    return hashlib.md5(f'{facturas[0]}:{facturas[1]}|{pagos[0]}:{pagos[1]}'.encode()).hexdigest()
+
+
+SIN_FILAS = (0, None)
+
+
+class StatementService:
+    """Servicio de cierre de períodos y lectura de estados de cuenta"""
+
+    def periodo_abierto(self) -> str:
+        return timezone.localdate().strftime('%Y-%m')
+
+    def periodos_cerrados(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> List[str]:
+        cierres = CierrePeriodo.objects.filter(activo=True)
+        if desde:
+            cierres = cierres.filter(periodo__gte=desde)
+        if hasta:
+            cierres = cierres.filter(periodo__lte=hasta)
+        return sorted(cierres.values_list('periodo', flat=True))
+
+    # ------------------ Versiones de origen ------------------
+
+    def pagos_de_periodos(self, periodos: Iterable[str]) -> Q:
+        """Filtro de pagos cuya fecha cae en alguno de los períodos"""
+        filtro = Q(pk__in=[])
+        for periodo in periodos:
+            inicio, fin = rango_periodo(periodo)
+            filtro |= Q(fecha_pago__gte=inicio, fecha_pago__lt=fin)
+        return filtro
+
+    def versiones(self, periodos: List[str], vivienda_id: Optional[int] = None) -> Dict[Tuple[int, str], str]:
+        """
+        Versión de facturas y pagos por (vivienda, período) en dos consultas agregadas
+
+        Los pagos se versionan en cualquier estado: confirmar uno cambia su updated_at.
+        """
+        facturas = Factura.objects.filter(periodo__in=periodos)
+        pagos = Pago.objects.filter(self.pagos_de_periodos(periodos))
+        if vivienda_id is not None:
+            facturas = facturas.filter(vivienda_id=vivienda_id)
+            pagos = pagos.filter(vivienda_id=vivienda_id)
+
+        origen: Dict[Tuple[int, str], List[Tuple[int, Any]]] = {}
+        for fila in facturas.values('vivienda_id', 'periodo').annotate(
+            n=Count('id'), u=Max('updated_at')
+        ).order_by():
+            origen[(fila['vivienda_id'], fila['periodo'])] = [(fila['n'], fila['u']), SIN_FILAS]
+        for fila in pagos.annotate(mes=TruncMonth('fecha_pago')).values('vivienda_id', 'mes').annotate(
+            n=Count('id'), u=Max('updated_at')
+        ).order_by():
+            clave = (fila['vivienda_id'], timezone.localtime(fila['mes']).strftime('%Y-%m'))
+            origen.setdefault(clave, [SIN_FILAS, SIN_FILAS])[1] = (fila['n'], fila['u'])
+        return {clave: _version(*partes) for clave, partes in origen.items()}
+
+    def version_periodo(self, periodo: str) -> str:
+        """Versión de todas las facturas y pagos del período (para el resumen del dashboard)"""
+        facturas = Factura.objects.filter(periodo=periodo).aggregate(n=Count('id'), u=Max('updated_at'))
+        pagos = Pago.objects.filter(self.pagos_de_periodos([periodo])).aggregate(n=Count('id'), u=Max('updated_at'))
+        return _version((facturas['n'], facturas['u']), (pagos['n'], pagos['u']))
+
+    # ------------------ Construcción de snapshots ------------------
+
+    def construir(self, periodo: str, cierre: CierrePeriodo,
+                  vivienda_id: Optional[int] = None) -> List[EstadoCuentaSnapshot]:
+        """Serializar facturas y pagos confirmados del período agrupados por vivienda"""
+        inicio, fin = rango_periodo(periodo)
+        facturas = Factura.objects.filter(periodo=periodo).select_related(
+            'vivienda__usuario_propietario', 'concepto'
+        )
+        pagos = Pago.objects.filter(
+            estado='confirmado', fecha_pago__gte=inicio, fecha_pago__lt=fin
+        ).select_related('vivienda__usuario_propietario', 'metodo_pago', 'registrado_por')
+        if vivienda_id is not None:
+            facturas = facturas.filter(vivienda_id=vivienda_id)
+            pagos = pagos.filter(vivienda_id=vivienda_id)
+
+        # Versión antes de leer las filas: un cambio concurrente deja el snapshot viejo, no al revés
+        versiones = self.versiones([periodo], vivienda_id)
+
+        por_vivienda: Dict[int, Dict[str, list]] = {}
+        for fila in FacturaListSerializer(facturas.order_by('-fecha_generacion'), many=True).data:
+            por_vivienda.setdefault(fila['vivienda']['id'], {'facturas': [], 'pagos': []})['facturas'].append(fila)
+        for fila in PagoListSerializer(pagos.order_by('-fecha_pago'), many=True).data:
+            por_vivienda.setdefault(fila['vivienda']['id'], {'facturas': [], 'pagos': []})['pagos'].append(fila)
+
+        snapshots = []
+        for vid, datos in por_vivienda.items():
+            snapshots.append(EstadoCuentaSnapshot(
+                cierre=cierre,
+                vivienda_id=vid,
+                periodo=periodo,
+                datos=comprimir(datos),
+                version=versiones.get((vid, periodo), _version(SIN_FILAS, SIN_FILAS)),
+                facturas=len(datos['facturas']),
+                pagos=len(datos['pagos']),
+                facturado=sum((Decimal(f['monto_total']) for f in datos['facturas']), Decimal('0.00')),
+                pagado=sum((Decimal(p['monto_total']) for p in datos['pagos']), Decimal('0.00')),
+                saldo=sum(
+                    (Decimal(f['saldo_pendiente']) for f in datos['facturas'] if f['estado'] != 'pagada'),
+                    Decimal('0.00')
+                ),
+            ))
+        return snapshots
+
+    def _guardar(self, snapshots: List[EstadoCuentaSnapshot]):
+        EstadoCuentaSnapshot.objects.bulk_create(
+            snapshots,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['vivienda', 'periodo'],
+            update_fields=[
+                'cierre', 'datos', 'version', 'facturas', 'pagos',
+                'facturado', 'pagado', 'saldo', 'updated_at',
+            ],
+        )
+
+    def cerrar(self, periodo: str, usuario=None, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Cerrar un período y congelar los estados de cuenta de todas sus viviendas
+
+        Volver a cerrar un período ya cerrado regenera sus snapshots.
+
+        Raises:
+            ValueError: si el período es inválido o no es anterior al período abierto
+        """
+        rango_periodo(periodo)
+        if periodo >= self.periodo_abierto():
+            raise ValueError(f"Solo se pueden cerrar períodos anteriores a {self.periodo_abierto()}")
+
+        with transaction.atomic():
+            cierre = CierrePeriodo.objects.select_for_update().filter(periodo=periodo).first()
+            if cierre is None:
+                cierre = CierrePeriodo(periodo=periodo)
+            cierre.cerrado_en = timezone.now()
+            cierre.cerrado_por = usuario
+            cierre.activo = True
+            if not dry_run:
+                cierre.save()
+
+            snapshots = self.construir(periodo, cierre)
+            cierre.viviendas = len(snapshots)
+            if not dry_run:
+                EstadoCuentaSnapshot.objects.filter(periodo=periodo).exclude(
+                    vivienda_id__in=[s.vivienda_id for s in snapshots]
+                ).delete()
+                self._guardar(snapshots)
+                cierre.resumen = None
+                cierre.resumen_version = ''
+                cierre.save(update_fields=['viviendas', 'resumen', 'resumen_version', 'updated_at'])
+
+        logger.info(f"Cierre de período {periodo}: {len(snapshots)} estados de cuenta")
+        return {
+            'periodo': periodo,
+            'viviendas': len(snapshots),
+            'bytes': sum(len(s.datos) for s in snapshots),
+            'facturas': sum(s.facturas for s in snapshots),
+            'pagos': sum(s.pagos for s in snapshots),
+        }
+
+    def reabrir(self, periodo: str) -> int:
+        """
+        Reabrir un período: sus lecturas vuelven a calcularse en vivo
+
+        Raises:
+            ValueError: si el período es inválido
+        """
+        rango_periodo(periodo)
+        with transaction.atomic():
+            borrados, _ = EstadoCuentaSnapshot.objects.filter(periodo=periodo).delete()
+            CierrePeriodo.objects.filter(periodo=periodo).update(
+                activo=False, resumen=None, resumen_version='', updated_at=timezone.now()
+            )
+        return borrados
+
+    # ------------------ Lectura ------------------
+
+    def leer(self, vivienda_id: int, periodos: List[str]) -> Dict[str, Dict[str, list]]:
+        """
+        Facturas y pagos de una vivienda en períodos cerrados
+
+        Los snapshots desactualizados se reconstruyen y guardan antes de devolverlos.
+        """
+        if not periodos:
+            return {}
+        snapshots = {
+            s.periodo: s for s in EstadoCuentaSnapshot.objects.filter(
+                vivienda_id=vivienda_id, periodo__in=periodos
+            ).only('periodo', 'datos', 'version')
+        }
+        versiones = self.versiones(periodos, vivienda_id)
+        vacia = _version(SIN_FILAS, SIN_FILAS)
+
+        resultado = {}
+        for periodo in periodos:
+            version = versiones.get((vivienda_id, periodo), vacia)
+            snapshot = snapshots.get(periodo)
+            if snapshot is None and version == vacia:
+                continue
+            if snapshot is None or snapshot.version != version:
+                cierre = CierrePeriodo.objects.get(periodo=periodo)
+                nuevos = self.construir(periodo, cierre, vivienda_id)
+                if nuevos:
+                    self._guardar(nuevos)
+                    snapshot = nuevos[0]
+                else:
+                    EstadoCuentaSnapshot.objects.filter(vivienda_id=vivienda_id, periodo=periodo).delete()
+                    continue
+                logger.info(f"Snapshot de estado de cuenta {vivienda_id} {periodo} reconstruido")
+            resultado[periodo] = descomprimir(snapshot.datos)
+
+        # dias_vencido depende de la fecha de consulta, no del cierre
+        ahora = timezone.now()
+        for datos in resultado.values():
+            for factura in datos['facturas']:
+                vencimiento = parse_datetime(factura['fecha_vencimiento'])
+                factura['dias_vencido'] = (ahora - vencimiento).days if vencimiento and vencimiento < ahora else 0
+        return resultado
+
+    def resumen_periodo(self, periodo: str, calcular: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Resumen del período para el dashboard: congelado si el período está cerrado
+
+        Args:
+            calcular: Función que calcula el resumen en vivo
+        """
+        cierre = CierrePeriodo.objects.filter(periodo=periodo, activo=True).only(
+            'id', 'resumen', 'resumen_version'
+        ).first()
+        if cierre is None:
+            return calcular(periodo)
+
+        version = self.version_periodo(periodo)
+        if cierre.resumen is not None and cierre.resumen_version == version:
+            return descomprimir(cierre.resumen)
+
+        resumen = calcular(periodo)
+        cierre.resumen = comprimir(resumen)
+        cierre.resumen_version = version
+        cierre.save(update_fields=['resumen', 'resumen_version', 'updated_at'])
+        return json.loads(json.dumps(resumen, cls=DjangoJSONEncoder))
+
+
+# Instancia global del servicio
+statement_service = StatementService()
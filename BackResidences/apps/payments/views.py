@@ -7,15 +7,19 @@ from decimal import Decimal
 from datetime import datetime, timedelta
 from typing import TYPE_CHECKING, Type, Any, Dict, Union
 from django.utils import timezone
-from django.db.models import Q, Sum, Count
-from django.http import JsonResponse
+from django.db.models import Q, Sum, Count, Min, Max, OuterRef, Subquery
+from django.contrib.postgres.aggregates import BoolOr
+from django.http import JsonResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 
 if TYPE_CHECKING:
@@ -24,7 +28,7 @@ if TYPE_CHECKING:
 from apps.residences.models import Vivienda
 from .models import (
     ConceptoPago, MetodoPago, Factura, Pago, PagoFactura, PazYSalvo,
-    TipoPago, Deuda, DetalleDeuda
+    ProyeccionRecaudo, SesionCheckout, TipoPago, Deuda, DetalleDeuda
 )
 from .serializers import (
     # Conceptos de Pago
@@ -38,17 +42,34 @@ from .serializers import (
     # Paz y Salvo
     PazYSalvoSerializer, PazYSalvoCreateSerializer,
     # Reportes
-    DashboardFinancieroSerializer, EstadoCuentaSerializer,
+    DashboardFinancieroSerializer, EstadoCuentaSerializer, ProyeccionRecaudoSerializer,
     # Stripe
     StripePaymentIntentSerializer, StripeWebhookSerializer,
+    CheckoutCreateSerializer, SesionCheckoutSerializer,
     # Legacy
     TipoPagoSerializer, DeudaSerializer, DetalleDeudaSerializer
 )
-from .services import payment_service, invoice_service, stripe_service
+from .services import (
+    payment_service, invoice_service, stripe_service, checkout_service, concepto_service,
+    ConflictoCheckout
+)
+from .statements import statement_service
+from .documents import document_service, contexto_factura, contexto_paz_y_salvo
 
 logger = logging.getLogger(__name__)
 
 
+def _decimales_a_str(valor):
+    """Convertir recursivamente los Decimal de una respuesta a str"""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, dict):
+        return {k: _decimales_a_str(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_decimales_a_str(v) for v in valor]
+    return valor
+
+
 class StandardResultsSetPagination(PageNumberPagination):
     """Paginación estándar para el módulo de pagos"""
     page_size = 20
@@ -66,15 +87,49 @@ class ConceptoPagoViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['tipo', 'activo', 'es_obligatorio', 'frecuencia']
     search_fields = ['nombre', 'descripcion']
-    ordering_fields = ['nombre', 'valor_base', 'fecha_creacion']
+    ordering_fields = ['nombre', 'valor_base', 'created_at', 'num_facturas', 'monto_recaudado']
     ordering = ['nombre']
     
+    def get_queryset(self):
+        """Listado y detalle con estadísticas anotadas (sin una consulta por concepto)"""
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_stats()
+        return queryset
+    
     def get_serializer_class(self) -> Type['Serializer']:  # type: ignore
         if self.action == 'list':
             return ConceptoPagoListSerializer
         elif self.action == 'create':
             return ConceptoPagoCreateSerializer
         return ConceptoPagoDetailSerializer
+    
+    def perform_create(self, serializer):
+        serializer.save()
+        concepto_service.invalidar_resumen()
+    
+    def perform_update(self, serializer):
+        serializer.save()
+        concepto_service.invalidar_resumen()
+    
+    def perform_destroy(self, instance):
+        instance.delete()
+        concepto_service.invalidar_resumen()
+    
+    @action(detail=False, methods=['get'])
+    def resumen(self, request):
+        """Totales del catálogo de conceptos por tipo (cacheado)"""
+        try:
+            return Response({
+                'success': True,
+                'data': concepto_service.resumen_catalogo()
+            })
+        except Exception as e:
+            logger.error(f"Error en resumen de conceptos: {str(e)}")
+            return Response({
+                'success': False,
+                'message': f'Error en resumen de conceptos: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 # ================== MÉTODOS DE PAGO ==================
@@ -108,6 +163,18 @@ class FacturaViewSet(viewsets.ModelViewSet):
             return FacturaCreateSerializer
         return FacturaDetailSerializer
     
+    def perform_create(self, serializer):
+        serializer.save()
+        concepto_service.invalidar_resumen()
+    
+    def perform_update(self, serializer):
+        serializer.save()
+        concepto_service.invalidar_resumen()
+    
+    def perform_destroy(self, instance):
+        instance.delete()
+        concepto_service.invalidar_resumen()
+    
     def get_queryset(self):
         """Filtrar facturas según usuario"""
         queryset = super().get_queryset()
@@ -151,13 +218,28 @@ class FacturaViewSet(viewsets.ModelViewSet):
             periodo = request.data.get('periodo')
             fecha_vencimiento = request.data.get('fecha_vencimiento')
             filtros = request.data.get('filtros', {})
+            simular = str(request.data.get('simular', False)).lower() == 'true'
             
-            if not conceptos or not periodo or not fecha_vencimiento:
+            if not conceptos or not periodo or (not fecha_vencimiento and not simular):
                 return Response({
                     'success': False,
                     'message': 'Faltan datos requeridos'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
+            if simular:
+                resultado = invoice_service.generate_bulk_invoices(
+                    conceptos_ids=conceptos,
+                    periodo=periodo,
+                    fecha_vencimiento=fecha_vencimiento,
+                    filtros=filtros,
+                    simular=True
+                )
+                return Response({
+                    'success': True,
+                    'message': 'Simulación de facturación masiva (no se generaron facturas)',
+                    'data': _decimales_a_str(resultado)
+                })
+            
             resultado = invoice_service.generate_bulk_invoices(
                 conceptos_ids=conceptos,
                 periodo=periodo,
@@ -186,6 +268,22 @@ class FacturaViewSet(viewsets.ModelViewSet):
                 'success': False,
                 'message': f'Error en facturación masiva: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=True, methods=['get'])
+    def pdf(self, request, pk=None):
+        """Descargar el PDF de la factura"""
+        # get_object() responde 404 por su cuenta; solo la generación se captura
+        factura = self.get_object()
+        try:
+            return document_service.pdf_response(
+                request, factura, contexto_factura, f'{factura.numero_factura}.pdf'
+            )
+        except Exception as e:
+            logger.error(f"Error generando PDF de factura: {str(e)}")
+            return Response({
+                'success': False,
+                'message': f'Error generando PDF: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 # ================== PAGOS ==================
@@ -245,6 +343,9 @@ class PagoViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
             
+            # Las facturas retenidas por un checkout solo se pagan por ese checkout
+            checkout_service.verificar_libres(serializer.validated_data.get('facturas', []))  # type: ignore
+            
             # Crear pago usando el servicio
             pago = payment_service.create_payment_with_stripe(
                 serializer.validated_data,
@@ -264,6 +365,11 @@ class PagoViewSet(viewsets.ModelViewSet):
                 'data': response_data
             }, status=status.HTTP_201_CREATED)
             
+        except ConflictoCheckout as e:
+            return Response({
+                'success': False,
+                'message': str(e)
+            }, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             logger.error(f"Error creando pago: {str(e)}")
             return Response({
@@ -284,6 +390,8 @@ class PagoViewSet(viewsets.ModelViewSet):
                     'message': 'Debe especificar distribuciones'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
+            checkout_service.verificar_libres(dist['factura_id'] for dist in distribuciones)
+            
             facturas_actualizadas = []
             monto_aplicado_total = Decimal('0.00')
             
@@ -317,6 +425,8 @@ class PagoViewSet(viewsets.ModelViewSet):
                     'estado': factura.estado
                 })
             
+            concepto_service.invalidar_resumen()
+            
             return Response({
                 'success': True,
                 'message': 'Pago aplicado a facturas exitosamente',
@@ -327,6 +437,11 @@ class PagoViewSet(viewsets.ModelViewSet):
                 }
             })
             
+        except ConflictoCheckout as e:
+            return Response({
+                'success': False,
+                'message': str(e)
+            }, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             logger.error(f"Error aplicando pago: {str(e)}")
             return Response({
@@ -381,6 +496,7 @@ class PagoViewSet(viewsets.ModelViewSet):
             pago.fecha_reverso = timezone.now()
             pago.motivo_reverso = request.data.get('motivo', '')
             pago.save()
+            concepto_service.invalidar_resumen()
             
             return Response({
                 'success': True,
@@ -448,6 +564,22 @@ class PazYSalvoViewSet(viewsets.ModelViewSet):
                 'message': f'Error generando paz y salvo: {str(e)}'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'])
+    def pdf(self, request, pk=None):
+        """Descargar el PDF del paz y salvo"""
+        # get_object() responde 404 por su cuenta; solo la generación se captura
+        paz_y_salvo = self.get_object()
+        try:
+            return document_service.pdf_response(
+                request, paz_y_salvo, contexto_paz_y_salvo, f'{paz_y_salvo.numero_documento}.pdf'
+            )
+        except Exception as e:
+            logger.error(f"Error generando PDF de paz y salvo: {str(e)}")
+            return Response({
+                'success': False,
+                'message': f'Error generando PDF: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 
 # ================== REPORTES ==================
 
@@ -455,63 +587,64 @@ class ReportesFinancierosViewSet(viewsets.ViewSet):
     """ViewSet para reportes financieros"""
     permission_classes = [IsAuthenticated]
     
+    def _resumen_periodo(self, periodo: str) -> Dict[str, Any]:
+        """Resumen, recaudo por concepto y por método de un período, calculados en vivo"""
+        datos = payment_service.generate_payment_reports(periodo)
+        
+        # Agregar datos adicionales del dashboard
+        year, month = periodo.split('-')
+        
+        # Recaudo por concepto
+        conceptos_recaudo = []
+        for concepto in ConceptoPago.objects.filter(activo=True):
+            facturas = Factura.objects.filter(
+                concepto=concepto,
+                periodo=periodo
+            )
+            pagos = Pago.objects.filter(
+                fecha_pago__year=year,
+                fecha_pago__month=month,
+                estado='confirmado',
+                pagofactura__factura__concepto=concepto
+            ).distinct()
+            
+            facturado = sum(f.monto_total for f in facturas)
+            recaudado = sum(p.monto_total for p in pagos)
+            
+            if facturado > 0:
+                conceptos_recaudo.append({
+                    'concepto': concepto.nombre,
+                    'facturado': str(facturado),
+                    'recaudado': str(recaudado),
+                    'porcentaje': round((recaudado / facturado * 100), 2)
+                })
+        
+        # Recaudo por método (una consulta agrupada)
+        estadisticas = payment_service.payment_method_stats(periodo, meses=1)
+        metodos_recaudo = [
+            {
+                'metodo': m['metodo'],
+                'cantidad': m['cantidad'],
+                'monto': str(m['monto']),
+                'porcentaje': m['porcentaje']
+            }
+            for m in estadisticas['metodos'] if m['cantidad'] > 0
+        ]
+        
+        return {
+            'resumen': datos,
+            'recaudo_por_concepto': conceptos_recaudo,
+            'recaudo_por_metodo': metodos_recaudo
+        }
+    
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Dashboard financiero"""
         try:
             periodo = request.query_params.get('periodo', timezone.now().strftime('%Y-%m'))
             
-            datos = payment_service.generate_payment_reports(periodo)
-            
-            # Agregar datos adicionales del dashboard
-            year, month = periodo.split('-')
-            
-            # Recaudo por concepto
-            conceptos_recaudo = []
-            for concepto in ConceptoPago.objects.filter(activo=True):
-                facturas = Factura.objects.filter(
-                    concepto=concepto,
-                    periodo=periodo
-                )
-                pagos = Pago.objects.filter(
-                    fecha_pago__year=year,
-                    fecha_pago__month=month,
-                    estado='confirmado',
-                    pagofactura__factura__concepto=concepto
-                ).distinct()
-                
-                facturado = sum(f.monto_total for f in facturas)
-                recaudado = sum(p.monto_total for p in pagos)
-                
-                if facturado > 0:
-                    conceptos_recaudo.append({
-                        'concepto': concepto.nombre,
-                        'facturado': str(facturado),
-                        'recaudado': str(recaudado),
-                        'porcentaje': round((recaudado / facturado * 100), 2)
-                    })
-            
-            # Recaudo por método
-            metodos_recaudo = []
-            for metodo in MetodoPago.objects.filter(activo=True):
-                pagos = Pago.objects.filter(
-                    fecha_pago__year=year,
-                    fecha_pago__month=month,
-                    metodo_pago=metodo,
-                    estado='confirmado'
-                )
-                
-                if pagos.exists():
-                    cantidad = pagos.count()
-                    monto = sum(p.monto_total for p in pagos)
-                    porcentaje = (monto / datos['total_recaudado'] * 100) if datos['total_recaudado'] > 0 else 0
-                    
-                    metodos_recaudo.append({
-                        'metodo': metodo.nombre,
-                        'cantidad': cantidad,
-                        'monto': str(monto),
-                        'porcentaje': round(porcentaje, 2)
-                    })
+            # Períodos cerrados: resumen congelado al cierre (ver statements.py)
+            del_periodo = statement_service.resumen_periodo(periodo, self._resumen_periodo)
             
             # Datos de morosidad
             facturas_vencidas = Factura.objects.filter(
@@ -525,9 +658,9 @@ class ReportesFinancierosViewSet(viewsets.ViewSet):
             
             response_data = {
                 'periodo': periodo,
-                'resumen': datos,
-                'recaudo_por_concepto': conceptos_recaudo,
-                'recaudo_por_metodo': metodos_recaudo,
+                'resumen': del_periodo['resumen'],
+                'recaudo_por_concepto': del_periodo['recaudo_por_concepto'],
+                'recaudo_por_metodo': del_periodo['recaudo_por_metodo'],
                 'morosidad': {
                     'viviendas_morosas': viviendas_morosas,
                     'deuda_total': str(deuda_total),
@@ -548,6 +681,82 @@ class ReportesFinancierosViewSet(viewsets.ViewSet):
                 'message': f'Error generando dashboard: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @action(detail=False, methods=['get'], url_path='metodos-pago')
+    def metodos_pago(self, request):
+        """Recaudo, comisiones y tendencia mensual por método de pago"""
+        try:
+            periodo = request.query_params.get('periodo', timezone.now().strftime('%Y-%m'))
+            meses = int(request.query_params.get('meses', 6))
+            
+            if not 1 <= meses <= 36:
+                return Response({
+                    'success': False,
+                    'message': 'El parámetro meses debe estar entre 1 y 36'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            datos = payment_service.payment_method_stats(periodo, meses=meses)
+            
+            return Response({
+                'success': True,
+                'data': _decimales_a_str(datos)
+            })
+            
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'Parámetros inválidos (periodo YYYY-MM, meses entero)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error en estadísticas por método de pago: {str(e)}")
+            return Response({
+                'success': False,
+                'message': f'Error generando estadísticas: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=False, methods=['get'])
+    def proyecciones(self, request):
+        """Proyección precalculada de la tasa de recaudo por concepto y bloque"""
+        try:
+            proyecciones = ProyeccionRecaudo.objects.select_related('concepto')
+            
+            periodo = request.query_params.get('periodo')
+            if not periodo:
+                periodo = proyecciones.aggregate(ultimo=Max('periodo'))['ultimo']
+            proyecciones = proyecciones.filter(periodo=periodo)
+            
+            concepto = request.query_params.get('concepto')
+            if concepto:
+                proyecciones = proyecciones.filter(concepto_id=concepto)
+            
+            bloque = request.query_params.get('bloque')
+            if bloque is not None:
+                proyecciones = proyecciones.filter(bloque=bloque)
+            
+            totales = proyecciones.aggregate(
+                facturado=Sum('facturado_proyectado'),
+                recaudo=Sum('recaudo_proyectado')
+            )
+            facturado = totales['facturado'] or Decimal('0.00')
+            recaudo = totales['recaudo'] or Decimal('0.00')
+            
+            return Response({
+                'success': True,
+                'data': {
+                    'periodo': periodo,
+                    'facturado_proyectado': str(facturado),
+                    'recaudo_proyectado': str(recaudo),
+                    'tasa_recaudo': str(round(recaudo / facturado * 100, 2)) if facturado > 0 else '0.00',
+                    'proyecciones': ProyeccionRecaudoSerializer(proyecciones, many=True).data
+                }
+            })
+            
+        except Exception as e:
+            logger.error(f"Error consultando proyecciones de recaudo: {str(e)}")
+            return Response({
+                'success': False,
+                'message': f'Error consultando proyecciones: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
     @action(detail=False, methods=['get'], url_path='estado-cuenta/(?P<vivienda_id>[^/.]+)')
     def estado_cuenta(self, request, vivienda_id=None):
         """Estado de cuenta por vivienda"""
@@ -559,23 +768,37 @@ class ReportesFinancierosViewSet(viewsets.ViewSet):
             periodo_hasta = request.query_params.get('periodo_hasta')
             incluir_pagadas = request.query_params.get('incluir_pagadas', 'true').lower() == 'true'
             
+            # Períodos cerrados desde snapshots; el resto se calcula en vivo
+            cerrados = statement_service.periodos_cerrados(periodo_desde, periodo_hasta)
+            congelados = statement_service.leer(vivienda.pk, cerrados)
+            
             # Obtener facturas
-            facturas = Factura.objects.filter(vivienda=vivienda)
+            facturas = Factura.objects.filter(vivienda=vivienda).exclude(
+                periodo__in=cerrados
+            ).select_related('vivienda__usuario_propietario', 'concepto')
             
             if periodo_desde:
                 facturas = facturas.filter(periodo__gte=periodo_desde)
             if periodo_hasta:
                 facturas = facturas.filter(periodo__lte=periodo_hasta)
+            
+            filas_facturas = list(FacturaListSerializer(facturas, many=True).data)
+            for datos in congelados.values():
+                filas_facturas.extend(datos['facturas'])
             if not incluir_pagadas:
-                facturas = facturas.exclude(estado='pagada')
+                filas_facturas = [f for f in filas_facturas if f['estado'] != 'pagada']
+            filas_facturas.sort(key=lambda f: f['fecha_generacion'], reverse=True)
             
             # Calcular resumen
-            saldo_total = sum(f.saldo_pendiente for f in facturas.exclude(estado='pagada'))
-            facturas_pendientes = facturas.exclude(estado='pagada').count()
-            facturas_vencidas = facturas.filter(
-                fecha_vencimiento__lt=timezone.now(),
-                estado__in=['pendiente', 'parcialmente_pagada']
-            ).count()
+            ahora = timezone.now()
+            por_pagar = [f for f in filas_facturas if f['estado'] != 'pagada']
+            saldo_total = sum((Decimal(f['saldo_pendiente']) for f in por_pagar), Decimal('0.00'))
+            facturas_pendientes = len(por_pagar)
+            facturas_vencidas = sum(
+                1 for f in por_pagar
+                if f['estado'] in ('pendiente', 'parcialmente_pagada')
+                and parse_datetime(f['fecha_vencimiento']) < ahora
+            )
             
             # Último pago
             ultimo_pago = Pago.objects.filter(
@@ -591,7 +814,9 @@ class ReportesFinancierosViewSet(viewsets.ViewSet):
             ).aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
             
             # Obtener pagos
-            pagos = Pago.objects.filter(vivienda=vivienda, estado='confirmado')
+            pagos = Pago.objects.filter(vivienda=vivienda, estado='confirmado').exclude(
+                statement_service.pagos_de_periodos(cerrados)
+            ).select_related('vivienda__usuario_propietario', 'metodo_pago', 'registrado_por')
             if periodo_desde and periodo_hasta:
                 # Convertir período a fechas
                 fecha_desde = datetime.strptime(periodo_desde + '-01', '%Y-%m-%d')
@@ -601,6 +826,11 @@ class ReportesFinancierosViewSet(viewsets.ViewSet):
                 
                 pagos = pagos.filter(fecha_pago__range=[fecha_desde, fecha_hasta])
             
+            filas_pagos = list(PagoListSerializer(pagos, many=True).data)
+            for datos in congelados.values():
+                filas_pagos.extend(datos['pagos'])
+            filas_pagos.sort(key=lambda p: p['fecha_pago'], reverse=True)
+            
             response_data = {
                 'vivienda': {
                     'id': vivienda.pk,
@@ -617,8 +847,9 @@ class ReportesFinancierosViewSet(viewsets.ViewSet):
                     'ultimo_pago': ultimo_pago.fecha_pago if ultimo_pago else None,
                     'total_pagado_ano': str(total_pagado_ano)
                 },
-                'facturas': FacturaListSerializer(facturas.order_by('-fecha_generacion'), many=True).data,
-                'pagos': PagoListSerializer(pagos.order_by('-fecha_pago'), many=True).data
+                'facturas': filas_facturas,
+                'pagos': filas_pagos,
+                'periodos_cerrados': sorted(congelados)
             }
             
             return Response({
@@ -665,6 +896,14 @@ class StripeViewSet(viewsets.ViewSet):
                     'message': 'No se encontraron facturas válidas'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
+            try:
+                checkout_service.verificar_libres(facturas_ids)
+            except ConflictoCheckout as e:
+                return Response({
+                    'success': False,
+                    'message': str(e)
+                }, status=status.HTTP_409_CONFLICT)
+            
             # Crear PaymentIntent
             metadata = {
                 'facturas': ','.join(map(str, facturas_ids)),
@@ -699,10 +938,72 @@ class StripeViewSet(viewsets.ViewSet):
                 'message': f'Error creando PaymentIntent: {str(e)}'
             }, status=status.HTTP_400_BAD_REQUEST)
     
-    @method_decorator(csrf_exempt)
     @action(detail=False, methods=['post'])
+    def checkout(self, request):
+        """Reservar facturas y crear el PaymentIntent por su saldo exacto"""
+        serializer = CheckoutCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            sesion = checkout_service.crear_sesion(
+                request.user,
+                serializer.validated_data['facturas']  # type: ignore
+            )
+            
+            return Response({
+                'success': True,
+                'message': 'Facturas reservadas hasta completar el pago',
+                'data': SesionCheckoutSerializer(sesion).data
+            }, status=status.HTTP_201_CREATED)
+            
+        except ConflictoCheckout as e:
+            return Response({
+                'success': False,
+                'message': str(e)
+            }, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({
+                'success': False,
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error creando checkout: {str(e)}")
+            return Response({
+                'success': False,
+                'message': f'Error creando checkout: {str(e)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'], url_path='checkout/(?P<sesion_id>[^/.]+)/cancelar')
+    def cancelar_checkout(self, request, sesion_id=None):
+        """Cancelar una sesión de checkout y liberar sus facturas"""
+        sesiones = SesionCheckout.objects.all()
+        if not request.user.is_staff:
+            sesiones = sesiones.filter(usuario=request.user)
+        sesion = get_object_or_404(sesiones, pk=sesion_id)
+        
+        if not checkout_service.cancelar(sesion):
+            return Response({
+                'success': False,
+                'message': 'La sesión ya no está activa'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'success': True,
+            'message': 'Checkout cancelado'
+        })
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def metricas(self, request):
+        """Latencia, errores y estado del circuito de la pasarela en este proceso"""
+        return Response({
+            'success': True,
+            'data': stripe_service.metricas()
+        })
+    
+    @method_decorator(csrf_exempt)
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny], authentication_classes=[])
     def webhook(self, request):
-        """Webhook de Stripe"""
+        """Webhook de Stripe (autenticado por la firma Stripe-Signature, no por JWT)"""
         try:
             payload = request.body.decode('utf-8')
             sig_header = request.META.get('HTTP_STRIPE_SIGNATURE', '')
@@ -712,8 +1013,14 @@ class StripeViewSet(viewsets.ViewSet):
             # Procesar evento según tipo
             if event['type'] == 'payment_intent.succeeded':
                 payment_intent = event['data']['object']
-                # Aquí procesar el pago exitoso
-                logger.info(f"Payment succeeded: {payment_intent.get('id', 'unknown')}")
+                pago = checkout_service.completar(
+                    payment_intent['id'],
+                    payment_intent.get('amount_received', payment_intent.get('amount'))
+                ) or payment_service.mark_stripe_payment_confirmed(payment_intent)
+                logger.info(
+                    f"Payment succeeded: {payment_intent.get('id', 'unknown')}"
+                    f"{f' -> {pago.numero_pago}' if pago else ''}"
+                )
                 
             elif event['type'] == 'payment_intent.payment_failed':
                 payment_intent = event['data']['object']
@@ -728,23 +1035,119 @@ class StripeViewSet(viewsets.ViewSet):
 
 
 # ================== LEGACY VIEWS (COMPATIBILIDAD) ==================
+# Solo lectura: proyecciones paginadas sobre MetodoPago y Factura.
+# Los datos de Deuda/DetalleDeuda se trasladan con `migrar_deudas_legacy`.
 
-class TipoPagoViewSet(viewsets.ModelViewSet):
-    """ViewSet para tipos de pago (legacy)"""
-    queryset = TipoPago.objects.all()
+class TipoPagoViewSet(viewsets.ReadOnlyModelViewSet):
+    """ViewSet para tipos de pago (legacy, proyección sobre MetodoPago)"""
+    queryset = MetodoPago.objects.all()
     serializer_class = TipoPagoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+    filter_backends = [filters.OrderingFilter]
+    ordering = ['orden', 'nombre']
 
 
-class DeudaViewSet(viewsets.ModelViewSet):
-    """ViewSet para deudas (legacy)"""
-    queryset = Deuda.objects.all()
+class LegacyFacturaMixin:
+    """Restricción por usuario común a las proyecciones legacy de Factura"""
+    
+    def get_facturas(self):
+        queryset = Factura.objects.exclude(estado='anulada')
+        
+        # Si es residente, solo sus facturas
+        if not self.request.user.is_staff:
+            viviendas_usuario = Vivienda.objects.filter(
+                Q(usuario_propietario=self.request.user) | 
+                Q(usuario_inquilino=self.request.user)
+            )
+            queryset = queryset.filter(vivienda__in=viviendas_usuario)
+        
+        return queryset
+    
+    def grupo_de(self, factura_id):
+        """Vivienda y período de la deuda identificada por una de sus facturas"""
+        factura = get_object_or_404(
+            self.get_facturas().only('vivienda_id', 'periodo'), pk=factura_id
+        )
+        return factura.vivienda_id, factura.periodo
+
+
+class DeudaViewSet(LegacyFacturaMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet para deudas (legacy, facturas agrupadas por vivienda y período)"""
     serializer_class = DeudaSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+    
+    def _entero(self, nombre, minimo, maximo):
+        """Parámetro entero opcional; 400 si no es un número en el rango"""
+        valor = self.request.query_params.get(nombre)
+        if not valor:
+            return None
+        try:
+            numero = int(valor)
+        except ValueError:
+            raise ValidationError({nombre: 'Debe ser un número entero'})
+        if not minimo <= numero <= maximo:
+            raise ValidationError({nombre: f'Debe estar entre {minimo} y {maximo}'})
+        return numero
+    
+    def get_queryset(self):
+        queryset = self.get_facturas()
+        
+        vivienda = self._entero('vivienda', 1, 2 ** 63 - 1)
+        if vivienda:
+            queryset = queryset.filter(vivienda_id=vivienda)
+        
+        periodo_ano = self._entero('periodo_ano', 1, 9999)
+        periodo_mes = self._entero('periodo_mes', 1, 12)
+        if periodo_ano and periodo_mes:
+            queryset = queryset.filter(periodo=f'{periodo_ano:04d}-{periodo_mes:02d}')
+        elif periodo_ano:
+            queryset = queryset.filter(periodo__startswith=f'{periodo_ano:04d}-')
+        
+        return queryset.values('vivienda_id', 'periodo').annotate(
+            # Los alias no pueden coincidir con campos de Factura
+            deuda_id=Min('id'),
+            creada=Min('created_at'),
+            actualizada=Max('updated_at'),
+            vigente=BoolOr('activo'),
+            total=Sum('monto_total'),
+            saldo=Sum('saldo_pendiente'),
+            emision=Min('fecha_generacion'),
+            vencimiento=Min('fecha_vencimiento'),
+            interes_mora=Max('concepto__porcentaje_interes_mora'),
+            descuento=Sum('descuentos'),
+            numero=Min('numero_factura'),
+            notas=Max('observaciones'),
+        ).order_by('-periodo', 'vivienda_id')
+    
+    def get_object(self):
+        vivienda_id, periodo = self.grupo_de(self.kwargs['pk'])
+        deuda = self.get_queryset().filter(vivienda_id=vivienda_id, periodo=periodo).first()
+        if deuda is None:
+            raise Http404
+        return deuda
 
 
-class DetalleDeudaViewSet(viewsets.ModelViewSet):
-    """ViewSet para detalles de deuda (legacy)"""
-    queryset = DetalleDeuda.objects.all()
+class DetalleDeudaViewSet(LegacyFacturaMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet para detalles de deuda (legacy, una factura por detalle)"""
     serializer_class = DetalleDeudaSerializer
-    permission_classes = [IsAuthenticated]
\ No newline at end of file
+    permission_classes = [IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+    
+    def get_queryset(self):
+        queryset = self.get_facturas()
+        
+        deuda = self.request.query_params.get('deuda')
+        if deuda:
+            vivienda_id, periodo = self.grupo_de(deuda)
+            queryset = queryset.filter(vivienda_id=vivienda_id, periodo=periodo)
+        
+        primera_del_grupo = Factura.objects.filter(
+            vivienda_id=OuterRef('vivienda_id'),
+            periodo=OuterRef('periodo')
+        ).exclude(estado='anulada').order_by('id').values('id')[:1]
+        
+        return queryset.select_related('concepto').annotate(
+            deuda_id=Subquery(primera_del_grupo)
+        ).order_by('-periodo', 'vivienda_id', 'id')